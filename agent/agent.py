@@ -1,20 +1,180 @@
 """
 This module defines the ConversationalAgent class for interacting with the openai-agents SDK.
+
+The openai-agents SDK and the (large) prompt module are imported lazily, when the first
+agent is created, so importing this module stays cheap for workers, CLIs and tests.
 """
+import asyncio
+import functools
 import os
-from dotenv import load_dotenv
 import logging
-from typing import AsyncIterator
-import streamlit as st
+import time
+from typing import TYPE_CHECKING, AsyncIterator, Optional, Union
 
-from agents import Agent, Runner, trace
+if TYPE_CHECKING:
+    from agents import Model
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-from .prompts.agent_instructions import AGENT_INSTRUCTIONS, PDTA_INSTRUCTIONS, pdta_text
+from . import metrics
+from .citations import cite, citations_enabled, format_citations
+from .clarification import clarification_enabled, clarification_questions, format_clarification
+from .config import get_bool_setting, get_setting
+from .corpus_store import CorpusVersion, default_corpus_store
+from .grounding import GROUNDING_HALT, GROUNDING_OFF, HALT_NOTICE, GroundingValidator, grounding_mode
+from .guardrails import GUARDRAIL_PHI, InputCheckTripped, guardrail_timings, input_guardrails, tripwire_info
+from .logging_setup import HistoryPayload, LogPayload, redact_text
+from .pathway import is_next_step_question, locate, pathway_answers_enabled, pathway_hints_enabled
+from .references import pin_references_enabled
+from .instrumentation import (
+    STAGE_CITATIONS,
+    STAGE_GROUNDING,
+    STAGE_GUARDRAILS,
+    STAGE_HISTORY_PERSISTENCE,
+    STAGE_LOCAL_ANSWER,
+    STAGE_MODEL_CALL,
+    STAGE_MODEL_TTFT,
+    STAGE_PROMPT_ASSEMBLY,
+    STAGE_QUEUE_WAIT,
+    STAGE_RETRIEVAL,
+    STAGE_STREAMING,
+    SpanSink,
+    TurnSpans,
+    sink_from_env,
+)
+from .routing import ModelRouter, router_from_env
+from .scope import OUT_OF_SCOPE, OUT_OF_SCOPE_REPLY, ScopeClassifier, scope_filter_enabled
+from .singleflight import SingleFlight
+from .tables import table_answers_enabled
+from .text import tokenize
+from .tokens import estimate_messages_tokens, estimate_tokens
+from .tools import CONTEXT_TOOLS, PdtaTools, context_mode, format_passage
+
+
+# Appended to partial answers kept in the history when a turn is cancelled
+CANCELLED_MARKER = "[Risposta interrotta]"
+CANCEL_DISCONNECTED = "disconnected"
+
+# Events of a model stream
+EVENT_CREATED = "created"
+EVENT_DELTA = "delta"
+EVENT_USAGE = "usage"
+EVENT_TOOL_CALL = "tool_call"
+EVENT_GUARDRAILS = "guardrails"
+
+# Heading of the passages pinned into the model input for the references named in a question
+PINNED_HEADER = "Passaggi del PDTA citati nella domanda:"
+
+
+def _model_name(model: Union[str, "Model"]) -> str:
+    return model if isinstance(model, str) else getattr(model, "name", type(model).__name__)
+
+
+# In-flight streamed model calls shared by all the agents of the process
+SINGLE_FLIGHT = SingleFlight()
+
+
+def single_flight_enabled() -> bool:
+    """
+    Whether identical concurrent streamed turns share one model call (PDTA_SINGLE_FLIGHT, "on" by default).
+    """
+    return get_bool_setting("PDTA_SINGLE_FLIGHT", True)
+
+
+def _usage_from_result(result) -> dict:
+    """
+    Returns the token usage of a finished (or cancelled) run.
+    """
+    usage = result.context_wrapper.usage
+    input_details = getattr(usage, "input_tokens_details", None)
+    return {
+        "requests": usage.requests,
+        "input_tokens": usage.input_tokens,
+        "cached_input_tokens": getattr(input_details, "cached_tokens", 0) or 0,
+        "output_tokens": usage.output_tokens,
+        "total_tokens": usage.total_tokens,
+    }
+
+
+def _tool_name(item) -> str:
+    raw = getattr(item, "raw_item", None)
+    return getattr(raw, "name", None) or (raw.get("name") if isinstance(raw, dict) else None) or "unknown"
+
+
+def _coalescing_key(model_name: str, corpus_version: int, mode: str, model_input: list) -> tuple:
+    """
+    Identifies equivalent model calls: same model, same corpus version and context mode and
+    same conversation up to case, accents, punctuation and spacing.
+    """
+    return (model_name, corpus_version, mode) + tuple((m.get("role"), " ".join(tokenize(str(m.get("content", ""))))) for m in model_input)
+
+
+class _ModelStream:
+    """
+    One Runner.run_streamed call as a stream of (kind, value) events: EVENT_CREATED when the
+    provider accepts the request, EVENT_DELTA per text chunk, EVENT_TOOL_CALL per tool the
+    model calls, EVENT_GUARDRAILS with the durations of the input checks and a final EVENT_USAGE.
+    A tripped input check stops the stream and raises InputCheckTripped (or the SDK's
+    InputGuardrailTripwireTriggered, if it comes first).
+    """
+    def __init__(self, agent, model_input: list):
+        self.agent = agent
+        self.model_input = model_input
+        self.result = None
+        self.tripped = None
+
+    def __aiter__(self):
+        return self._events()
 
+    async def _events(self):
+        from agents import Runner, trace
+
+        with trace("ConversationalAgent Streaming Workflow"):
+            self.result = Runner.run_streamed(starting_agent=self.agent, input=self.model_input, context=self)
+        try:
+            async for event in self.result.stream_events():
+                if event.type == "run_item_stream_event" and event.name == "tool_called":
+                    yield EVENT_TOOL_CALL, _tool_name(event.item)
+                if event.type != "raw_response_event":
+                    continue
+                if getattr(event.data, "type", None) == "response.created":
+                    yield EVENT_CREATED, None
+                chunk = getattr(event.data, "delta", None)
+                if chunk:
+                    yield EVENT_DELTA, chunk
+            if self.tripped is not None:
+                raise InputCheckTripped(self.tripped)
+            yield EVENT_GUARDRAILS, guardrail_timings(self.result.input_guardrail_results)
+            yield EVENT_USAGE, _usage_from_result(self.result)
+        finally:
+            self.cancel()
+
+    def cancel(self) -> None:
+        if self.result is not None and not self.result.is_complete:
+            self.result.cancel()
+
+    def input_tripwire(self, info: dict) -> None:
+        """
+        Called by a tripped input check (see agent/guardrails.py): stops the model stream on the
+        next loop iteration, after the SDK has recorded the check's result.
+        """
+        self.tripped = info
+        asyncio.get_running_loop().call_soon(self.cancel)
+
+
+def _configure_api_key() -> None:
+    """
+    Validates the OpenAI API key and hands it to the SDK when it does not come from the environment.
+    """
+    api_key = get_setting("OPENAI_API_KEY")
+    if not api_key:
+        logger.error("OPENAI_API_KEY not found in environment variables.")
+        raise ValueError("OPENAI_API_KEY not found in environment variables. Please set it in your .env file.")
+    if not os.environ.get("OPENAI_API_KEY"):
+        # Key read from Streamlit secrets: the SDK only looks at the environment by default
+        from agents import set_default_openai_key
+
+        set_default_openai_key(api_key)
 
 
 class ConversationalAgent:
@@ -22,31 +182,83 @@ class ConversationalAgent:
     A conversational agent leveraging the openai-agents SDK.
     Handles conversation flow and interaction with the configured OpenAI model.
     """
-    def __init__(self):
+    def __init__(self, model: Union[str, "Model"] = "gpt-4o-mini", span_sink: Optional[SpanSink] = None,
+                 router: Optional[ModelRouter] = None, context: Optional[str] = None):
         """
         Initializes the ConversationalAgent.
         Loads environment variables, validates the OpenAI API key, and configures the agent.
+
+        Args:
+            model: The OpenAI model name, or a Model instance (e.g. MockModel for offline runs,
+                in which case no API key is required).
+            span_sink: Where per-turn stage spans are exported. Defaults to the sink
+                configured by PDTA_SPAN_SINK.
+            router: Chooses the fast or strong model for each turn. Defaults to the router
+                configured by PDTA_MODEL_FAST, PDTA_MODEL_STRONG and PDTA_ROUTING_POLICY.
+            context: How the PDTA reaches the model: "full" (the whole text in the instructions)
+                or "tools" (the model fetches passages with the PDTA lookup tools). Defaults to
+                PDTA_CONTEXT_MODE.
         """
-        load_dotenv()
-        api_key = st.secrets["OPENAI_API_KEY"]
-        if not api_key:
-            logger.error("OPENAI_API_KEY not found in environment variables.")
-            raise ValueError("OPENAI_API_KEY not found in environment variables. Please set it in your .env file.")
+        from agents import Agent, ModelSettings
+
+        from .trace_processor import configure_tracing
+
+        configure_tracing()
+        if isinstance(model, str):
+            _configure_api_key()
 
         agent_name = "ConversationalAgent"
-        agent_instructions = AGENT_INSTRUCTIONS + PDTA_INSTRUCTIONS.format(pdta_text=pdta_text)
-        agent_model = "gpt-4o-mini"
+        # Instructions (and tools) of the current corpus version; refreshed when the corpus is reloaded
+        self.context_mode = context_mode(context)
+        self.corpus_store = default_corpus_store()
+        self.corpus = self.corpus_store.current
+        agent_instructions, agent_tools = self._corpus_context(self.corpus)
+        agent_model = model
+        # Answers clearly out-of-scope questions locally (Rule 2) instead of calling the model
+        self.scope_filter = scope_filter_enabled()
 
         self.agent = Agent(
             name=agent_name,
             instructions=agent_instructions,
-            model=agent_model
+            model=agent_model,
+            tools=agent_tools,
+            model_settings=ModelSettings(parallel_tool_calls=True) if agent_tools else ModelSettings(),
+            # Scope check (follow-ups) concurrent with the model call; safety and PHI checks before it
+            input_guardrails=input_guardrails(self.scope_classifier, common_words=self.corpus.corpus.lowercase_words),
         )
-        logger.info(f"Agent '{self.agent.name}' initialized with model '{agent_model}'.")
-        logger.debug(f"Agent instructions: {agent_instructions}") # Log instructions at debug level
+        logger.info("Agent '%s' initialized with model '%s' (%s context).", self.agent.name, agent_model, self.context_mode)
+        logger.debug("Agent instructions: %s", LogPayload(agent_instructions)) # Log instructions at debug level
+
+        self.model = model
+        self.model_name = _model_name(model)
+        self.router = router if router is not None else router_from_env(model)
+        self._build_route_agents()
+        self.span_sink = span_sink if span_sink is not None else sink_from_env()
+        # Asks the Rule 4 clarifying questions locally when an opening case is under-specified
+        self.clarify_fast_path = clarification_enabled()
+        # Answers questions on the roles of the RACI matrix from the parsed table
+        self.table_answers = table_answers_enabled()
+        # Tells the model where the case stands in the PDTA flowchart, and answers next-step
+        # questions on well-specified cases locally
+        self.pathway_hints = pathway_hints_enabled()
+        self.pathway_answers = pathway_answers_enabled()
+        # Appends the sources of each answer from the corpus metadata instead of having the model write them
+        self.local_citations = citations_enabled()
+        # Checks the sentences of the answer against the PDTA as they stream (flag, halt or off)
+        self.grounding = grounding_mode()
+        # Pins the passages of the codes, sections and acronyms named in a question (tools context only)
+        self.pin_references = self.context_mode == CONTEXT_TOOLS and pin_references_enabled()
+        # Shares identical concurrent streamed calls between sessions (process-wide)
+        self.single_flight = SINGLE_FLIGHT if single_flight_enabled() else None
 
         # Stores the conversation history for the current session
         self.conversation_history = []
+        # Stage spans of the last (or current) turn; the UI adds its rendering span to it
+        self.last_turn_spans = None
+        # Token usage reported by the provider for the last completed turn
+        self.last_usage = {}
+        # Exception raised during the last turn, if any (the user only sees a friendly message)
+        self.last_error = None
 
     async def get_streamed_response(self, user_message: str) -> AsyncIterator[str]:
         """
@@ -58,67 +270,202 @@ class ConversationalAgent:
         Returns:
             An async iterator that yields chunks of the agent's response as they are generated.
         """
-        logger.info(f"Received user message for streaming: '{user_message}'")
+        from agents import InputGuardrailTripwireTriggered
+
+        logger.info("Received user message for streaming (%s)", LogPayload(user_message))
+        spans = self._start_turn(streaming=True)
 
         # Append user message to the history before sending to the runner
         self.conversation_history.append({"role": "user", "content": user_message})
-        logger.debug(f"Current conversation history (before streaming): {self.conversation_history}")
+        logger.debug("Current conversation history (before streaming): %s", HistoryPayload(self.conversation_history))
+        self.last_error = None
 
         try:
-            logger.info(f"Running agent '{self.agent.name}' in streaming mode...")
-            # Use run_streamed for streaming responses
-            with trace("ConversationalAgent Streaming Workflow") as my_trace:
-                result = Runner.run_streamed(
-                    starting_agent=self.agent,
-                    input=self.conversation_history,
-                )
+            local_answer = self._local_answer(user_message, spans)
+            if local_answer is not None:
+                with spans.stage(STAGE_HISTORY_PERSISTENCE):
+                    self.conversation_history.append({"role": "assistant", "content": local_answer})
+                yield local_answer
+                return
+
+            route_agent, model_name = self._route(user_message, spans)
+            logger.info("Running agent '%s' in streaming mode on %s...", self.agent.name, model_name)
+            with spans.stage(STAGE_PROMPT_ASSEMBLY) as stage:
+                model_input = self._model_input(user_message, stage)
+                stage["prompt_tokens_estimate"] = self.instructions_tokens + estimate_messages_tokens(model_input)
+            # Use run_streamed for streaming responses, shared with identical concurrent turns if enabled
+            dispatched_at, dispatched = time.time(), time.perf_counter()
+            if self.single_flight is not None:
+                stream = self.single_flight.subscribe(
+                    _coalescing_key(model_name, self.corpus.version, self.context_mode, model_input), lambda: _ModelStream(route_agent, model_input))
+                coalesced = not stream.leader
+            else:
+                stream, coalesced = _ModelStream(route_agent, model_input), False
+            if coalesced:
+                spans.attributes["coalesced"] = True
+                metrics.COALESCED_REQUESTS.inc()
+                logger.info("Identical request already in flight, sharing its stream.")
 
             full_response = ""
-            async for event in result.stream_events():
-                if event.type == "raw_response_event" and hasattr(event.data, 'delta'):
-                    chunk = event.data.delta
-                    if chunk:
+            accepted = first_token = None
+            chunks = 0
+            usage = {}
+            metrics.QUEUED_REQUESTS.inc()
+            queued = True
+            tripped = None
+            validator = self._grounding_validator()
+            grounding_time = 0.0
+            halted = False
+            try:
+                async for kind, value in stream:
+                    if kind == EVENT_USAGE:
+                        usage = value
+                        continue
+                    if kind == EVENT_GUARDRAILS:
+                        self._record_guardrails(value, dispatched_at, spans)
+                        continue
+                    if kind == EVENT_TOOL_CALL:
+                        self._record_tool_call(value, spans)
+                        continue
+                    if accepted is None and kind == EVENT_CREATED:
+                        accepted = time.perf_counter()
+                        spans.record(STAGE_QUEUE_WAIT, dispatched_at, accepted - dispatched)
+                        metrics.QUEUED_REQUESTS.dec()
+                        queued = False
+                    if kind == EVENT_DELTA:
+                        chunk = value
+                        if first_token is None:
+                            first_token = time.perf_counter()
+                            ttft_start = accepted or dispatched
+                            spans.record(STAGE_MODEL_TTFT, dispatched_at + (ttft_start - dispatched), first_token - ttft_start)
+                            metrics.TTFT.observe(first_token - dispatched, model=model_name)
+                        chunks += 1
                         full_response += chunk
                         yield chunk
+                        if validator is not None:
+                            checked = time.perf_counter()
+                            findings = validator.feed(chunk)
+                            grounding_time += time.perf_counter() - checked
+                            if findings and self.grounding == GROUNDING_HALT:
+                                # Stop paying for an answer that is leaving the PDTA
+                                stream.cancel()
+                                halted = True
+                                break
+            except (InputCheckTripped, InputGuardrailTripwireTriggered) as e:
+                tripped = e
+            except (GeneratorExit, asyncio.CancelledError):
+                # The consumer went away (new message, closed tab): stop the upstream stream now
+                # instead of paying for tokens nobody reads
+                stream.cancel()
+                self._commit_cancelled(full_response, spans, CANCEL_DISCONNECTED)
+                raise
+            finally:
+                if queued:
+                    metrics.QUEUED_REQUESTS.dec()
+            # Tokens of a shared call are accounted to the session that started it
+            if not coalesced:
+                self.last_usage = usage
+            if tripped is not None:
+                yield ("\n\n" if full_response else "") + self._guardrail_reply(tripped, dispatched_at, spans)
+                return
+            if validator is not None:
+                if not halted:
+                    checked = time.perf_counter()
+                    validator.finish()
+                    grounding_time += time.perf_counter() - checked
+                self._record_grounding(validator, dispatched_at, grounding_time, spans)
+            if halted:
+                with spans.stage(STAGE_HISTORY_PERSISTENCE, halted=True):
+                    self.conversation_history.append({"role": "assistant", "content": f"{full_response}\n\n{HALT_NOTICE}"})
+                yield f"\n\n{HALT_NOTICE}"
+                return
+            if first_token is not None:
+                spans.record(
+                    STAGE_STREAMING,
+                    dispatched_at + (first_token - dispatched),
+                    time.perf_counter() - first_token,
+                    chunks=chunks,
+                    output_tokens=self.last_usage.get("output_tokens"),
+                    requests=self.last_usage.get("requests"),
+                )
 
-            # After streaming is complete, append the full response to history
-            if full_response:
-                self.conversation_history.append({"role": "assistant", "content": full_response})
-                logger.info("Streaming response completed and added to history")
-            else:
-                logger.warning("No response was generated during streaming")
+            sources = self._citations(full_response, spans)
+            if sources:
+                yield sources
+
+            # After streaming is complete, append the full response to history (without the sources)
+            with spans.stage(STAGE_HISTORY_PERSISTENCE):
+                if full_response:
+                    self.conversation_history.append({"role": "assistant", "content": full_response})
+                    logger.info("Streaming response completed and added to history")
+                else:
+                    logger.warning("No response was generated during streaming")
 
         except Exception as e:
-            logger.exception(f"An error occurred during streaming: {e}")
+            logger.exception("An error occurred during streaming: %s", e)
+            self.last_error = e
             error_msg = f"Sorry, an error occurred while streaming the response: {e}"
             yield error_msg
+        finally:
+            self._finish_turn(spans)
 
-    async def get_response(self, user_message: str) -> str:
+    async def get_response(self, user_message: str, local_answers: bool = True) -> str:
         """
         Processes a user message using the openai-agents SDK Runner and returns the agent's complete response.
         For non-streaming use cases.
 
         Args:
             user_message: The message input by the user.
+            local_answers: Whether turns that can be handled without the model (RACI roles, pathway
+                next steps, out-of-scope refusals, clarifying questions) are answered locally.
+                Batch triage turns them off: it needs the model's structured answer.
 
         Returns:
             The agent's complete response as a string.
         """
-        logger.info(f"Received user message: '{user_message}'")
+        logger.info("Received user message (%s)", LogPayload(user_message))
+        spans = self._start_turn(streaming=False)
 
         # Append user message to the history before sending to the runner
         self.conversation_history.append({"role": "user", "content": user_message})
-        logger.debug(f"Current conversation history (before runner): {self.conversation_history}")
+        logger.debug("Current conversation history (before runner): %s", HistoryPayload(self.conversation_history))
+        self.last_error = None
 
         try:
-            logger.info(f"Running agent '{self.agent.name}'...")
+            local_answer = self._local_answer(user_message, spans) if local_answers else None
+            if local_answer is not None:
+                with spans.stage(STAGE_HISTORY_PERSISTENCE):
+                    self.conversation_history.append({"role": "assistant", "content": local_answer})
+                return local_answer
+
+            from agents import InputGuardrailTripwireTriggered, Runner, trace
+
+            route_agent, model_name = self._route(user_message, spans)
+            logger.info("Running agent '%s' on %s...", self.agent.name, model_name)
+            with spans.stage(STAGE_PROMPT_ASSEMBLY) as stage:
+                model_input = self._model_input(user_message, stage)
+                stage["prompt_tokens_estimate"] = self.instructions_tokens + estimate_messages_tokens(model_input)
             # Runner handles the interaction cycle with the agent
-            with trace("ConversationalAgent Workflow") as my_trace:
-                result = await Runner.run(
-                    starting_agent=self.agent,
-                    input=self.conversation_history, # Send the updated history
-                )
-            logger.debug(f"Runner result object: {result}") # Log the full result for debugging
+            dispatched_at = time.time()
+            try:
+                with spans.stage(STAGE_MODEL_CALL) as stage:
+                    with trace("ConversationalAgent Workflow") as my_trace:
+                        result = await Runner.run(
+                            starting_agent=route_agent,
+                            input=model_input, # Send the updated history
+                        )
+                    self.last_usage = _usage_from_result(result)
+                    stage.update(self.last_usage)
+                self._record_guardrails(guardrail_timings(result.input_guardrail_results), dispatched_at, spans)
+                for item in result.new_items:
+                    if item.type == "tool_call_item":
+                        self._record_tool_call(_tool_name(item), spans)
+            except InputGuardrailTripwireTriggered as e:
+                return self._guardrail_reply(e, dispatched_at, spans)
+            except asyncio.CancelledError:
+                self._commit_cancelled("", spans, CANCEL_DISCONNECTED)
+                raise
+            logger.debug("Runner result: %s items, %s raw responses", len(result.new_items), len(result.raw_responses))
 
             # Extract the final response string from the result
             agent_response = result.final_output
@@ -127,18 +474,303 @@ class ConversationalAgent:
                 logger.warning("Agent returned an empty response.")
                 agent_response = "I did not receive a valid response from the agent." # Provide a default error message
             else:
-                logger.info(f"Agent '{self.agent.name}' generated response.")
-                logger.debug(f"Raw agent response: {agent_response}")
+                logger.info("Agent '%s' generated response.", self.agent.name)
+                logger.debug("Raw agent response: %s", LogPayload(agent_response))
+                # Without streaming the answer is only flagged: it is already complete
+                validator = self._grounding_validator()
+                if validator is not None:
+                    checked = time.time()
+                    validator.feed(agent_response)
+                    validator.finish()
+                    self._record_grounding(validator, checked, time.time() - checked, spans)
 
-            # Append agent response to history after receiving it
-            self.conversation_history.append({"role": "assistant", "content": agent_response})
+            # Append agent response to history after receiving it (without the sources)
+            with spans.stage(STAGE_HISTORY_PERSISTENCE):
+                self.conversation_history.append({"role": "assistant", "content": agent_response})
 
-            return agent_response
+            return agent_response + (self._citations(agent_response, spans) or "")
 
         except Exception as e:
-            logger.exception(f"An error occurred while running the agent: {e}") # Use logger.exception to include traceback
+            logger.exception("An error occurred while running the agent: %s", e) # Use logger.exception to include traceback
+            self.last_error = e
             # Return a user-friendly error message
             return f"Sorry, an error occurred while processing the message: {e}"
+        finally:
+            self._finish_turn(spans)
+
+    def _commit_cancelled(self, partial_response: str, spans: TurnSpans, reason: str) -> None:
+        """
+        Keeps the partial answer of a cancelled turn in the history, marked as interrupted.
+        """
+        content = f"{partial_response}\n\n{CANCELLED_MARKER}" if partial_response else CANCELLED_MARKER
+        with spans.stage(STAGE_HISTORY_PERSISTENCE, cancelled=True):
+            self.conversation_history.append({"role": "assistant", "content": content})
+        spans.attributes["cancelled"] = reason
+        metrics.CANCELLED_REQUESTS.inc(reason=reason)
+        logger.info("Turn cancelled (%s) after %d characters, partial answer kept in history.",
+                    reason, len(partial_response))
+
+    def _record_guardrails(self, timings: dict, start_time: float, spans: TurnSpans) -> None:
+        """
+        Exports the durations of the input checks, which ran concurrently with the model call, as their own stage.
+        """
+        if not timings:
+            return
+        spans.record(STAGE_GUARDRAILS, start_time, max(timings.values()), checks=timings)
+        for name, duration in timings.items():
+            metrics.GUARDRAIL_TIME.observe(duration, guardrail=name)
+
+    def _guardrail_reply(self, tripped: Exception, start_time: float, spans: TurnSpans) -> str:
+        """
+        Returns the fixed reply of a tripped input check and keeps it in the history. A message
+        tripping the PHI check is kept redacted.
+        """
+        info = tripwire_info(tripped)
+        name = info["name"]
+        self._record_guardrails({name: info.get("duration_s", 0.0)}, start_time, spans)
+        logger.info("Input check '%s' tripped (%s), model call cancelled.", name, info.get("detail"))
+        metrics.GUARDRAIL_TRIPS.inc(guardrail=name)
+        spans.attributes["guardrail"] = name
+        reply = info.get("reply") or OUT_OF_SCOPE_REPLY
+        with spans.stage(STAGE_HISTORY_PERSISTENCE):
+            if name == GUARDRAIL_PHI:
+                user_turn = self.conversation_history[-1]
+                user_turn["content"] = redact_text(user_turn["content"])
+            self.conversation_history.append({"role": "assistant", "content": reply})
+        return reply
+
+    def _grounding_validator(self) -> Optional[GroundingValidator]:
+        """
+        Returns the grounding validator of the answer being generated, or None if the checks are off.
+        """
+        if self.grounding == GROUNDING_OFF:
+            return None
+        return GroundingValidator(self.corpus, "\n".join(
+            m["content"] for m in self.conversation_history if m.get("role") == "user"))
+
+    def _record_grounding(self, validator: GroundingValidator, start_time: float, duration: float,
+                          spans: TurnSpans) -> None:
+        """
+        Exports the time spent on the grounding checks and flags the unsupported sentences.
+        """
+        findings = validator.findings
+        spans.record(STAGE_GROUNDING, start_time, duration, sentences=validator.sentences, findings=len(findings))
+        if validator.sentences:
+            self._record_retrieval("grounding", start_time, validator.retrieval_s, spans)
+        if not findings:
+            return
+        spans.attributes["grounding"] = [{"kind": finding.kind, "detail": finding.detail} for finding in findings]
+        for finding in findings:
+            metrics.GROUNDING_FINDINGS.inc(kind=finding.kind)
+        logger.warning("%d findings in the answer not grounded in the PDTA: %s (first sentence: %s)",
+                       len(findings), ", ".join(sorted({finding.kind for finding in findings})),
+                       LogPayload(findings[0].sentence))
+
+    def _local_answer(self, user_message: str, spans: TurnSpans) -> Optional[str]:
+        """
+        Returns the answer to a turn that can be handled without the model, or None:
+        the roles of a phase in the RACI matrix, the next steps of a case whose phase and
+        prerequisites are known, the fixed refusal for out-of-scope questions (Rule 2) or the
+        clarifying questions for an under-specified case (Rule 4).
+
+        Scope and clarification are only checked on the opening message of a conversation:
+        follow-ups often answer the agent's own questions in a few words and go to the model.
+        """
+        opening = len(self.conversation_history) <= 1
+        check_scope = opening and self.scope_classifier is not None
+        check_clarify = opening and self.clarify_fast_path
+        if not (self.table_answers or self.pathway_answers or check_scope or check_clarify):
+            return None
+        reason = answer = None
+        qualified = False
+        with spans.stage(STAGE_LOCAL_ANSWER) as stage:
+            if self.table_answers:
+                answer = self.corpus.tables.answer(user_message)
+                if answer is not None:
+                    logger.info("RACI question answered locally from the parsed matrix.")
+                    reason = "table"
+            if answer is None and self.pathway_answers and is_next_step_question(user_message):
+                state = self._pathway_state()
+                # A negated, pending or suspected fact leaves the case to the model, with the state as a hint
+                qualified = state is not None and bool(state.facts.qualified)
+                if state is not None and not state.missing and not qualified:
+                    logger.info("Next-step question answered locally from the pathway (%s).", state.phase)
+                    stage["phase"] = state.phase
+                    reason, answer = "pathway", state.answer()
+            if answer is None and check_scope:
+                decision = self.scope_classifier.classify(user_message)
+                stage.update(scope=decision.label, scope_score=round(decision.score, 3))
+                metrics.SCOPE_DECISIONS.inc(decision=decision.label)
+                if decision.label == OUT_OF_SCOPE:
+                    logger.info("Question out of scope (score %.2f), answered locally.", decision.score)
+                    reason, answer = OUT_OF_SCOPE, OUT_OF_SCOPE_REPLY
+            if answer is None and check_clarify and not qualified:
+                questions = clarification_questions(user_message)
+                if questions:
+                    logger.info("Under-specified case, asking %d clarifying questions locally.", len(questions))
+                    reason, answer = "clarification", format_clarification(questions)
+            stage["answered"] = reason
+        if answer is not None:
+            metrics.LOCAL_ANSWERS.inc(reason=reason)
+            spans.attributes["local_answer"] = reason
+        return answer
+
+    def _citations(self, answer: str, spans: TurnSpans) -> Optional[str]:
+        """
+        Returns the sources block of a model answer, computed locally from the supporting chunks.
+        """
+        if not self.local_citations or not answer:
+            return None
+        with spans.stage(STAGE_CITATIONS) as stage:
+            citations = cite(answer, self.corpus.registry)
+            stage["chunks"] = [citation.chunk.chunk_id for citation in citations]
+        return format_citations(citations)
+
+    def _model_input(self, user_message: str, stage: dict) -> list:
+        """
+        Returns the conversation sent to the model, with the defining passages of the exact
+        references in the user message (codes, sections, pages, acronyms) pinned before it and
+        the pathway state of the case after it.
+        """
+        model_input = list(self.conversation_history)
+        if self.pin_references:
+            references = self.corpus.references
+            started_at, started = time.time(), time.perf_counter()
+            passages = references.passages(references.resolve(user_message))
+            self._record_retrieval("pinned", started_at, time.perf_counter() - started)
+            if passages:
+                stage["pinned"] = [chunk.chunk_id for chunk in passages]
+                passages = [format_passage(chunk, self.corpus.passage_text(chunk)) for chunk in passages]
+                content = "\n\n".join([PINNED_HEADER] + passages)
+                model_input.insert(len(model_input) - 1, {"role": "developer", "content": content})
+        if self.pathway_hints:
+            state = self._pathway_state()
+            if state is not None:
+                stage["phase"] = state.phase
+                model_input.append({"role": "developer", "content": state.hint()})
+        return model_input
+
+    def _pathway_state(self):
+        """
+        Returns the PDTA pathway state of the case described in the user's messages, or None.
+        """
+        return locate("\n".join(m["content"] for m in self.conversation_history if m.get("role") == "user"))
+
+    def _record_tool_call(self, tool: str, spans: TurnSpans) -> None:
+        """
+        Counts a tool called by the model in the turn span and in the tool metric.
+        """
+        calls = spans.attributes.setdefault("tool_calls", {})
+        calls[tool] = calls.get(tool, 0) + 1
+        metrics.TOOL_CALLS.inc(tool=tool)
+        logger.debug("Model called tool %s.", tool)
+
+    def _record_retrieval(self, source: str, start_time: Optional[float], duration: float,
+                          spans: Optional[TurnSpans] = None) -> None:
+        """
+        Exports the time spent searching the PDTA passages (pinned references, tool searches,
+        grounding checks) in the retrieval stage of the turn and in the retrieval metric.
+        """
+        spans = spans if spans is not None else self.last_turn_spans
+        if spans is not None:
+            spans.record(STAGE_RETRIEVAL, start_time if start_time is not None else time.time() - duration,
+                         duration, source=source)
+        metrics.RETRIEVAL_TIME.observe(duration, source=source)
+
+    @property
+    def scope_classifier(self) -> Optional[ScopeClassifier]:
+        """
+        The scope classifier of the current corpus version, or None if the scope filter is off.
+        """
+        return self.corpus.scope if self.scope_filter else None
+
+    def _corpus_context(self, version: CorpusVersion):
+        """
+        Returns the instructions and the tools of a corpus version for the context mode.
+        """
+        if self.context_mode == CONTEXT_TOOLS:
+            on_search = functools.partial(self._record_retrieval, "tool", None)
+            return version.tools_instructions, PdtaTools(version, on_search=on_search).function_tools()
+        return version.instructions, []
+
+    def _build_route_agents(self) -> None:
+        """
+        Creates one SDK agent per route, sharing the instructions; routes on the default model reuse self.agent.
+        """
+        self.route_agents = {
+            route: self.agent if route_model is self.model else self.agent.clone(model=route_model)
+            for route, route_model in self.router.routes.items()
+        }
+        self.instructions_tokens = estimate_tokens(self.agent.instructions)
+
+    def _sync_corpus(self, spans: TurnSpans) -> None:
+        """
+        Switches the agent to the latest corpus version before a turn starts. Turns already
+        running keep the SDK agents (and so the instructions) they started with.
+        """
+        version: CorpusVersion = self.corpus_store.current
+        if version is not self.corpus:
+            logger.info("Switching to corpus version %d (from %d).", version.version, self.corpus.version)
+            self.corpus = version
+            instructions, tools = self._corpus_context(version)
+            guardrails = input_guardrails(self.scope_classifier, common_words=version.corpus.lowercase_words)
+            self.agent = self.agent.clone(instructions=instructions, tools=tools, input_guardrails=guardrails)
+            self._build_route_agents()
+        spans.attributes["corpus_version"] = version.version
+
+    def _route(self, user_message: str, spans: TurnSpans):
+        """
+        Chooses the route of the turn and returns its SDK agent and model name.
+        """
+        kind, route = self.router.route(user_message, self.conversation_history[:-1])
+        model_name = _model_name(self.router.routes[route])
+        spans.attributes.update(turn_kind=kind, route=route, model=model_name)
+        metrics.ROUTED_REQUESTS.inc(route=route, kind=kind)
+        logger.debug("Turn classified as %s, routed to %s (%s).", kind, route, model_name)
+        return self.route_agents[route], model_name
+
+    def _start_turn(self, streaming: bool) -> TurnSpans:
+        """
+        Creates the span collector for a new turn and resets the per-turn state.
+        """
+        self.last_usage = {}
+        self.last_turn_spans = TurnSpans(
+            self.span_sink,
+            streaming=streaming,
+            history_items=len(self.conversation_history),
+        )
+        metrics.REQUESTS.inc(mode="stream" if streaming else "sync")
+        metrics.IN_FLIGHT_REQUESTS.inc()
+        metrics.HISTORY_LENGTH.observe(len(self.conversation_history))
+        self._sync_corpus(self.last_turn_spans)
+        return self.last_turn_spans
+
+    def _finish_turn(self, spans: TurnSpans) -> None:
+        """
+        Exports the turn span and the turn metrics with token usage and the error type, if any.
+        """
+        metrics.IN_FLIGHT_REQUESTS.dec()
+        metrics.LATENCY.observe(spans.elapsed(), mode="stream" if spans.attributes.get("streaming") else "sync")
+        if self.last_error is not None:
+            metrics.ERRORS.inc(type=type(self.last_error).__name__)
+        model_name = spans.attributes.get("model", self.model_name)
+        route = spans.attributes.get("route")
+        if route is not None:
+            metrics.ROUTE_LATENCY.observe(spans.elapsed(), route=route)
+        if self.last_usage:
+            metrics.INPUT_TOKENS.inc(self.last_usage["input_tokens"], model=model_name)
+            metrics.OUTPUT_TOKENS.inc(self.last_usage["output_tokens"], model=model_name)
+            if route is not None:
+                metrics.ROUTE_TOKENS.inc(self.last_usage["input_tokens"], route=route, direction="input")
+                metrics.ROUTE_TOKENS.inc(self.last_usage["output_tokens"], route=route, direction="output")
+            if self.last_usage["cached_input_tokens"]:
+                metrics.CACHE_HITS.inc(cache="prompt")
+                metrics.CACHED_INPUT_TOKENS.inc(self.last_usage["cached_input_tokens"], model=model_name)
+        spans.finish(
+            input_tokens=self.last_usage.get("input_tokens"),
+            output_tokens=self.last_usage.get("output_tokens"),
+            error=type(self.last_error).__name__ if self.last_error else None,
+        )
 
     def clear_history(self):
         """
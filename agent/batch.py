@@ -0,0 +1,286 @@
+"""
+Batch triage of anonymized patient cases.
+
+Runs a CSV or JSONL file of cases through ConversationalAgent with bounded concurrency and a
+requests-per-minute limit, and writes one JSON line per case with the recommended pre-IOV
+exams and the referral path. Every result is appended as soon as it is ready, so an interrupted
+job resumes where it stopped: cases already in the output are skipped (failed ones are retried).
+
+Input: JSONL objects or CSV rows with an `id` column and a `caso` (or `case`, `testo`, `text`)
+column holding the anonymized case description.
+
+Usage:
+    python -m agent.batch cases.csv --output triage.jsonl --concurrency 8 --rpm 120
+    python -m agent.batch cases.jsonl --output triage.jsonl --provider mock
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from .clarification import clarification_questions, format_clarification
+from .logging_setup import LogPayload, configure_logging
+from .scope import OUT_OF_SCOPE, OUT_OF_SCOPE_REPLY
+
+logger = logging.getLogger(__name__)
+
+CASE_COLUMNS = ("caso", "case", "testo", "text")
+
+STATUS_OK = "ok"
+STATUS_UNPARSED = "unparsed"
+STATUS_CLARIFICATION = "needs_clarification"
+STATUS_OUT_OF_SCOPE = "out_of_scope"
+STATUS_ERROR = "error"
+
+TRIAGE_REQUEST = """{case}
+
+Valuta il caso secondo il PDTA e rispondi solo con un oggetto JSON con queste chiavi:
+- "esami_pre_iov": elenco degli esami e delle visite da completare prima dell'invio allo IOV;
+- "percorso_invio": punto di accesso allo IOV e percorso di invio (ad esempio prima visita oncologica, \
+discussione GOM, prima visita radioterapica), con la sezione del PDTA;
+- "note": informazioni mancanti o osservazioni, oppure una stringa vuota."""
+
+MOCK_TRIAGE_ANSWER = json.dumps({
+    "esami_pre_iov": ["TC torace e addome superiore con mezzo di contrasto", "Visita pneumologica"],
+    "percorso_invio": "Discussione multidisciplinare GOM (Sezione 5.2), coordinata dal Case Manager",
+    "note": "",
+}, ensure_ascii=False)
+
+
+class RateLimiter:
+    """
+    Spaces out requests to at most `requests_per_minute`, shared by all the workers of a job.
+    """
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def load_cases(path: str) -> List[Dict[str, str]]:
+    """
+    Reads the cases of a CSV or JSONL file.
+
+    Args:
+        path: The input file; the format is chosen by extension (.csv, otherwise JSONL).
+
+    Returns:
+        The cases as {"id", "text"} dictionaries; rows without an id are numbered.
+    """
+    if path.endswith(".csv"):
+        with open(path, encoding="utf-8", newline="") as source:
+            rows: Iterable[Dict[str, Any]] = list(csv.DictReader(source))
+    else:
+        with open(path, encoding="utf-8") as source:
+            rows = [json.loads(line) for line in source if line.strip()]
+    cases = []
+    for index, row in enumerate(rows, 1):
+        text = next((row[column] for column in CASE_COLUMNS if row.get(column)), None)
+        if not text:
+            logger.warning("Skipping row %d of %s: no case text.", index, path)
+            continue
+        cases.append({"id": str(row.get("id") or index), "text": str(text).strip()})
+    return cases
+
+
+def completed_ids(output: str) -> Set[str]:
+    """
+    Returns the ids already processed in an output file (failed cases are not considered done).
+    """
+    if not os.path.exists(output):
+        return set()
+    done = set()
+    with open(output, encoding="utf-8") as source:
+        for line in source:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short by an interruption
+                continue
+            if record.get("status") != STATUS_ERROR:
+                done.add(str(record.get("id")))
+    return done
+
+
+def parse_triage(answer: str) -> Optional[Dict[str, Any]]:
+    """
+    Extracts the structured triage from the model's answer.
+
+    Returns:
+        The exams list, referral path and notes, or None if the answer holds no valid JSON object.
+    """
+    start, end = answer.find("{"), answer.rfind("}")
+    if start < 0 or end <= start:
+        return None
+    try:
+        data = json.loads(answer[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or "esami_pre_iov" not in data:
+        return None
+    exams = data.get("esami_pre_iov") or []
+    if isinstance(exams, str):
+        exams = [exams]
+    return {
+        "esami_pre_iov": [str(exam).strip() for exam in exams if str(exam).strip()],
+        "percorso_invio": str(data.get("percorso_invio") or "").strip(),
+        "note": str(data.get("note") or "").strip(),
+    }
+
+
+def local_status(agent: Any, text: str) -> Optional[Dict[str, str]]:
+    """
+    Applies the agent's local checks to the bare case text, so cases that would be refused
+    (Rule 2) or need clarifying questions (Rule 4) are reported without a model call.
+
+    Returns:
+        The status and the local reply, or None if the case must go to the model.
+    """
+    if agent.scope_classifier is not None and agent.scope_classifier.classify(text).label == OUT_OF_SCOPE:
+        return {"status": STATUS_OUT_OF_SCOPE, "risposta": OUT_OF_SCOPE_REPLY}
+    if agent.clarify_fast_path:
+        questions = clarification_questions(text)
+        if questions:
+            return {"status": STATUS_CLARIFICATION, "risposta": format_clarification(questions)}
+    return None
+
+
+async def triage_case(case: Dict[str, str], make_agent: Callable[[], Any], limiter: RateLimiter) -> Dict[str, Any]:
+    """
+    Runs one case through a fresh ConversationalAgent and builds its output record.
+    """
+    agent = make_agent()
+    started = time.perf_counter()
+    record: Dict[str, Any] = {"id": case["id"]}
+    local = local_status(agent, case["text"])
+    if local is not None:
+        record.update(local, latency_s=round(time.perf_counter() - started, 3))
+        return record
+
+    await limiter.acquire()
+    # The local checks already ran on the bare case text: the triage request itself goes to the model
+    answer = await agent.get_response(TRIAGE_REQUEST.format(case=case["text"]), local_answers=False)
+    spans = agent.last_turn_spans
+    record.update(
+        latency_s=round(time.perf_counter() - started, 3),
+        model=spans.attributes.get("model") if spans else None,
+        input_tokens=agent.last_usage.get("input_tokens"),
+        output_tokens=agent.last_usage.get("output_tokens"),
+    )
+    if agent.last_error is not None:
+        record.update(status=STATUS_ERROR, error=f"{type(agent.last_error).__name__}: {agent.last_error}")
+        return record
+    triage = parse_triage(answer)
+    if triage is None:
+        record.update(status=STATUS_UNPARSED, risposta=answer)
+    else:
+        record.update(status=STATUS_OK, **triage)
+    return record
+
+
+async def run_batch(cases: List[Dict[str, str]], output: str, make_agent: Callable[[], Any],
+                    concurrency: int = 4, requests_per_minute: float = 0) -> Dict[str, Any]:
+    """
+    Triages the cases not yet in `output`, appending one JSON line per case.
+
+    Args:
+        cases: The cases to process.
+        output: The JSONL checkpoint/result file.
+        make_agent: Creates a fresh ConversationalAgent for each case.
+        concurrency: Maximum number of cases processed at the same time.
+        requests_per_minute: Model requests allowed per minute (0 for no limit).
+
+    Returns:
+        A summary with counts per status, elapsed time and throughput.
+    """
+    done = completed_ids(output)
+    pending = [case for case in cases if case["id"] not in done]
+    logger.info("%d cases, %d already done, %d to process.", len(cases), len(cases) - len(pending), len(pending))
+    directory = os.path.dirname(os.path.abspath(output))
+    os.makedirs(directory, exist_ok=True)
+
+    limiter = RateLimiter(requests_per_minute)
+    slots = asyncio.Semaphore(max(1, concurrency))
+    statuses: Dict[str, int] = {}
+    started = time.perf_counter()
+
+    partial = False
+    if os.path.exists(output) and os.path.getsize(output):
+        with open(output, "rb") as source:
+            source.seek(-1, os.SEEK_END)
+            partial = source.read(1) != b"\n"
+
+    with open(output, "a", encoding="utf-8") as sink:
+        if partial:
+            # Close the line cut short by an interruption, so the next record starts on its own line
+            sink.write("\n")
+
+        async def worker(case: Dict[str, str]) -> None:
+            async with slots:
+                try:
+                    record = await triage_case(case, make_agent, limiter)
+                except Exception as e:
+                    logger.exception("Case %s failed (%s)", case["id"], LogPayload(case["text"]))
+                    record = {"id": case["id"], "status": STATUS_ERROR, "error": f"{type(e).__name__}: {e}"}
+            statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+            # Single-threaded event loop: each line is written whole, and flushed as a checkpoint
+            sink.write(json.dumps(record, ensure_ascii=False) + "\n")
+            sink.flush()
+
+        await asyncio.gather(*(worker(case) for case in pending))
+
+    elapsed = time.perf_counter() - started
+    return {
+        "cases": len(cases),
+        "skipped": len(cases) - len(pending),
+        "processed": len(pending),
+        "statuses": statuses,
+        "elapsed_s": round(elapsed, 2),
+        "cases_per_minute": round(len(pending) / elapsed * 60, 1) if elapsed > 0 and pending else None,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Triage a file of anonymized cases with the PDTA agent.")
+    parser.add_argument("cases", help="CSV or JSONL file of cases.")
+    parser.add_argument("--output", required=True, help="JSONL result file, also used to resume.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Cases processed in parallel.")
+    parser.add_argument("--rpm", type=float, default=60, help="Model requests per minute (0 = no limit).")
+    parser.add_argument("--provider", choices=["openai", "mock"], default="openai")
+    parser.add_argument("--model", default="gpt-4o-mini", help="Model name for the openai provider.")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    from .agent import ConversationalAgent
+
+    if args.provider == "mock":
+        from .mock_model import MockModel
+
+        model = MockModel(response=MOCK_TRIAGE_ANSWER, ttft=0.05, tokens_per_second=0)
+    else:
+        model = args.model
+
+    summary = asyncio.run(run_batch(
+        load_cases(args.cases), args.output, lambda: ConversationalAgent(model=model),
+        concurrency=args.concurrency, requests_per_minute=args.rpm,
+    ))
+    logger.info("Batch finished: %d cases processed in %.1fs.", summary["processed"], summary["elapsed_s"])
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Deterministic citations for the agent's answers.
+
+Instead of asking the model to write its sources (which costs output tokens and comes out in
+inconsistent formats), each sentence of a finished answer is matched against the corpus
+chunks and the supporting chunks are cited from their metadata: document title, IOV section
+and source pages, or ROV 2017 page number. The citation block is appended to the rendered
+answer only; it is not stored in the conversation history, so it costs no input tokens on the
+following turns either. With the local citations on, the prompts no longer ask the model to cite
+(see citation_prompts): Rule 5 tells it the sources are added, and the lines of the PDTA text
+asking to cite a document by its title are dropped.
+
+- PDTA_LOCAL_CITATIONS: "off" leaves the sources to the model, with Rule 5 as written ("on" by default).
+"""
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from .config import get_bool_setting
+from .corpus import DOC_IOV, DOCUMENT_TITLES, Chunk, chunk_term_counts
+from .registry import CorpusRegistry
+from .text import terms
+
+CITATIONS_HEADER = "**Fonti:**"
+
+# Sentences with fewer distinct terms are not matched (greetings, transitions)
+MIN_SENTENCE_TERMS = 4
+# Share of a sentence's terms that must occur in a chunk for the chunk to support it
+MIN_OVERLAP = 0.5
+MAX_CITATIONS = 4
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?;:])\s+|\n+")
+_HEADING_NUMBER_RE = re.compile(r"^\d+(?:\.\d+)?\.?\s+")
+# "Quando opportuno, cita sempre la fonte come “PDTA …”." and "- Cita questa fonte come “PDTA …”."
+_INLINE_CITATION_RE = re.compile(r"^[^\n]*\b[Cc]ita (?:sempre la|questa) fonte come “[^”\n]+”\.?[ \t]*\n", re.MULTILINE)
+
+
+@dataclass(frozen=True)
+class Citation:
+    """A cited chunk and the number of answer sentences it supports."""
+    chunk: Chunk
+    sentences: int
+
+    @property
+    def label(self) -> str:
+        """The human-readable reference, e.g. "PDTA ROV 2017 (ed. 29/06/2017), pag. 30"."""
+        return chunk_label(self.chunk)
+
+
+def chunk_label(chunk: Chunk) -> str:
+    """
+    Returns the reference of a chunk: document title and IOV section with its source pages,
+    or ROV 2017 page number.
+    """
+    title = DOCUMENT_TITLES.get(chunk.document, chunk.document)
+    if chunk.page is not None:
+        return f"{title}, pag. {chunk.page}"
+    if chunk.document == DOC_IOV and chunk.section:
+        heading = _HEADING_NUMBER_RE.sub("", chunk.title)
+        reference = f"{title}, Sezione {chunk.section} – {heading}"
+    else:
+        reference = f"{title}, {chunk.title}"
+    return f"{reference} (pagg. {chunk.source_pages})" if chunk.source_pages else reference
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Splits an answer into sentences and list items.
+    """
+    return [part.strip() for part in _SENTENCE_RE.split(text) if part and part.strip()]
+
+
+def cite(answer: str, registry: CorpusRegistry, max_citations: int = MAX_CITATIONS) -> List[Citation]:
+    """
+    Finds the chunks supporting an answer.
+
+    Each sentence is searched in the documents routed for it; the best chunk is kept when it
+    contains at least MIN_OVERLAP of the sentence's terms. Chunks are ranked by the number of
+    sentences they support, then by first appearance in the answer.
+
+    Args:
+        answer: The model's answer.
+        registry: The per-document indexes of the current corpus version.
+        max_citations: Maximum number of citations returned.
+
+    Returns:
+        The citations, most supported first.
+    """
+    support = {}
+    order = []
+    for sentence in split_sentences(answer):
+        sentence_terms = set(terms(sentence))
+        if len(sentence_terms) < MIN_SENTENCE_TERMS:
+            continue
+        results = registry.search(sentence, k=1)
+        if not results:
+            continue
+        chunk = results[0].chunk
+        overlap = len(sentence_terms & chunk_term_counts(chunk.text).keys()) / len(sentence_terms)
+        if overlap < MIN_OVERLAP:
+            continue
+        if chunk.chunk_id not in support:
+            order.append(chunk)
+        support[chunk.chunk_id] = support.get(chunk.chunk_id, 0) + 1
+    ranked = sorted(order, key=lambda chunk: -support[chunk.chunk_id])
+    return [Citation(chunk, support[chunk.chunk_id]) for chunk in ranked[:max_citations]]
+
+
+def format_citations(citations: Sequence[Citation]) -> Optional[str]:
+    """
+    Renders the citation block appended to the answer, or None if there is nothing to cite.
+    """
+    if not citations:
+        return None
+    lines = "\n".join(f"- {citation.label}" for citation in citations)
+    return f"\n\n{CITATIONS_HEADER}\n{lines}"
+
+
+def citations_enabled() -> bool:
+    """
+    Whether sources are appended to the answers locally (PDTA_LOCAL_CITATIONS, "on" by default).
+    """
+    return get_bool_setting("PDTA_LOCAL_CITATIONS", True)
+
+
+def citation_prompts(agent_instructions: str, pdta_text: str) -> Tuple[str, str]:
+    """
+    Adapts the prompts to the local citations: Rule 5 is replaced by LOCAL_CITATION_RULE and the
+    lines of the PDTA text asking to cite a document by its title are dropped. They sit in the
+    document headers, outside the chunks, so the parsed corpus is the same.
+
+    Args:
+        agent_instructions: The AGENT_INSTRUCTIONS prompt.
+        pdta_text: The PDTA text.
+
+    Returns:
+        The adapted instructions and PDTA text.
+    """
+    # Imported here: the prompts module holds the whole PDTA text and is only read when a corpus is built
+    from .prompts.agent_instructions import CITATION_RULE, LOCAL_CITATION_RULE
+
+    return agent_instructions.replace(CITATION_RULE, LOCAL_CITATION_RULE), _INLINE_CITATION_RE.sub("", pdta_text)
@@ -0,0 +1,156 @@
+"""
+Local clarification questions for under-specified clinical cases.
+
+Rule 4 of the agent instructions asks the model not to answer when the case lacks symptoms,
+risk factors or prior exams, and to ask 2-4 short targeted questions instead. This is the most
+common opening turn, so the slot detector below recognizes it locally and builds the questions
+from templates, saving a full-context model round-trip.
+
+Only patient case descriptions are considered: questions about procedures (bookings, codes,
+referrals) and cases with a confirmed diagnosis always go to the model.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from .config import get_bool_setting
+from .text import fold
+
+SLOT_SMOKING = "smoking"
+SLOT_SYMPTOMS = "symptoms"
+SLOT_DURATION = "duration"
+SLOT_IMAGING = "imaging"
+SLOT_IMAGING_RESULT = "imaging_result"
+SLOT_EXPOSURE = "exposure"
+
+_PATTERNS = {
+    SLOT_SMOKING: r"\bfum(o|a|ava|atore|atrice|atori)\b|sigarett|tabag|pacchi[ -/]?anno|\bp/?y\b",
+    SLOT_SYMPTOMS: (
+        r"toss|emoftoe|emottisi|dispnea|affanno|dolore toracico|dolore al torace|calo ponderale|"
+        r"dimagriment|perdita di peso|febbr|raucedine|disfonia|astenia|sudorazion|asintomatic|"
+        r"nessun sintomo|senza sintomi|sintomatologia|polmonit"
+    ),
+    SLOT_DURATION: (
+        r"\bda (circa |oltre |piu di |almeno )?(\d+|un|una|due|tre|quattro|cinque|sei|qualche|alcun[ie]|pochi) "
+        r"(giorn|settiman|mes|ann)|\bda (ieri|sempre)\b|recente|improvvis|cronic|persistent"
+    ),
+    SLOT_IMAGING: r"\brx\b|radiografi|\btc\b|\btac\b|tomografi|\bpet\b|ecografi|\brmn?\b",
+    SLOT_IMAGING_RESULT: (
+        r"nodul|opacit|massa|lesion|addensament|versamento|negativ|positiv|referto|esito|"
+        r"\d+\s?(mm|cm)\b|linfoaden|adenopati|nella norma|normale"
+    ),
+    SLOT_EXPOSURE: r"amianto|asbest|radon|esposizion|professional|familiarit",
+}
+_SLOT_RE = {slot: re.compile(pattern) for slot, pattern in _PATTERNS.items()}
+
+_CASE_RE = re.compile(
+    r"\bpaziente\b|\bpz\b|\bassistit[oa]\b|\buomo\b|\bdonna\b|\bsignor[ae]?\b|\bsig\.|\d+\s?(anni|aa)\b")
+_DIAGNOSIS_RE = re.compile(
+    r"istologic|citologic|diagnosi (di|confermata)|adenocarcinoma|carcinoma|microcitoma|mesotelioma|"
+    r"\bstadio\b|metastat|\bnsclc\b|\bsclc\b|in trattamento|gia seguit|operat[oa]\b")
+_PROCEDURAL_RE = re.compile(
+    r"impegnativ|prenot|\bcup\b|codic|\bcvp\b|\bntr\b|esenzion|case manager|\bgom\b|chi (e|si occupa)|"
+    r"indicator|responsabil|\braci\b|come (si )?(accede|invi|richied|attiv)")
+
+QUESTION_TEMPLATES = {
+    SLOT_SMOKING: "Il paziente è fumatore o ex fumatore? Se sì, da quanti anni e quante sigarette al giorno?",
+    SLOT_SYMPTOMS: ("Quali sintomi presenta (tosse persistente, emoftoe, dispnea, dolore toracico, "
+                    "calo ponderale, raucedine)?"),
+    SLOT_DURATION: "Da quanto tempo sono presenti i sintomi?",
+    SLOT_IMAGING: "Ha già eseguito una RX torace o una TC torace?",
+    SLOT_IMAGING_RESULT: "Qual è stato l'esito dell'esame (ad esempio nodulo, opacità o massa, con le dimensioni)?",
+    SLOT_EXPOSURE: ("Ci sono fattori di rischio professionali (ad esempio esposizione ad amianto) "
+                    "o familiarità per tumore del polmone?"),
+}
+
+CLARIFICATION_INTRO = "Per indicarti il percorso corretto secondo il PDTA ho bisogno di qualche informazione in più:"
+CLARIFICATION_OUTRO = ("Con queste informazioni potrò indicarti gli accertamenti da completare "
+                       "prima dell'invio allo IOV.")
+
+MIN_QUESTIONS = 2
+MAX_QUESTIONS = 4
+
+
+@dataclass
+class CaseSlots:
+    """The clinical facts detected in a message."""
+    is_case: bool
+    has_diagnosis: bool
+    procedural: bool
+    present: List[str] = field(default_factory=list)
+
+    def has(self, slot: str) -> bool:
+        return slot in self.present
+
+
+def detect_slots(message: str) -> CaseSlots:
+    """
+    Detects which clinical facts a message provides.
+
+    Args:
+        message: The user's message.
+
+    Returns:
+        The detected case type and slots.
+    """
+    text = fold(message)
+    return CaseSlots(
+        is_case=bool(_CASE_RE.search(text)),
+        has_diagnosis=bool(_DIAGNOSIS_RE.search(text)),
+        procedural=bool(_PROCEDURAL_RE.search(text)),
+        present=[slot for slot, pattern in _SLOT_RE.items() if pattern.search(text)],
+    )
+
+
+def missing_slots(slots: CaseSlots) -> List[str]:
+    """
+    Returns the facts to ask about, most important first.
+    """
+    missing = []
+    if not slots.has(SLOT_SYMPTOMS):
+        missing.append(SLOT_SYMPTOMS)
+    elif not slots.has(SLOT_DURATION):
+        missing.append(SLOT_DURATION)
+    if not slots.has(SLOT_SMOKING):
+        missing.append(SLOT_SMOKING)
+    if not slots.has(SLOT_IMAGING):
+        missing.append(SLOT_IMAGING)
+    elif not slots.has(SLOT_IMAGING_RESULT):
+        missing.append(SLOT_IMAGING_RESULT)
+    if not slots.has(SLOT_EXPOSURE):
+        missing.append(SLOT_EXPOSURE)
+    return missing
+
+
+def clarification_questions(message: str) -> Optional[List[str]]:
+    """
+    Returns the clarifying questions for an under-specified case, or None when the message
+    should go to the model (not a case, a diagnosed patient, a procedural question, or a case
+    already described well enough).
+
+    A case is under-specified when at least two of symptoms, smoking history and chest imaging
+    are missing; exposure is only asked about to complete the list.
+    """
+    slots = detect_slots(message)
+    if not slots.is_case or slots.has_diagnosis or slots.procedural:
+        return None
+    missing = missing_slots(slots)
+    core_missing = [slot for slot in missing if slot in (SLOT_SYMPTOMS, SLOT_SMOKING, SLOT_IMAGING)]
+    if len(core_missing) < MIN_QUESTIONS:
+        return None
+    return [QUESTION_TEMPLATES[slot] for slot in missing[:MAX_QUESTIONS]]
+
+
+def format_clarification(questions: List[str]) -> str:
+    """
+    Renders the clarifying questions as the agent's reply.
+    """
+    numbered = "\n".join(f"{index}. {question}" for index, question in enumerate(questions, 1))
+    return f"{CLARIFICATION_INTRO}\n\n{numbered}\n\n{CLARIFICATION_OUTRO}"
+
+
+def clarification_enabled() -> bool:
+    """
+    Whether the local clarification fast path is enabled (PDTA_CLARIFY_FAST_PATH, "on" by default).
+    """
+    return get_bool_setting("PDTA_CLARIFY_FAST_PATH", True)
@@ -0,0 +1,105 @@
+"""
+Configuration lookup for the agent.
+
+Settings are read, in order of precedence, from:
+
+1. the process environment;
+2. a `.env` file (loaded once, without overriding the environment);
+3. Streamlit secrets (`.streamlit/secrets.toml`), only when the app runs under Streamlit.
+
+Streamlit is never imported here: its secrets are consulted only if the module is already
+loaded, so workers, CLIs and tests do not pay its import cost.
+"""
+import logging
+import os
+import sys
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_dotenv_loaded = False
+_dotenv_lock = threading.Lock()
+
+
+def load_env_file() -> None:
+    """
+    Loads the `.env` file into the environment once per process.
+    """
+    global _dotenv_loaded
+    if _dotenv_loaded:
+        return
+    with _dotenv_lock:
+        if _dotenv_loaded:
+            return
+        try:
+            from dotenv import load_dotenv
+        except ImportError:
+            logger.debug("python-dotenv not installed, skipping .env file.")
+        else:
+            load_dotenv()
+        _dotenv_loaded = True
+
+
+def _streamlit_secret(name: str) -> Optional[str]:
+    streamlit = sys.modules.get("streamlit")
+    if streamlit is None:
+        return None
+    try:
+        value = streamlit.secrets.get(name)
+    except Exception:
+        # No secrets file, or secrets accessed outside a Streamlit runtime
+        return None
+    return str(value) if value is not None else None
+
+
+def get_setting(name: str, default: Optional[str] = None) -> Optional[str]:
+    """
+    Returns a configuration value from the environment, the `.env` file or Streamlit secrets.
+
+    Args:
+        name: The setting name, e.g. "OPENAI_API_KEY".
+        default: The value returned when the setting is not defined anywhere.
+
+    Returns:
+        The setting value, or `default`.
+    """
+    load_env_file()
+    value = os.environ.get(name)
+    if value is None:
+        value = _streamlit_secret(name)
+    return value if value is not None else default
+
+
+def get_int_setting(name: str, default: int) -> int:
+    """
+    Returns an integer setting, falling back to `default` when it is missing or invalid.
+    """
+    value = get_setting(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning("Invalid integer for %s: %r, using %s.", name, value, default)
+        return default
+
+
+_FALSE_VALUES = ("off", "0", "false", "no")
+_TRUE_VALUES = ("on", "1", "true", "yes")
+
+
+def get_bool_setting(name: str, default: bool) -> bool:
+    """
+    Returns an on/off setting ("off", "0", "false", "no" or "on", "1", "true", "yes", in any
+    case), falling back to `default` when it is missing or invalid.
+    """
+    value = (get_setting(name) or "").strip().lower()
+    if value == "":
+        return default
+    if value in _FALSE_VALUES:
+        return False
+    if value in _TRUE_VALUES:
+        return True
+    logger.warning("Invalid on/off value for %s: %r, using %s.", name, value, "on" if default else "off")
+    return default
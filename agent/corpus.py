@@ -0,0 +1,164 @@
+"""
+Structured view of the PDTA corpus embedded in the prompt module.
+
+`pdta_text` concatenates two documents:
+
+- the IOV document I_DG_PDTA08 Rev.01, summarized in BLOCCO 1-4 with numbered sections
+  (5.1-5.9, 6, 7, 8, ...);
+- the regional "PDTA ROV 2017" transcription, one "PAGINA N" entry per page.
+
+parse_pdta_text() splits it into chunks carrying their document, section and page, which
+the local components (scope detection, retrieval, citations) work on instead of the raw prompt.
+"""
+import functools
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from .text import fold, terms
+
+DOC_IOV = "iov"
+DOC_ROV_2017 = "rov2017"
+
+DOCUMENT_TITLES = {
+    DOC_IOV: "PDTA Tumore del Polmone – IOV, Revisione 01",
+    DOC_ROV_2017: "PDTA ROV 2017 (ed. 29/06/2017)",
+}
+
+NO_TEXT_MARKER = "(Nessun testo estraibile"
+
+_ROV_SPLIT_RE = re.compile(r"pdta2017_prompts_text\s*=\s*\"*")
+_BLOCK_RE = re.compile(r"^BLOCCO (\d+) – PAGINE ([\d\-–]+)\s*$", re.MULTILINE)
+_SECTION_RE = re.compile(r"^(\d+(?:\.\d+)?)\.?\s+([A-ZÀ-Ù]{3,}.*)$")
+_IOV_END_RE = re.compile(r"^OBIETTIVO COGNITIVO", re.MULTILINE)
+_PAGE_RE = re.compile(
+    r"Testo della pagina (\d+):\n(.*?)\nOutput atteso dal modello per la pagina \1:", re.DOTALL)
+_LOWERCASE_WORD_RE = re.compile(r"\b[a-zà-öø-ÿ']+\b")
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """A passage of the corpus with the metadata needed to cite it."""
+    chunk_id: str
+    document: str
+    title: str
+    text: str
+    section: Optional[str] = None
+    page: Optional[int] = None
+    source_pages: Optional[str] = None
+
+    @property
+    def has_text(self) -> bool:
+        return bool(self.text) and not self.text.startswith(NO_TEXT_MARKER)
+
+
+def _iov_chunks(text: str) -> List[Chunk]:
+    end = _IOV_END_RE.search(text)
+    if end:
+        text = text[:end.start()]
+    blocks = list(_BLOCK_RE.finditer(text))
+    chunks = []
+    for index, block in enumerate(blocks):
+        body_end = blocks[index + 1].start() if index + 1 < len(blocks) else len(text)
+        block_number, pages = block.group(1), block.group(2).replace("–", "-")
+        # Section headings split the block; text before the first heading belongs to the block
+        current: Tuple[Optional[str], str] = (None, f"BLOCCO {block_number}")
+        lines: List[str] = []
+
+        def flush():
+            body = "\n".join(line for line in lines if not line.startswith("=====")).strip()
+            if body:
+                section, title = current
+                chunk_id = f"{DOC_IOV}:{section}" if section else f"{DOC_IOV}:blocco{block_number}"
+                chunks.append(Chunk(chunk_id, DOC_IOV, title, body, section=section, source_pages=pages))
+
+        for line in text[block.end():body_end].splitlines():
+            heading = _SECTION_RE.match(line.strip())
+            if heading:
+                flush()
+                current, lines = (heading.group(1), line.strip()), [line.strip()]
+            else:
+                lines.append(line)
+        flush()
+    return chunks
+
+
+def _rov_chunks(text: str) -> List[Chunk]:
+    chunks = []
+    for match in _PAGE_RE.finditer(text):
+        page = int(match.group(1))
+        chunks.append(Chunk(
+            f"{DOC_ROV_2017}:p{page}", DOC_ROV_2017, f"PAGINA {page}", match.group(2).strip(), page=page))
+    return chunks
+
+
+def parse_pdta_text(text: str) -> List[Chunk]:
+    """
+    Splits the combined PDTA text into IOV section chunks and ROV 2017 page chunks.
+
+    Args:
+        text: The `pdta_text` string from the prompt module.
+
+    Returns:
+        The chunks, IOV sections first and then the ROV pages in page order.
+    """
+    parts = _ROV_SPLIT_RE.split(text, maxsplit=1)
+    rov_text = parts[1] if len(parts) > 1 else ""
+    return _iov_chunks(parts[0]) + _rov_chunks(rov_text)
+
+
+@functools.lru_cache(maxsize=4096)
+def chunk_term_counts(text: str) -> Counter:
+    """
+    Term counts of a chunk text. Cached by text, so rebuilding the corpus after an update
+    only analyzes the chunks whose text changed. Callers must not modify the result.
+    """
+    return Counter(terms(text))
+
+
+@dataclass
+class Corpus:
+    """
+    The parsed chunks plus the term statistics the local components need.
+    """
+    chunks: List[Chunk]
+    by_id: Dict[str, Chunk] = field(init=False)
+    document_frequency: Counter = field(init=False)
+
+    def __post_init__(self):
+        self.by_id = {chunk.chunk_id: chunk for chunk in self.chunks}
+        self.document_frequency = Counter()
+        for chunk in self.chunks:
+            self.document_frequency.update(chunk_term_counts(chunk.text).keys())
+
+    @property
+    def vocabulary(self):
+        return self.document_frequency.keys()
+
+    @functools.cached_property
+    def lowercase_words(self) -> FrozenSet[str]:
+        """
+        Folded words the corpus writes in lowercase: words of the text, unlike the names and
+        acronyms it only writes capitalized.
+        """
+        return frozenset(fold(word) for chunk in self.chunks for word in _LOWERCASE_WORD_RE.findall(chunk.text))
+
+    def idf(self, term: str) -> float:
+        """
+        Smoothed inverse document frequency of a term; unseen terms get the highest value.
+        """
+        return math.log((1 + len(self.chunks)) / (1 + self.document_frequency.get(term, 0))) + 1.0
+
+
+@functools.lru_cache(maxsize=1)
+def load_corpus() -> Corpus:
+    """
+    Parses the PDTA text of the prompt module, normalized unless PDTA_NORMALIZE is off. Cached:
+    the corpus is the same for the whole process.
+    """
+    from .normalize import normalize_enabled, normalize_text
+    from .prompts.agent_instructions import pdta_text
+
+    return Corpus(parse_pdta_text(normalize_text(pdta_text).text if normalize_enabled() else pdta_text))
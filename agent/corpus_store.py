@@ -0,0 +1,300 @@
+"""
+Hot-reloadable PDTA corpus.
+
+The corpus source is watched and, when it changes, a new CorpusVersion (parsed chunks, term
+statistics, per-document retrieval indexes, the exact-reference table, the parsed tables, the
+codes and numbers known to the grounding checks, the scope classifier, the near-duplicate clusters and the
+full-context and tool-mode instructions) is built in a background thread and swapped in with a single reference
+assignment. A turn reads `store.current` once when it starts and keeps that version until it
+ends, so turns in flight during a reload finish on the old version while the next ones use the
+new one. Sessions are not dropped.
+
+A new build is validated before the swap: a source without chunks, without one of the two
+documents or without its prompts is rejected and the current version stays in place.
+
+Rebuilds are incremental: term analysis is cached per chunk text, so only the pages and
+sections whose text changed are analyzed again. The OCR and layout artifacts of the transcription
+are normalized before parsing (agent/normalize.py). Near-duplicate passages (the page template
+of the ROV transcription) are replaced by back-references in the full-context instructions and
+in the passages served to the model, see agent/dedup.py.
+
+- PDTA_CORPUS_PATH: the source to watch. Either a Python module defining `pdta_text` (and
+  optionally the prompts in PROMPT_NAMES), read without importing it, or a plain
+  text file with the PDTA text. Defaults to agent/prompts/agent_instructions.py.
+- PDTA_CORPUS_RELOAD: "off" disables watching ("on" by default).
+- PDTA_CORPUS_RELOAD_INTERVAL: seconds between checks of the source (5 by default).
+- PDTA_INDEX_DIR: where the per-document index files are written (a private temporary
+  directory by default); PDTA_INDEX_MAX_LOADED: indexes kept in memory (4 by default).
+"""
+import ast
+import functools
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from . import metrics
+from .citations import citation_prompts, citations_enabled
+from .config import get_bool_setting, get_int_setting, get_setting
+from .corpus import DOCUMENT_TITLES, Chunk, Corpus, parse_pdta_text
+from .dedup import Deduplicator, dedup_enabled
+from .grounding import GroundingIndex
+from .normalize import RULES, normalize_enabled, normalize_text
+from .references import ReferenceIndex
+from .registry import CorpusRegistry
+from .scope import ScopeClassifier
+from .tables import TableSet
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts", "agent_instructions.py")
+
+
+@dataclass(frozen=True)
+class CorpusVersion:
+    """An immutable snapshot of the corpus and everything derived from it."""
+    version: int
+    digest: str
+    corpus: Corpus
+    registry: CorpusRegistry
+    references: ReferenceIndex
+    tables: TableSet
+    grounding: GroundingIndex
+    scope: ScopeClassifier
+    dedup: Optional[Deduplicator]
+    instructions: str
+    tools_instructions: str
+    changed_chunks: Tuple[str, ...] = ()
+    built_at: float = field(default_factory=time.time)
+
+    def passage_text(self, chunk: Chunk) -> str:
+        """
+        The text of a chunk as given to the model: tables in their dense rendering, near-duplicate passages replaced.
+        """
+        text = self.tables.dense_text(chunk)
+        return self.dedup.chunk_text(chunk.chunk_id, text) if self.dedup is not None else text
+
+
+PROMPT_NAMES = ("AGENT_INSTRUCTIONS", "PDTA_INSTRUCTIONS", "TOOLS_INSTRUCTIONS")
+
+
+def read_source(path: str) -> Dict[str, str]:
+    """
+    Reads the prompts and the PDTA text of a corpus source.
+
+    Args:
+        path: A Python module defining `pdta_text`, or a plain text file.
+
+    Returns:
+        `pdta_text` and the PROMPT_NAMES prompts; prompts the source does not define come
+        from the prompt module.
+    """
+    from .prompts import agent_instructions as defaults
+
+    with open(path, encoding="utf-8") as source:
+        content = source.read()
+    values = {name: getattr(defaults, name) for name in PROMPT_NAMES}
+    if not path.endswith(".py"):
+        values["pdta_text"] = content
+        return values
+    # Only string constants are read: the module is never executed
+    found = {}
+    for node in ast.parse(content).body:
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and isinstance(node.value.value, str):
+                    found[target.id] = node.value.value
+    if "pdta_text" not in found:
+        raise ValueError(f"{path} does not define pdta_text as a string constant.")
+    values.update((name, found[name]) for name in PROMPT_NAMES + ("pdta_text",) if name in found)
+    return values
+
+
+def validate_source(source: Dict[str, str], corpus: Corpus) -> None:
+    """
+    Rejects a source that parses but would leave the agent without its PDTA: no chunks, one of
+    the two documents missing, an empty prompt or instructions without the {pdta_text} slot.
+
+    Raises:
+        ValueError: Naming the first problem found.
+    """
+    if not corpus.chunks:
+        raise ValueError("the PDTA text has no chunks.")
+    missing = sorted(DOCUMENT_TITLES.keys() - {chunk.document for chunk in corpus.chunks})
+    if missing:
+        raise ValueError(f"the PDTA text has no chunks of {', '.join(missing)}.")
+    empty = [name for name in PROMPT_NAMES if not source.get(name, "").strip()]
+    if empty:
+        raise ValueError(f"empty prompts {', '.join(empty)}.")
+    if "{pdta_text}" not in source["PDTA_INSTRUCTIONS"]:
+        raise ValueError("PDTA_INSTRUCTIONS has no {pdta_text} placeholder.")
+
+
+def _digest(instructions: str) -> str:
+    return hashlib.sha1(instructions.encode("utf-8")).hexdigest()
+
+
+class CorpusStore:
+    """
+    Holds the current CorpusVersion and rebuilds it when the source changes.
+    """
+    def __init__(self, path: str = DEFAULT_SOURCE):
+        """
+        Args:
+            path: The corpus source (see the module docstring).
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._stat: Optional[Tuple[float, int]] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.current = self._build(None)
+        metrics.CORPUS_VERSION.set(self.current.version)
+
+    def _source_stat(self) -> Optional[Tuple[float, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime, stat.st_size
+
+    def _index_directory(self, digest: str) -> Optional[str]:
+        base = get_setting("PDTA_INDEX_DIR")
+        return os.path.join(base, digest[:12]) if base else None
+
+    def _build(self, previous: Optional[CorpusVersion]) -> CorpusVersion:
+        self._stat = self._source_stat()
+        source = read_source(self.path)
+        text, agent_instructions = source["pdta_text"], source["AGENT_INSTRUCTIONS"]
+        if citations_enabled():
+            agent_instructions, text = citation_prompts(agent_instructions, text)
+        tools_instructions = agent_instructions + source["TOOLS_INSTRUCTIONS"]
+        digest = _digest(agent_instructions + source["PDTA_INSTRUCTIONS"] + text + tools_instructions)
+        if previous is not None and digest == previous.digest:
+            return previous
+        started = time.perf_counter()
+        normalization = normalize_text(text) if normalize_enabled() else None
+        if normalization is not None:
+            text = normalization.text
+        corpus = Corpus(parse_pdta_text(text))
+        validate_source(source, corpus)
+        tables = TableSet(corpus)
+        # The full context carries the tables in their dense rendering, without the near-duplicates
+        dense = tables.densify(text)
+        dedup = Deduplicator(dense, {c.chunk_id: tables.dense_text(c) for c in corpus.chunks}) if dedup_enabled() else None
+        instructions = agent_instructions + source["PDTA_INSTRUCTIONS"].format(
+            pdta_text=dedup.text if dedup is not None else dense)
+        changed: Tuple[str, ...] = ()
+        if previous is not None:
+            old = previous.corpus.by_id
+            changed = tuple(sorted(
+                {c.chunk_id for c in corpus.chunks if c.chunk_id not in old or old[c.chunk_id].text != c.text}
+                | (old.keys() - corpus.by_id.keys())))
+        scope = ScopeClassifier(corpus)
+        version = CorpusVersion(
+            version=previous.version + 1 if previous is not None else 1,
+            digest=digest,
+            corpus=corpus,
+            registry=CorpusRegistry(corpus, self._index_directory(digest),
+                                    max_loaded=get_int_setting("PDTA_INDEX_MAX_LOADED", 4)),
+            references=ReferenceIndex(corpus),
+            tables=tables,
+            grounding=GroundingIndex(corpus),
+            scope=scope,
+            dedup=dedup,
+            instructions=instructions,
+            tools_instructions=tools_instructions,
+            changed_chunks=changed,
+        )
+        logger.info("Corpus version %d built from %s in %.0f ms: %d chunks, %d changed.", version.version,
+                    self.path, (time.perf_counter() - started) * 1000, len(corpus.chunks), len(changed))
+        if normalization is not None:
+            report = normalization.report()
+            logger.info("Normalized transcription: %s, %d -> %d tokens.",
+                        ", ".join(f"{rule} {report[rule]}" for rule in RULES),
+                        report["tokens_before"], report["tokens_after"])
+        report = scope.evaluate()
+        logger.info("Scope classifier: precision=%.2f recall=%.2f escalation_rate=%.2f on %d labeled questions.",
+                    report["precision"], report["recall"], report["escalation_rate"], report["examples"])
+        if dedup is not None:
+            report = dedup.report()
+            logger.info("Near-duplicates: %d clusters, %d passages replaced, %d -> %d tokens.", report["clusters"],
+                        report["replaced"], report["tokens_before"], report["tokens_after"])
+        return version
+
+    def reload(self) -> bool:
+        """
+        Rebuilds the corpus from the source and swaps it in if its content changed.
+        A source that fails to load, parse or validate (see validate_source) leaves the
+        current version in place.
+
+        Returns:
+            Whether a new version was installed.
+        """
+        with self._lock:
+            previous = self.current
+            try:
+                version = self._build(previous)
+            except Exception as e:
+                logger.error("Corpus reload from %s failed, keeping version %d: %s", self.path, previous.version, e)
+                metrics.CORPUS_RELOADS.inc(outcome="failed")
+                return False
+            if version is previous:
+                return False
+            # Single reference assignment: readers see either the old or the new version
+            self.current = version
+        metrics.CORPUS_RELOADS.inc(outcome="swapped")
+        metrics.CORPUS_VERSION.set(version.version)
+        return True
+
+    def check(self) -> bool:
+        """
+        Reloads if the source file changed since the last build.
+        """
+        stat = self._source_stat()
+        if stat is None or stat == self._stat:
+            return False
+        return self.reload()
+
+    def watch(self, interval: float = 5.0) -> None:
+        """
+        Starts a daemon thread checking the source every `interval` seconds. Idempotent.
+        """
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, args=(interval,), name="corpus-watcher", daemon=True)
+            self._watcher.start()
+        logger.info("Watching corpus source %s every %.0fs.", self.path, interval)
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Corpus watcher error")
+
+    def stop(self) -> None:
+        """Stops the watcher thread."""
+        self._stop.set()
+
+
+def corpus_reload_enabled() -> bool:
+    """
+    Whether the corpus source is watched for changes (PDTA_CORPUS_RELOAD, "on" by default).
+    """
+    return get_bool_setting("PDTA_CORPUS_RELOAD", True)
+
+
+@functools.lru_cache(maxsize=1)
+def default_corpus_store() -> CorpusStore:
+    """
+    The process-wide store configured by PDTA_CORPUS_PATH, watched unless PDTA_CORPUS_RELOAD is off.
+    """
+    store = CorpusStore(get_setting("PDTA_CORPUS_PATH") or DEFAULT_SOURCE)
+    if corpus_reload_enabled():
+        store.watch(get_int_setting("PDTA_CORPUS_RELOAD_INTERVAL", 5))
+    return store
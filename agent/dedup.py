@@ -0,0 +1,225 @@
+"""
+Near-duplicate elimination for the PDTA text with MinHash and LSH.
+
+The ROV 2017 transcription wraps every page in the same instructions ("Istruzione al
+modello: ...", "Output atteso dal modello per la pagina N: ...") that differ only by the page
+number, and some passages are repeated across pages. The "(Nessun testo estraibile)" notes of
+the empty pages are never replaced. When a corpus version is built, the text
+is split into passages at blank lines; each passage gets a MinHash signature of its word
+3-shingles, and the signatures are banded into an LSH table, so only passages sharing a band
+are compared. Candidates whose estimated Jaccard similarity reaches THRESHOLD are clustered:
+the first passage of each cluster is kept as the canonical one and the others are replaced by a
+back-reference to it ("[Testo ripetuto: vedi pag. 1]").
+
+The full-context instructions are built from the deduplicated text, and the passages served by
+the lookup tools drop the duplicates they contain. Retrieval keeps indexing the original
+chunks, so recall does not change. Signatures are cached per passage text, so a rebuild after
+an update only hashes the passages that changed.
+
+- PDTA_DEDUP: "off" keeps the text as it is ("on" by default).
+
+The clusters and the token reduction can be printed with `python -m agent.dedup`.
+"""
+import bisect
+import functools
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .config import get_bool_setting, get_setting
+from .corpus import NO_TEXT_MARKER
+from .text import tokenize
+from .tokens import estimate_tokens
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+# Estimated Jaccard similarity from which two passages are near-duplicates
+THRESHOLD = 0.8
+# Passages with fewer words are never replaced (headings, short list items)
+MIN_WORDS = 8
+
+_PASSAGE_SPLIT_RE = re.compile(r"\n[ \t]*\n")
+# Passages locating the text are always kept: page and block headings
+_STRUCTURAL_RE = re.compile(r"^(?:PAGINA \d+|BLOCCO \d+)", re.MULTILINE)
+# The opening line of a page text is kept, the text after it is a passage of its own
+_PAGE_TEXT_RE = re.compile(r"Testo della pagina \d+:[ \t]*\n")
+_HEADING_RE = re.compile(r"^(?:PAGINA (\d+)|BLOCCO (\d+) –)", re.MULTILINE)
+
+
+@functools.lru_cache(maxsize=4096)
+def signature(text: str) -> Tuple[int, ...]:
+    """
+    MinHash signature of the word 3-shingles of a passage. Cached by text.
+
+    One-permutation hashing: each shingle is hashed once into one of NUM_PERM bins and each bin
+    keeps its minimum; an empty bin takes the value of the next non-empty one.
+    """
+    words = tokenize(text)
+    bins: List[Optional[int]] = [None] * NUM_PERM
+    for i in range(max(1, len(words) - SHINGLE_SIZE + 1)):
+        digest = hashlib.blake2b(" ".join(words[i:i + SHINGLE_SIZE]).encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "big")
+        index, value = value % NUM_PERM, value // NUM_PERM
+        if bins[index] is None or value < bins[index]:
+            bins[index] = value
+    filled = [index for index, value in enumerate(bins) if value is not None]
+    if not filled:
+        return tuple([0] * NUM_PERM)
+    return tuple(bins[index] if bins[index] is not None
+                 else bins[filled[bisect.bisect_left(filled, index) % len(filled)]]
+                 for index in range(NUM_PERM))
+
+
+def similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """
+    Estimated Jaccard similarity of the passages of two signatures.
+    """
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+@dataclass(frozen=True)
+class Passage:
+    """A passage of the text: its position and the page or block it belongs to."""
+    start: int
+    end: int
+    text: str
+    label: str
+
+
+@dataclass(frozen=True)
+class Cluster:
+    """Near-duplicate passages: the canonical one (kept) and its duplicates (replaced)."""
+    canonical: Passage
+    duplicates: Tuple[Passage, ...]
+
+
+def _passages(text: str) -> List[Passage]:
+    headings = [(m.start(), f"pag. {m.group(1)}" if m.group(1) else f"blocco {m.group(2)}")
+                for m in _HEADING_RE.finditer(text)]
+    offsets = [offset for offset, _ in headings]
+    passages = []
+    start = 0
+    for separator in list(_PASSAGE_SPLIT_RE.finditer(text)) + [None]:
+        end = separator.start() if separator is not None else len(text)
+        opening = _PAGE_TEXT_RE.match(text, start, end)
+        if opening:
+            start = opening.end()
+        body = text[start:end].strip()
+        if body:
+            offset = start + text[start:end].index(body)
+            index = bisect.bisect_right(offsets, offset) - 1
+            passages.append(Passage(offset, offset + len(body), body, headings[index][1] if index >= 0 else "inizio"))
+        start = separator.end() if separator is not None else len(text)
+    return passages
+
+
+class Deduplicator:
+    """
+    The near-duplicate clusters of a text and its deduplicated version.
+    """
+    def __init__(self, text: str, chunk_texts: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            text: The text to deduplicate (the PDTA text of the instructions).
+            chunk_texts: The text served for each chunk, found verbatim in `text`: the
+                duplicates inside a chunk are dropped from it as well.
+        """
+        self.original = text
+        # The note of a page without text is already short and tells the model the page is empty
+        candidates = [p for p in _passages(text) if len(p.text.split()) >= MIN_WORDS
+                      and not _STRUCTURAL_RE.search(p.text) and NO_TEXT_MARKER not in p.text]
+        signatures = [signature(p.text) for p in candidates]
+        buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+        for index, sig in enumerate(signatures):
+            for band in range(BANDS):
+                buckets.setdefault((band, sig[band * ROWS:(band + 1) * ROWS]), []).append(index)
+        # Union-find over the candidate pairs confirmed by the full signatures
+        parent = list(range(len(candidates)))
+
+        def root(index: int) -> int:
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+            return index
+
+        compared = set()
+        for members in buckets.values():
+            for i, a in enumerate(members):
+                for b in members[i + 1:]:
+                    if (a, b) in compared:
+                        continue
+                    compared.add((a, b))
+                    if similarity(signatures[a], signatures[b]) >= THRESHOLD:
+                        parent[max(root(a), root(b))] = min(root(a), root(b))
+        groups: Dict[int, List[Passage]] = {}
+        for index, passage in enumerate(candidates):
+            groups.setdefault(root(index), []).append(passage)
+        self.clusters = [Cluster(group[0], tuple(group[1:])) for group in groups.values() if len(group) > 1]
+
+        # The duplicates are replaced only where the back-reference is shorter
+        self.replacements: List[Tuple[Passage, str]] = []
+        for cluster in self.clusters:
+            reference = f"[Testo ripetuto: vedi {cluster.canonical.label}]"
+            for duplicate in cluster.duplicates:
+                if estimate_tokens(reference) < estimate_tokens(duplicate.text):
+                    self.replacements.append((duplicate, reference))
+        self.replacements.sort(key=lambda replacement: replacement[0].start)
+        parts, position = [], 0
+        for duplicate, reference in self.replacements:
+            parts += [text[position:duplicate.start], reference]
+            position = duplicate.end
+        self.text = "".join(parts) + text[position:]
+
+        self._chunk_replacements: Dict[str, List[Tuple[str, str]]] = {}
+        for chunk_id, chunk_text in (chunk_texts or {}).items():
+            start = text.find(chunk_text)
+            if start < 0:
+                continue
+            inside = [(d.text, reference) for d, reference in self.replacements
+                      if start <= d.start and d.end <= start + len(chunk_text)]
+            if inside:
+                self._chunk_replacements[chunk_id] = inside
+
+    def chunk_text(self, chunk_id: str, text: str) -> str:
+        """
+        Returns the text served for a chunk without the duplicates it contains.
+        """
+        for duplicate, reference in self._chunk_replacements.get(chunk_id, ()):
+            text = text.replace(duplicate, reference, 1)
+        return text
+
+    def report(self) -> Dict[str, int]:
+        """
+        Returns the clusters found, the passages replaced and the estimated tokens before and after.
+        """
+        return {
+            "clusters": len(self.clusters),
+            "replaced": len(self.replacements),
+            "tokens_before": estimate_tokens(self.original),
+            "tokens_after": estimate_tokens(self.text),
+        }
+
+
+def dedup_enabled() -> bool:
+    """
+    Whether near-duplicate passages are replaced by back-references (PDTA_DEDUP, "on" by default).
+    """
+    return get_bool_setting("PDTA_DEDUP", True)
+
+
+if __name__ == "__main__":
+    from .corpus_store import DEFAULT_SOURCE, read_source
+    from .normalize import normalize_enabled, normalize_text
+
+    text = read_source(get_setting("PDTA_CORPUS_PATH") or DEFAULT_SOURCE)["pdta_text"]
+    deduplicator = Deduplicator(normalize_text(text).text if normalize_enabled() else text)
+    for cluster in deduplicator.clusters:
+        labels = ", ".join(duplicate.label for duplicate in cluster.duplicates)
+        print(f"{cluster.canonical.label} ({len(cluster.duplicates)} duplicates: {labels[:120]})")
+        print(f"    {cluster.canonical.text[:100]!r}")
+    report = deduplicator.report()
+    print(f"{report['clusters']} clusters, {report['replaced']} passages replaced: "
+          f"{report['tokens_before']} -> {report['tokens_after']} tokens")
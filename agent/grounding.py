@@ -0,0 +1,184 @@
+"""
+Incremental grounding checks on the streamed answer.
+
+Rule 1 of the agent instructions forbids content that is not in the PDTA. Checking a finished
+answer would mean buffering it and losing the streaming time-to-first-token, so
+GroundingValidator checks the answer while it streams: each chunk is added to a pending
+buffer, and every sentence it completes is checked against the corpus:
+
+- lexical overlap: the sentence is searched in the routed documents, and the top SEARCH_K
+  passages together with the user's messages (an answer restates the case) must contain at
+  least MIN_OVERLAP of its terms, the threshold used for citations;
+- codes and numbers: procedure and prestazione codes (I_DON_P04, CVP 89.7B.6_2) and numbers
+  (ages, doses, percentages, days) must occur in the PDTA or in the user's messages.
+
+The cost is bounded per chunk: a chunk only extends the buffer, and a completed sentence costs
+one search over the routed documents (a fraction of a millisecond). Short sentences and
+questions are not checked.
+
+- PDTA_GROUNDING: "flag" (default) records the unsupported sentences in the turn span, the
+  logs and the metrics; "halt" also stops the stream at the first one and tells the user;
+  "off" disables the checks.
+"""
+import re
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Optional, Set
+
+from .citations import MIN_OVERLAP, MIN_SENTENCE_TERMS
+from .config import get_setting
+from .corpus import Corpus, chunk_term_counts
+from .references import CODE_RE, PRESTAZIONE_RE
+from .text import terms
+
+if TYPE_CHECKING:
+    from .corpus_store import CorpusVersion
+
+GROUNDING_OFF = "off"
+GROUNDING_FLAG = "flag"
+GROUNDING_HALT = "halt"
+
+FINDING_UNSUPPORTED = "unsupported"
+FINDING_CODE = "unknown_code"
+FINDING_NUMBER = "unknown_number"
+
+# Passages compared with each sentence
+SEARCH_K = 3
+
+HALT_NOTICE = (
+    "Risposta interrotta: la parte successiva non trovava riscontro nel PDTA. "
+    "Riformula la domanda o consulta direttamente il documento."
+)
+
+# A sentence ends at . ! ? ; : followed by whitespace, or at a line break
+_BOUNDARY_RE = re.compile(r"(?<=[.!?;:])\s+|\n+")
+_NUMBER_RE = re.compile(r"(?<![\w.])\d+(?:[.,]\d+)*%?")
+
+
+def _numbers(text: str) -> Set[str]:
+    """
+    The numbers of a text worth verifying: at least two digits, or decimal, or a percentage.
+    """
+    found = set()
+    for match in _NUMBER_RE.finditer(text):
+        number = match.group(0).rstrip("%").replace(",", ".").rstrip(".")
+        if len(number.replace(".", "")) >= 2 or "." in number or match.group(0).endswith("%"):
+            found.add(number)
+    return found
+
+
+def _codes(text: str) -> Set[str]:
+    return {m.group(0).upper() for m in CODE_RE.finditer(text.upper())} | \
+           {m.group(2) for m in PRESTAZIONE_RE.finditer(text.upper())}
+
+
+def _strip_codes(text: str) -> str:
+    return PRESTAZIONE_RE.sub(" ", CODE_RE.sub(" ", text))
+
+
+class GroundingIndex:
+    """
+    The codes and numbers occurring in a corpus version.
+    """
+    def __init__(self, corpus: Corpus):
+        """
+        Args:
+            corpus: The parsed PDTA corpus.
+        """
+        text = "\n".join(chunk.text for chunk in corpus.chunks)
+        self.codes = _codes(text)
+        self.numbers = _numbers(_strip_codes(text))
+
+
+@dataclass(frozen=True)
+class Finding:
+    """A sentence of the answer that the checks could not ground, and why."""
+    sentence: str
+    kind: str
+    detail: str
+
+
+class GroundingValidator:
+    """
+    Checks the sentences of one streamed answer as they complete.
+    """
+    def __init__(self, version: "CorpusVersion", context: str = ""):
+        """
+        Args:
+            version: The corpus version of the turn.
+            context: The user's messages: the terms, codes and numbers they contain count as grounded.
+        """
+        self.version = version
+        self.index = version.grounding
+        self.context_terms = set(terms(context))
+        self.context_codes = _codes(context)
+        self.context_numbers = _numbers(_strip_codes(context))
+        self.pending = ""
+        self.findings: List[Finding] = []
+        self.sentences = 0
+        # Seconds spent in the passage searches, reported in the retrieval stage of the turn
+        self.retrieval_s = 0.0
+
+    def feed(self, chunk: str) -> List[Finding]:
+        """
+        Adds a streamed chunk and checks the sentences it completes.
+
+        Returns:
+            The findings of the completed sentences (empty when they are grounded).
+        """
+        self.pending += chunk
+        parts = _BOUNDARY_RE.split(self.pending)
+        if len(parts) == 1:
+            return []
+        self.pending = parts[-1]
+        findings = []
+        for sentence in parts[:-1]:
+            findings.extend(self.check(sentence))
+        return findings
+
+    def finish(self) -> List[Finding]:
+        """
+        Checks the last sentence once the stream has ended.
+        """
+        sentence, self.pending = self.pending, ""
+        return self.check(sentence)
+
+    def check(self, sentence: str) -> List[Finding]:
+        """
+        Checks one sentence: its codes and numbers, then its overlap with the best passages.
+        """
+        sentence = sentence.strip()
+        if not sentence or sentence.endswith("?"):
+            return []
+        findings = []
+        for code in sorted(_codes(sentence) - self.index.codes - self.context_codes):
+            findings.append(Finding(sentence, FINDING_CODE, code))
+        for number in sorted(_numbers(_strip_codes(sentence)) - self.index.numbers - self.context_numbers):
+            findings.append(Finding(sentence, FINDING_NUMBER, number))
+        sentence_terms = set(terms(sentence))
+        if len(sentence_terms) >= MIN_SENTENCE_TERMS:
+            self.sentences += 1
+            unmatched = sentence_terms - self.context_terms
+            started = time.perf_counter()
+            results = self.version.registry.search(sentence, k=SEARCH_K)
+            self.retrieval_s += time.perf_counter() - started
+            for scored in results:
+                unmatched -= chunk_term_counts(scored.chunk.text).keys()
+            overlap = 1 - len(unmatched) / len(sentence_terms)
+            if overlap < MIN_OVERLAP:
+                findings.append(Finding(sentence, FINDING_UNSUPPORTED, f"overlap {overlap:.2f}"))
+        self.findings.extend(findings)
+        return findings
+
+
+def grounding_mode(value: Optional[str] = None) -> str:
+    """
+    Returns the grounding check mode: GROUNDING_FLAG (the default), GROUNDING_HALT or
+    GROUNDING_OFF. Reads PDTA_GROUNDING when no value is given.
+    """
+    mode = (value or get_setting("PDTA_GROUNDING", GROUNDING_FLAG) or GROUNDING_FLAG).lower()
+    if mode in ("0", "false", "no"):
+        return GROUNDING_OFF
+    if mode not in (GROUNDING_OFF, GROUNDING_FLAG, GROUNDING_HALT):
+        raise ValueError(f"Unknown grounding mode '{mode}'. Use {GROUNDING_FLAG}, {GROUNDING_HALT} or {GROUNDING_OFF}.")
+    return mode
@@ -0,0 +1,223 @@
+"""
+Input checks run by the SDK as input guardrails of the model call.
+
+The scope check runs in parallel with the model request: on the happy path it costs no
+wall-clock time, and when it trips the model call is cancelled and the agent answers with the
+check's fixed reply. A streamed run only raises the SDK tripwire once the model response is
+complete, so a tripped check also notifies the run context (its `input_tripwire` method, if
+any), which stops the stream right away. The safety and phi checks block instead: they run
+before the request is dispatched, so a message carrying patient identifiers or a prompt
+extraction attempt never reaches the model provider. They are local regular expressions and
+add well under a millisecond to the turn.
+
+- scope: the local scope classifier on follow-up messages (the opening message is checked
+  before the run by the local answer fast path, see agent/scope.py);
+- safety: attempts to override the instructions or to extract the system prompt;
+- phi: direct patient identifiers (codice fiscale, e-mail, phone number, name after a title),
+  which must not reach the model provider. The message is redacted in the history.
+
+Each check times itself: the durations are reported in the "guardrails" stage of the turn,
+separately from the model call.
+
+- PDTA_GUARDRAILS: "off" disables the checks, or a comma-separated subset of them
+  (e.g. "safety,phi"); all of them by default. The scope check also needs PDTA_SCOPE_FILTER.
+"""
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
+
+from .config import get_setting
+from .scope import OUT_OF_SCOPE, OUT_OF_SCOPE_REPLY, ScopeClassifier
+from .text import fold
+
+GUARDRAIL_SCOPE = "scope"
+GUARDRAIL_SAFETY = "safety"
+GUARDRAIL_PHI = "phi"
+GUARDRAILS = (GUARDRAIL_SCOPE, GUARDRAIL_SAFETY, GUARDRAIL_PHI)
+
+SAFETY_REPLY = (
+    "Non posso modificare le mie istruzioni né rivelarle. "
+    "Posso aiutarti con questioni relative al PDTA del Polmone."
+)
+PHI_REPLY = (
+    "Per tutelare la privacy del paziente non inserire dati identificativi (nome e cognome, codice "
+    "fiscale, recapiti). Riformula la domanda descrivendo solo gli elementi clinici del caso."
+)
+
+_SAFETY_RE = re.compile(
+    r"ignora\w* (tutte )?(le |queste |le tue |le precedenti )?(istruzion|regol)|dimentica\w* (tutte )?(le |le tue )?(istruzion|regol)|"
+    r"ignore (all |any |the |your )?(previous |prior )?(instructions|rules)|disregard (all |the |your )?(previous )?instructions|"
+    r"(system|developer) prompt|prompt di sistema|istruzioni di sistema|(mostra|rivela|stampa|ripeti|scrivi|dimmi)\w* "
+    r"(tutte )?(le tue|le sue) istruzioni|(mostra|rivela|stampa|ripeti|scrivi|dimmi)\w* (il tuo |il )prompt\b|"
+    r"jailbreak|modalita sviluppatore|developer mode|\bdan mode\b|fingi di (essere|non avere)")
+_PHI_PATTERNS = (
+    re.compile(r"\b[A-Z]{6}\d{2}[A-Z]\d{2}[A-Z]\d{3}[A-Z]\b", re.IGNORECASE),
+    re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.-]+\b"),
+    re.compile(r"(?:\+39[\s-]?)?\b3\d{2}[\s-]?\d{6,7}\b|\b0\d{1,3}[\s-]?\d{6,8}\b"),
+    re.compile(r"\b(?i:sig(?:\.|nor[ae]?)|paziente|pz\.?)\s+([A-Z][a-zà-ù']+)\s+([A-Z][a-zà-ù']+)"),
+)
+_NAME_PATTERN = 3
+
+
+class InputCheckTripped(Exception):
+    """Raised when a streamed run is stopped by a tripped input check."""
+    def __init__(self, info: Dict[str, Any]):
+        super().__init__(f"Input check '{info.get('name')}' tripped")
+        self.info = info
+
+
+@dataclass
+class CheckResult:
+    """The outcome of a check: whether it trips and the reply given instead of the model's."""
+    tripped: bool
+    reply: Optional[str] = None
+    detail: Optional[str] = None
+
+
+def last_user_message(input: Any) -> str:
+    """
+    Returns the text of the last user message of a model input.
+    """
+    if isinstance(input, str):
+        return input
+    for item in reversed(input or []):
+        if isinstance(item, dict) and item.get("role") == "user":
+            content = item.get("content")
+            return content if isinstance(content, str) else ""
+    return ""
+
+
+def _user_messages(input: Any) -> int:
+    if isinstance(input, str):
+        return 1
+    return sum(1 for item in input or [] if isinstance(item, dict) and item.get("role") == "user")
+
+
+def check_safety(message: str) -> CheckResult:
+    """
+    Trips on attempts to override the agent's instructions or to read them.
+    """
+    match = _SAFETY_RE.search(fold(message))
+    return CheckResult(True, SAFETY_REPLY, match.group(0)) if match else CheckResult(False)
+
+
+def _is_name(match: re.Match, common_words: FrozenSet[str]) -> bool:
+    # "paziente Non Fumatore" is a capitalized description, not a name: the corpus writes its words in lowercase
+    return not any(fold(word) in common_words for word in match.groups())
+
+
+def check_phi(message: str, common_words: FrozenSet[str] = frozenset()) -> CheckResult:
+    """
+    Trips on direct patient identifiers: codice fiscale, e-mail, phone number, name and surname after a title.
+
+    Args:
+        message: The user's message.
+        common_words: Folded words written in lowercase by the corpus (Corpus.lowercase_words);
+            two capitalized words after a title are only taken for a name if neither is one of them.
+    """
+    for index, pattern in enumerate(_PHI_PATTERNS):
+        if index == _NAME_PATTERN:
+            found = any(_is_name(match, common_words) for match in pattern.finditer(message))
+        else:
+            found = pattern.search(message) is not None
+        if found:
+            # The identifier itself is never kept: only which pattern matched
+            return CheckResult(True, PHI_REPLY, f"pattern {index}")
+    return CheckResult(False)
+
+
+def _scope_check(classifier: ScopeClassifier) -> Callable[[str], CheckResult]:
+    def check_scope(message: str) -> CheckResult:
+        decision = classifier.classify(message)
+        if decision.label == OUT_OF_SCOPE:
+            return CheckResult(True, OUT_OF_SCOPE_REPLY, f"score {decision.score:.2f}")
+        return CheckResult(False)
+    return check_scope
+
+
+def _phi_check(common_words: FrozenSet[str]) -> Callable[[str], CheckResult]:
+    def check(message: str) -> CheckResult:
+        return check_phi(message, common_words)
+    return check
+
+
+def _guardrail(name: str, check: Callable[[str], CheckResult], follow_ups_only: bool = False, blocking: bool = False):
+    from agents import GuardrailFunctionOutput, InputGuardrail
+
+    def run(context, agent, input) -> GuardrailFunctionOutput:
+        started = time.perf_counter()
+        if follow_ups_only and _user_messages(input) <= 1:
+            result = CheckResult(False)
+        else:
+            result = check(last_user_message(input))
+        info = {"name": name, "reply": result.reply, "detail": result.detail,
+                "duration_s": time.perf_counter() - started}
+        notify = getattr(context.context, "input_tripwire", None)
+        if result.tripped and notify is not None:
+            notify(info)
+        return GuardrailFunctionOutput(output_info=info, tripwire_triggered=result.tripped)
+
+    return InputGuardrail(guardrail_function=run, name=name, run_in_parallel=not blocking)
+
+
+def enabled_guardrails() -> List[str]:
+    """
+    Returns the checks enabled by PDTA_GUARDRAILS.
+    """
+    value = (get_setting("PDTA_GUARDRAILS", "on") or "on").lower().strip()
+    if value in ("off", "0", "false", "no", "none"):
+        return []
+    if value in ("on", "1", "true", "yes", "all"):
+        return list(GUARDRAILS)
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in GUARDRAILS]
+    if unknown:
+        raise ValueError(f"Unknown guardrails {unknown}. Use a subset of {', '.join(GUARDRAILS)}.")
+    return names
+
+
+def input_guardrails(scope_classifier: Optional[ScopeClassifier] = None, names: Optional[List[str]] = None,
+                     common_words: FrozenSet[str] = frozenset()) -> List:
+    """
+    Builds the SDK input guardrails for the enabled checks.
+
+    Args:
+        scope_classifier: The local scope classifier; without it the scope check is skipped.
+        names: The checks to build. Defaults to enabled_guardrails().
+        common_words: The corpus words the phi check never takes for a name (Corpus.lowercase_words).
+
+    Returns:
+        InputGuardrail instances: the scope check runs in parallel with the model call, the
+        safety and phi checks before it.
+    """
+    names = enabled_guardrails() if names is None else names
+    guardrails = []
+    if GUARDRAIL_SCOPE in names and scope_classifier is not None:
+        guardrails.append(_guardrail(GUARDRAIL_SCOPE, _scope_check(scope_classifier), follow_ups_only=True))
+    if GUARDRAIL_SAFETY in names:
+        guardrails.append(_guardrail(GUARDRAIL_SAFETY, check_safety, blocking=True))
+    if GUARDRAIL_PHI in names:
+        guardrails.append(_guardrail(GUARDRAIL_PHI, _phi_check(common_words), blocking=True))
+    return guardrails
+
+
+def tripwire_info(error: Exception) -> Dict[str, Any]:
+    """
+    Returns the output of the tripped check from InputCheckTripped or the SDK's InputGuardrailTripwireTriggered.
+    """
+    if isinstance(error, InputCheckTripped):
+        return error.info
+    result = error.guardrail_result
+    return dict(result.output.output_info or {}, name=(result.output.output_info or {}).get("name") or result.guardrail.get_name())
+
+
+def guardrail_timings(results) -> Dict[str, float]:
+    """
+    Returns the duration of each check from the SDK's InputGuardrailResult list.
+    """
+    timings = {}
+    for result in results or []:
+        info = result.output.output_info or {}
+        timings[info.get("name") or result.guardrail.get_name()] = info.get("duration_s", 0.0)
+    return timings
@@ -0,0 +1,237 @@
+"""
+Per-turn latency instrumentation.
+
+Each user turn is broken down into stage spans (local answer, retrieval, prompt assembly, queue wait,
+input checks, model time-to-first-token, streaming, grounding checks, citations, history
+persistence, UI rendering) carrying their duration and token counts. The input checks run
+concurrently with the model call, so their span overlaps the model's. Spans are handed to a
+pluggable sink as soon as a stage ends:
+
+- LogSink: one structured log line per span;
+- JsonlSink: one JSON object per line in a local file;
+- OpenTelemetrySink: forwards spans to the configured OpenTelemetry tracer provider.
+
+The sink is chosen with the PDTA_SPAN_SINK environment variable
+("none", "log", "jsonl:<path>", "otel" or a comma-separated combination).
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from .config import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages, in the order they occur during a turn
+STAGE_LOCAL_ANSWER = "local_answer"
+STAGE_RETRIEVAL = "retrieval"
+STAGE_PROMPT_ASSEMBLY = "prompt_assembly"
+STAGE_QUEUE_WAIT = "queue_wait"
+STAGE_GUARDRAILS = "guardrails"
+STAGE_MODEL_TTFT = "model_ttft"
+STAGE_STREAMING = "streaming"
+STAGE_GROUNDING = "grounding"
+STAGE_MODEL_CALL = "model_call"
+STAGE_CITATIONS = "citations"
+STAGE_HISTORY_PERSISTENCE = "history_persistence"
+STAGE_UI_RENDER = "ui_render"
+STAGE_TURN = "turn"
+
+
+@dataclass
+class StageSpan:
+    """A timed pipeline stage of one turn."""
+    turn_id: str
+    name: str
+    start_time: float
+    duration_s: float
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class SpanSink:
+    """
+    Base class for span sinks. Subclasses must be safe to call from several threads.
+    """
+    def export(self, span: StageSpan) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class NullSink(SpanSink):
+    """Discards every span."""
+    def export(self, span: StageSpan) -> None:
+        pass
+
+
+class LogSink(SpanSink):
+    """Writes one structured log line per span."""
+    def __init__(self, level: int = logging.INFO):
+        self.level = level
+        self.logger = logging.getLogger("agent.spans")
+
+    def export(self, span: StageSpan) -> None:
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, "span %s", json.dumps(span.to_dict(), ensure_ascii=False, default=str))
+
+
+class JsonlSink(SpanSink):
+    """Appends spans as JSON lines to a local file."""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def export(self, span: StageSpan) -> None:
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as output:
+                output.write(line + "\n")
+
+
+class OpenTelemetrySink(SpanSink):
+    """
+    Forwards spans to OpenTelemetry. Requires the `opentelemetry-api` package; exporters
+    (OTLP, console, ...) are configured through the usual OpenTelemetry SDK setup.
+    """
+    def __init__(self, tracer_name: str = "pdta-agent"):
+        try:
+            from opentelemetry import trace as otel_trace
+        except ImportError as e:
+            raise ValueError("OpenTelemetry span sink requires the 'opentelemetry-api' package.") from e
+        self.tracer = otel_trace.get_tracer(tracer_name)
+
+    def export(self, span: StageSpan) -> None:
+        attributes = {"pdta.turn_id": span.turn_id}
+        for key, value in span.attributes.items():
+            if isinstance(value, (str, bool, int, float)):
+                attributes[f"pdta.{key}"] = value
+        start_ns = int(span.start_time * 1e9)
+        otel_span = self.tracer.start_span(span.name, start_time=start_ns, attributes=attributes)
+        otel_span.end(end_time=start_ns + int(span.duration_s * 1e9))
+
+
+class MultiSink(SpanSink):
+    """Fans spans out to several sinks."""
+    def __init__(self, sinks: List[SpanSink]):
+        self.sinks = sinks
+
+    def export(self, span: StageSpan) -> None:
+        for sink in self.sinks:
+            try:
+                sink.export(span)
+            except Exception as e:
+                logger.warning("Span sink %s failed: %s", type(sink).__name__, e)
+
+    def shutdown(self) -> None:
+        for sink in self.sinks:
+            sink.shutdown()
+
+
+def sink_from_spec(spec: Optional[str]) -> SpanSink:
+    """
+    Builds a span sink from a specification such as "log", "jsonl:spans.jsonl" or "log,otel".
+
+    Args:
+        spec: The sink specification; empty or "none" disables span export.
+
+    Returns:
+        The configured sink.
+    """
+    sinks: List[SpanSink] = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part or part == "none":
+            continue
+        kind, _, argument = part.partition(":")
+        if kind == "log":
+            sinks.append(LogSink())
+        elif kind == "jsonl":
+            sinks.append(JsonlSink(argument or "spans.jsonl"))
+        elif kind == "otel":
+            sinks.append(OpenTelemetrySink())
+        else:
+            raise ValueError(f"Unknown span sink '{kind}'. Use none, log, jsonl:<path> or otel.")
+    if not sinks:
+        return NullSink()
+    return sinks[0] if len(sinks) == 1 else MultiSink(sinks)
+
+
+def sink_from_env() -> SpanSink:
+    """
+    Builds the span sink configured by the PDTA_SPAN_SINK environment variable.
+    """
+    return sink_from_spec(get_setting("PDTA_SPAN_SINK", "none"))
+
+
+class TurnSpans:
+    """
+    Collects the stage spans of a single turn and exports each one as soon as it ends.
+    """
+    def __init__(self, sink: SpanSink, turn_id: Optional[str] = None, **attributes: Any):
+        """
+        Args:
+            sink: Where finished spans are sent.
+            turn_id: Identifier shared by all spans of the turn; generated if omitted.
+            **attributes: Attributes attached to the final turn span.
+        """
+        self.sink = sink
+        self.turn_id = turn_id or uuid.uuid4().hex
+        self.attributes: Dict[str, Any] = dict(attributes)
+        self.durations: Dict[str, float] = {}
+        self._start_time = time.time()
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Times a stage. The yielded dictionary can be filled with attributes (e.g. token counts)
+        while the stage runs.
+        """
+        start_time = time.time()
+        start = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            self.record(name, start_time, time.perf_counter() - start, **attributes)
+
+    def record(self, name: str, start_time: float, duration_s: float, **attributes: Any) -> None:
+        """
+        Exports a stage measured by the caller.
+
+        Args:
+            name: The stage name.
+            start_time: Wall-clock start of the stage (seconds since the epoch).
+            duration_s: The stage duration in seconds.
+            **attributes: Extra attributes such as token counts.
+        """
+        self.durations[name] = self.durations.get(name, 0.0) + duration_s
+        try:
+            self.sink.export(StageSpan(self.turn_id, name, start_time, duration_s, attributes))
+        except Exception as e:
+            logger.warning("Failed to export span '%s': %s", name, e)
+
+    def elapsed(self) -> float:
+        """
+        Returns the seconds elapsed since the turn started.
+        """
+        return time.perf_counter() - self._start
+
+    def finish(self, **attributes: Any) -> None:
+        """
+        Exports the enclosing turn span with the per-stage durations and the given attributes.
+        """
+        self.attributes.update(attributes)
+        self.attributes["stages_s"] = dict(self.durations)
+        self.record(STAGE_TURN, self._start_time, self.elapsed(), **self.attributes)
@@ -0,0 +1,156 @@
+"""
+Logging pipeline for the app.
+
+- Records are handed to a bounded in-memory queue and written by a background listener
+  thread, so the request path never blocks on I/O (records are dropped if the queue is full).
+- Messages use lazy %-style formatting: nothing is formatted unless the level is enabled.
+- Clinical free text (patient messages, history, model answers) is wrapped in LogPayload,
+  which is only rendered when the record is written and, depending on PDTA_LOG_PAYLOADS, logs:
+    * "metadata" (default): length and a short hash, no text;
+    * "redacted": text with identifiers masked, capped at PDTA_LOG_PAYLOAD_MAX_CHARS;
+    * "full": text capped at PDTA_LOG_PAYLOAD_MAX_CHARS (for local debugging only).
+"""
+import atexit
+import hashlib
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+from typing import Any, Iterable, Optional
+
+from .config import get_int_setting, get_setting
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+PAYLOAD_METADATA = "metadata"
+PAYLOAD_REDACTED = "redacted"
+PAYLOAD_FULL = "full"
+
+_REDACTIONS = [
+    # Italian tax code (codice fiscale)
+    (re.compile(r"\b[A-Z]{6}\d{2}[A-Z]\d{2}[A-Z]\d{3}[A-Z]\b", re.IGNORECASE), "[CF]"),
+    (re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.-]+\b"), "[EMAIL]"),
+    (re.compile(r"\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b"), "[DATA]"),
+    (re.compile(r"(?:\+39[\s-]?)?\b\d{2,4}[\s-]?\d{6,8}\b"), "[TELEFONO]"),
+    (re.compile(r"\b\d{5,}\b"), "[NUMERO]"),
+    # Titles followed by a capitalized name (Sig. Rossi, dott.ssa Bianchi, paziente Mario Rossi)
+    (re.compile(r"\b((?i:sig(?:\.|nor[ae]?)|dott(?:\.|or[e]?|\.ssa|oressa)|paziente))(?:\s+[A-Z][a-zà-ù']+){1,3}"),
+     r"\1 [NOME]"),
+]
+
+_settings = {"mode": None, "max_chars": None}
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _payload_settings():
+    if _settings["mode"] is None:
+        _settings["mode"] = (get_setting("PDTA_LOG_PAYLOADS", PAYLOAD_METADATA) or PAYLOAD_METADATA).lower()
+        _settings["max_chars"] = get_int_setting("PDTA_LOG_PAYLOAD_MAX_CHARS", 200)
+    return _settings["mode"], _settings["max_chars"]
+
+
+def redact_text(text: str) -> str:
+    """
+    Masks personal identifiers (tax codes, e-mails, dates, phone and long numbers, names after titles).
+
+    Args:
+        text: The free text to redact.
+
+    Returns:
+        The text with identifiers replaced by placeholders.
+    """
+    for pattern, replacement in _REDACTIONS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _cap(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}… [+{len(text) - max_chars} chars]"
+
+
+class LogPayload:
+    """
+    Lazily rendered log argument for clinical free text. The text is only inspected when
+    the record is actually written, so disabled levels cost a single object allocation.
+    """
+    __slots__ = ("text",)
+
+    def __init__(self, text: Any):
+        self.text = text if isinstance(text, str) else str(text)
+
+    def __str__(self) -> str:
+        mode, max_chars = _payload_settings()
+        digest = hashlib.sha1(self.text.encode("utf-8")).hexdigest()[:8]
+        if mode == PAYLOAD_FULL:
+            return f"{_cap(self.text, max_chars)!r} (len={len(self.text)}, sha1={digest})"
+        if mode == PAYLOAD_REDACTED:
+            return f"{_cap(redact_text(self.text), max_chars)!r} (len={len(self.text)}, sha1={digest})"
+        return f"len={len(self.text)}, sha1={digest}"
+
+
+class HistoryPayload:
+    """
+    Lazily rendered summary of a conversation history: message count, roles and sizes,
+    plus the messages themselves according to the payload mode.
+    """
+    __slots__ = ("messages",)
+
+    def __init__(self, messages: Iterable[dict]):
+        # Snapshot the list (not the strings) so later appends do not change the record
+        self.messages = list(messages)
+
+    def __str__(self) -> str:
+        mode, _ = _payload_settings()
+        chars = sum(len(str(m.get("content", ""))) for m in self.messages)
+        summary = f"{len(self.messages)} messages, {chars} chars"
+        if mode == PAYLOAD_METADATA:
+            return summary
+        rendered = ", ".join(f"{m.get('role')}: {LogPayload(m.get('content', ''))}" for m in self.messages)
+        return f"{summary} [{rendered}]"
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    A QueueHandler that never blocks or formats on the caller's thread.
+    """
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue stays in-process, so the record can be formatted later by the listener
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(level: Optional[str] = None, max_queue_size: int = 10000) -> None:
+    """
+    Routes the root logger through a background queue listener. Safe to call several times.
+
+    Args:
+        level: Root log level; defaults to PDTA_LOG_LEVEL or INFO.
+        max_queue_size: Records buffered before new ones are dropped.
+    """
+    global _listener
+    root = logging.getLogger()
+    root.setLevel((level or get_setting("PDTA_LOG_LEVEL", "INFO")).upper())
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=max_queue_size)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DroppingQueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -0,0 +1,305 @@
+"""
+Prometheus-style metrics for the chatbot.
+
+A small dependency-free registry of counters, gauges and histograms rendered in the
+Prometheus text exposition format, plus a background HTTP server exposing them on /metrics.
+"""
+import logging
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 21.0, 34.0, 60.0)
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+COUNT_BUCKETS = (1, 2, 4, 6, 8, 12, 16, 24, 32, 48, 64)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric '{self.name}' expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """A monotonically increasing counter."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only be incremented.")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """A value that can go up and down, or be computed on scrape by a callback."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Computes the (unlabelled) gauge value at scrape time."""
+        self._function = function
+
+    def value(self, **labels: str) -> float:
+        if self._function is not None:
+            return self._function()
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        if self._function is not None:
+            return [f"{self.name} {_format_value(self._function())}"]
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """A histogram with cumulative buckets, a sum and a count."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            # Layout: one counter per bucket, then sum and count
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels: str) -> float:
+        series = self._series.get(self._key(labels))
+        return series[-1] if series else 0.0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        lines = []
+        for key, series in items:
+            for index, bound in enumerate(self.buckets):
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {_format_value(series[index])}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(series[-1])}")
+        return lines
+
+
+class Registry:
+    """A collection of metrics rendered together."""
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered.")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+class SessionTracker:
+    """
+    Counts sessions seen within a time window. Streamlit does not notify the app when a
+    tab is closed, so sessions expire when they have been idle for longer than `ttl` seconds.
+    """
+    def __init__(self, ttl: float = 30 * 60):
+        self.ttl = ttl
+        self._last_seen: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def touch(self, session_id: str) -> None:
+        with self._lock:
+            self._last_seen[session_id] = time.monotonic()
+
+    def remove(self, session_id: str) -> None:
+        with self._lock:
+            self._last_seen.pop(session_id, None)
+
+    def active(self) -> int:
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            for session_id in [s for s, seen in self._last_seen.items() if seen < cutoff]:
+                del self._last_seen[session_id]
+            return len(self._last_seen)
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter("pdta_requests_total", "Chat turns received.", ["mode"]))
+ERRORS = REGISTRY.register(Counter("pdta_errors_total", "Chat turns that failed, by exception type.", ["type"]))
+CACHE_HITS = REGISTRY.register(Counter(
+    "pdta_cache_hits_total", "Cache hits, by cache (prompt = provider prompt caching).", ["cache"]))
+INPUT_TOKENS = REGISTRY.register(Counter("pdta_input_tokens_total", "Input tokens sent to the model.", ["model"]))
+CACHED_INPUT_TOKENS = REGISTRY.register(Counter(
+    "pdta_cached_input_tokens_total", "Input tokens served from the provider prompt cache.", ["model"]))
+OUTPUT_TOKENS = REGISTRY.register(Counter("pdta_output_tokens_total", "Output tokens generated by the model.", ["model"]))
+TTFT = REGISTRY.register(Histogram("pdta_ttft_seconds", "Time to first streamed token.", ["model"]))
+LATENCY = REGISTRY.register(Histogram("pdta_request_latency_seconds", "Total turn latency.", ["mode"]))
+QUEUED_REQUESTS = REGISTRY.register(Gauge(
+    "pdta_queued_requests", "Turns dispatched to the model that have not started generating yet."))
+IN_FLIGHT_REQUESTS = REGISTRY.register(Gauge("pdta_in_flight_requests", "Turns currently being processed."))
+ACTIVE_SESSIONS = REGISTRY.register(Gauge("pdta_active_sessions", "Chat sessions active in the last 30 minutes."))
+HISTORY_LENGTH = REGISTRY.register(Histogram(
+    "pdta_history_length_messages", "Conversation history length when a turn starts.", buckets=COUNT_BUCKETS))
+RETRIEVAL_TIME = REGISTRY.register(Histogram(
+    "pdta_retrieval_seconds", "Time spent retrieving PDTA passages, by source (pinned/tool/grounding).", ["source"],
+    buckets=FAST_BUCKETS))
+
+LOCAL_ANSWERS = REGISTRY.register(Counter(
+    "pdta_local_answers_total", "Turns answered locally without calling the model, by reason.", ["reason"]))
+SCOPE_DECISIONS = REGISTRY.register(Counter(
+    "pdta_scope_decisions_total", "Local scope classifier decisions.", ["decision"]))
+ROUTED_REQUESTS = REGISTRY.register(Counter(
+    "pdta_routed_requests_total", "Turns sent to the model, by route and turn kind.", ["route", "kind"]))
+ROUTE_LATENCY = REGISTRY.register(Histogram("pdta_route_latency_seconds", "Turn latency by model route.", ["route"]))
+ROUTE_TOKENS = REGISTRY.register(Counter(
+    "pdta_route_tokens_total", "Model tokens by route and direction (input/output).", ["route", "direction"]))
+CANCELLED_REQUESTS = REGISTRY.register(Counter(
+    "pdta_cancelled_requests_total", "Turns cancelled before completion (disconnected = consumer went away).",
+    ["reason"]))
+COALESCED_REQUESTS = REGISTRY.register(Counter(
+    "pdta_coalesced_requests_total", "Streamed turns served by an identical call already in flight."))
+CORPUS_RELOADS = REGISTRY.register(Counter(
+    "pdta_corpus_reloads_total", "Corpus rebuilds after a source change, by outcome (swapped/failed).", ["outcome"]))
+CORPUS_VERSION = REGISTRY.register(Gauge("pdta_corpus_version", "Version of the corpus used by new turns."))
+TOOL_CALLS = REGISTRY.register(Counter(
+    "pdta_tool_calls_total", "PDTA lookup tools called by the model (tools context mode), by tool.", ["tool"]))
+GUARDRAIL_TRIPS = REGISTRY.register(Counter(
+    "pdta_guardrail_trips_total", "Model calls cancelled by a tripped input check, by check.", ["guardrail"]))
+GUARDRAIL_TIME = REGISTRY.register(Histogram(
+    "pdta_guardrail_seconds", "Duration of the input checks run concurrently with the model call.", ["guardrail"],
+    buckets=FAST_BUCKETS))
+GROUNDING_FINDINGS = REGISTRY.register(Counter(
+    "pdta_grounding_findings_total", "Answer sentences not grounded in the PDTA, by finding "
+    "(unsupported, unknown_code, unknown_number).", ["kind"]))
+
+SESSIONS = SessionTracker()
+ACTIVE_SESSIONS.set_function(SESSIONS.active)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        payload = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics request: " + format, *args)
+
+
+def start_metrics_server(port: int, address: str = "0.0.0.0", registry: Registry = REGISTRY) -> Optional[ThreadingHTTPServer]:
+    """
+    Serves the registry on http://<address>:<port>/metrics from a daemon thread.
+
+    Args:
+        port: The TCP port to listen on.
+        address: The interface to bind.
+        registry: The registry to expose.
+
+    Returns:
+        The running server, or None if the port could not be bound.
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    try:
+        server = ThreadingHTTPServer((address, port), handler)
+    except OSError as e:
+        logger.warning("Could not start metrics server on %s:%d: %s", address, port, e)
+        return None
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    logger.info("Metrics available at http://%s:%d/metrics", address, port)
+    return server
@@ -0,0 +1,226 @@
+"""
+This module defines MockModel, an offline stand-in for the OpenAI model used by ConversationalAgent.
+It streams a canned (or computed) answer with configurable latency so benchmarks and local runs
+do not need an API key or network access.
+"""
+import asyncio
+import itertools
+import json
+import re
+from typing import Any, AsyncIterator, Callable, Optional
+
+from agents import Model, ModelResponse, Usage
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseCreatedEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+)
+from openai.types.responses.response_usage import InputTokensDetails, OutputTokensDetails, ResponseUsage
+
+from .tokens import estimate_messages_tokens, estimate_tokens
+
+DEFAULT_MOCK_RESPONSE = (
+    "In base al PDTA Tumore del Polmone dello IOV, prima della prima visita oncologica il paziente "
+    "dovrebbe completare una TC torace con mezzo di contrasto e la visita pneumologica. "
+    "Il Case Manager coordinerà le prenotazioni successive e la discussione in GOM "
+    "(Sezione 5.1 – Accesso dell'utente)."
+)
+
+# Tool the mock calls before answering when the agent offers it (tools context mode)
+SEARCH_TOOL = "search_pdta"
+
+_ids = itertools.count(1)
+
+
+def last_user_text(input: Any) -> str:
+    """
+    Returns the text of the most recent user message in a Responses-style input.
+
+    Args:
+        input: A string or a list of input items.
+
+    Returns:
+        The last user message, or an empty string if there is none.
+    """
+    if isinstance(input, str):
+        return input
+    for item in reversed(list(input or [])):
+        if isinstance(item, dict) and item.get("role") == "user":
+            content = item.get("content")
+            if isinstance(content, str):
+                return content
+            if isinstance(content, list):
+                return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return ""
+
+
+class MockModel(Model):
+    """
+    An offline model that streams a scripted answer with a simulated time-to-first-token
+    and a constant generation speed.
+    """
+    def __init__(
+        self,
+        response: str = DEFAULT_MOCK_RESPONSE,
+        ttft: float = 0.35,
+        tokens_per_second: float = 60.0,
+        responder: Optional[Callable[[str], str]] = None,
+        name: str = "mock",
+        call_tools: bool = True,
+    ):
+        """
+        Initializes the MockModel.
+
+        Args:
+            response: The answer returned when no responder is given.
+            ttft: Simulated delay in seconds before the first token.
+            tokens_per_second: Simulated generation speed (0 disables the per-token delay).
+            responder: Optional callable computing the answer from the last user message.
+            name: Model name reported in the generated responses.
+            call_tools: When the agent offers SEARCH_TOOL, call it once per turn with the user
+                message before answering, like a model in the tools context mode, unless
+                passages were pinned before the message.
+        """
+        self.response = response
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.responder = responder
+        self.name = name
+        self.call_tools = call_tools
+
+    def __repr__(self) -> str:
+        return f"MockModel(name={self.name!r}, ttft={self.ttft}, tokens_per_second={self.tokens_per_second})"
+
+    def _answer(self, input: Any) -> str:
+        if self.responder is not None:
+            return self.responder(last_user_text(input))
+        return self.response
+
+    def _tool_call(self, input: Any, tools: Any) -> Optional[ResponseFunctionToolCall]:
+        if not self.call_tools or not any(getattr(tool, "name", None) == SEARCH_TOOL for tool in tools or []):
+            return None
+        # One search per turn: skip it once its output follows the last user message, or when
+        # passages were pinned right before that message
+        items = [] if isinstance(input, str) else [item for item in input or [] if isinstance(item, dict)]
+        for index in range(len(items) - 1, -1, -1):
+            if items[index].get("role") == "user":
+                if index > 0 and items[index - 1].get("role") == "developer":
+                    return None
+                break
+            if items[index].get("type") == "function_call_output":
+                return None
+        return ResponseFunctionToolCall(
+            id=f"fc_mock_{next(_ids)}",
+            call_id=f"call_mock_{next(_ids)}",
+            type="function_call",
+            name=SEARCH_TOOL,
+            arguments=json.dumps({"query": last_user_text(input), "k": 4}),
+            status="completed",
+        )
+
+    def _usage(self, system_instructions: Optional[str], input: Any, answer: str) -> ResponseUsage:
+        input_tokens = estimate_tokens(system_instructions or "")
+        input_tokens += estimate_tokens(input) if isinstance(input, str) else estimate_messages_tokens(input)
+        output_tokens = estimate_tokens(answer)
+        # model_construct keeps the mock compatible across openai releases that add required fields
+        return ResponseUsage.model_construct(
+            input_tokens=input_tokens,
+            input_tokens_details=InputTokensDetails.model_construct(cached_tokens=0),
+            output_tokens=output_tokens,
+            output_tokens_details=OutputTokensDetails.model_construct(reasoning_tokens=0),
+            total_tokens=input_tokens + output_tokens,
+        )
+
+    def _message(self, answer: str) -> ResponseOutputMessage:
+        return ResponseOutputMessage(
+            id=f"msg_mock_{next(_ids)}",
+            type="message",
+            role="assistant",
+            status="completed",
+            content=[ResponseOutputText(type="output_text", text=answer, annotations=[])],
+        )
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema,
+                           handoffs, tracing, *args, **kwargs) -> ModelResponse:
+        call = self._tool_call(input, tools)
+        answer = call.arguments if call is not None else self._answer(input)
+        await asyncio.sleep(self.ttft + self._generation_time(answer))
+        usage = self._usage(system_instructions, input, answer)
+        return ModelResponse(
+            [call if call is not None else self._message(answer)],
+            Usage(
+                requests=1,
+                input_tokens=usage.input_tokens,
+                output_tokens=usage.output_tokens,
+                total_tokens=usage.total_tokens,
+            ),
+            None,
+        )
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema,
+                              handoffs, tracing, *args, **kwargs) -> AsyncIterator[Any]:
+        call = self._tool_call(input, tools)
+        response_id = f"resp_mock_{next(_ids)}"
+        sequence = itertools.count()
+
+        yield ResponseCreatedEvent.model_construct(
+            type="response.created",
+            sequence_number=next(sequence),
+            response=self._response(response_id, [], None),
+        )
+        await asyncio.sleep(self.ttft)
+
+        if call is not None:
+            await asyncio.sleep(self._generation_time(call.arguments))
+            yield ResponseCompletedEvent.model_construct(
+                type="response.completed",
+                sequence_number=next(sequence),
+                response=self._response(response_id, [call], self._usage(system_instructions, input, call.arguments)),
+            )
+            return
+
+        answer = self._answer(input)
+        message = self._message(answer)
+
+        delay = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        for chunk in re.findall(r"\S+\s*", answer):
+            yield ResponseTextDeltaEvent.model_construct(
+                type="response.output_text.delta",
+                sequence_number=next(sequence),
+                item_id=message.id,
+                output_index=0,
+                content_index=0,
+                delta=chunk,
+                logprobs=[],
+            )
+            if delay:
+                await asyncio.sleep(delay * estimate_tokens(chunk))
+
+        yield ResponseCompletedEvent.model_construct(
+            type="response.completed",
+            sequence_number=next(sequence),
+            response=self._response(response_id, [message], self._usage(system_instructions, input, answer)),
+        )
+
+    def _generation_time(self, answer: str) -> float:
+        if self.tokens_per_second <= 0:
+            return 0.0
+        return estimate_tokens(answer) / self.tokens_per_second
+
+    def _response(self, response_id: str, output: list, usage: Optional[ResponseUsage]) -> Response:
+        return Response.model_construct(
+            id=response_id,
+            object="response",
+            created_at=0,
+            model=self.name,
+            output=output,
+            usage=usage,
+            tools=[],
+            tool_choice="auto",
+            parallel_tool_calls=False,
+            status="completed",
+        )
@@ -0,0 +1,245 @@
+"""
+Normalization of the OCR and layout artifacts of the PDTA transcription.
+
+The page texts of the ROV 2017 transcription come from a PDF text layer and carry artifacts
+that waste tokens and break lexical matching: the page number glued to the first word of the
+page ("691.2 – Esame macroscopico" on page 69) or left alone on the last line, words split by
+a hyphenated line break ("parti-\\ncolarmente", "1672-\\n1682."), words glued across a lost space
+("cicliCisplatino", "PANCOASTTumore", "ESPRESSIONEBASSA"), symbol-font glyphs from the Unicode
+private use area and runs of spaces. When a corpus version is built, the text goes through
+deterministic rules before it is parsed:
+
+- symbols: the symbol-font arrow used as a bullet becomes "→", other private use glyphs are dropped;
+- page_number: the page number is dropped from the start and the end of each page text; a page
+  left empty (the flowchart pages) gets the "(Nessun testo estraibile)" note;
+- hyphenation: a line break after a hyphen is removed; between two lowercase words the hyphen
+  goes too, unless the corpus writes the hyphenated form elsewhere;
+- case_boundary: a word is split where the case changes ("cicli|Cisplatino", "HTA|Azienda")
+  if one of the two sides occurs as a word of its own in the corpus;
+- glued_words: a long all-lowercase or all-uppercase word occurring only once is split when it
+  is the concatenation of words of at least MIN_PART letters occurring elsewhere in the corpus
+  (compound prefixes such as "contro" or "micro" never count as a part);
+- spacing: runs of spaces are collapsed and trailing spaces dropped.
+
+The vocabulary is the corpus itself, so the rules need no dictionary and give the same output
+for the same text. Chunk ids, sections and page numbers do not change.
+
+- PDTA_NORMALIZE: "off" keeps the transcription as it is ("on" by default).
+
+The diff and the token counts before and after can be printed with `python -m agent.normalize`.
+"""
+import difflib
+import functools
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .config import get_bool_setting, get_setting
+from .corpus import NO_TEXT_MARKER
+from .text import fold
+from .tokens import estimate_tokens
+
+RULE_SYMBOLS = "symbols"
+RULE_PAGE_NUMBER = "page_number"
+RULE_HYPHENATION = "hyphenation"
+RULE_CASE_BOUNDARY = "case_boundary"
+RULE_GLUED_WORDS = "glued_words"
+RULE_SPACING = "spacing"
+RULES = (RULE_SYMBOLS, RULE_PAGE_NUMBER, RULE_HYPHENATION, RULE_CASE_BOUNDARY, RULE_GLUED_WORDS, RULE_SPACING)
+
+# Shortest part of a glued word, and shortest glued word worth splitting
+MIN_PART = 5
+MIN_GLUED = 10
+
+# Note for a page left without text, recognized by Chunk.has_text
+NO_TEXT_NOTE = NO_TEXT_MARKER + ")"
+
+# Private use glyphs of the PDF symbol fonts with a plain equivalent; the others are dropped
+_SYMBOLS = {"\uf0e0": "→"}
+_PRIVATE_USE_RE = re.compile(r"[\ue000-\uf8ff]")
+
+# Italian compound prefixes: "controindicazione" is a word, not "contro" + "indicazione"
+_COMPOUND_PREFIXES = frozenset("""
+angio anti auto bronco cardio chemio contro endo extra immuno infra inter intra iper linfo macro
+mediastino meta micro mono multi neuro onco para peri pluri pneumo poli post radio retro semi sotto
+sovra super toraco trans ultra video
+""".split())
+
+_PAGE_TEXT_RE = re.compile(
+    r"(Testo della pagina (\d+):\n)(.*?)(\nOutput atteso dal modello per la pagina \2:)", re.DOTALL)
+_HYPHEN_BREAK_RE = re.compile(r"(\w+)-[ \t]*\n[ \t]*(\w+)")
+_WORD_RE = re.compile(r"[A-Za-zÀ-ÖØ-öø-ÿ]+")
+# lower|Upper-lower ("cicli|Cisplatino") and UPPER|Upper-lower ("PANCOAST|Tumore")
+_CASE_BOUNDARY_RE = re.compile(r"(?<=[a-zà-öø-ÿ]{2})(?=[A-ZÀ-ÖØ-Þ][a-zà-öø-ÿ]{2})|"
+                               r"(?<=[A-ZÀ-ÖØ-Þ]{2})(?=[A-ZÀ-ÖØ-Þ][a-zà-öø-ÿ]{2})")
+_SPACES_RE = re.compile(r"(?<=\S)[ \t]{2,}(?=\S)")
+_TRAILING_SPACES_RE = re.compile(r"[ \t]+$", re.MULTILINE)
+
+
+@dataclass
+class Normalization:
+    """The normalized text, with the edits made by each rule."""
+    original: str
+    text: str = ""
+    edits: Dict[str, int] = field(default_factory=lambda: {rule: 0 for rule in RULES})
+
+    def report(self) -> Dict[str, int]:
+        """
+        Returns the edits of each rule and the estimated tokens before and after.
+        """
+        return dict(self.edits, tokens_before=estimate_tokens(self.original), tokens_after=estimate_tokens(self.text))
+
+    def diff(self, context: int = 0) -> List[str]:
+        """
+        Returns the unified diff between the original and the normalized text.
+        """
+        return list(difflib.unified_diff(self.original.splitlines(), self.text.splitlines(),
+                                         "originale", "normalizzato", n=context, lineterm=""))
+
+
+def _vocabulary(text: str) -> Counter:
+    return Counter(_WORD_RE.findall(fold(text)))
+
+
+def _fix_symbols(text: str, result: Normalization) -> str:
+    def fix(match: re.Match) -> str:
+        result.edits[RULE_SYMBOLS] += 1
+        return _SYMBOLS.get(match.group(0), "")
+
+    return _PRIVATE_USE_RE.sub(fix, text)
+
+
+def _fix_pages(text: str, result: Normalization) -> str:
+    def fix(match: re.Match) -> str:
+        number, body = match.group(2), match.group(3)
+        fixed = body
+        if fixed.startswith(number):
+            fixed = fixed[len(number):].lstrip()
+        lines = fixed.rstrip().split("\n")
+        if len(lines) > 1 and lines[-1].strip() == number:
+            fixed = "\n".join(lines[:-1])
+        if not fixed.strip() and body.strip():
+            fixed = NO_TEXT_NOTE
+        if fixed != body:
+            result.edits[RULE_PAGE_NUMBER] += 1
+        return match.group(1) + fixed + match.group(4)
+
+    return _PAGE_TEXT_RE.sub(fix, text)
+
+
+def _fix_hyphenation(text: str, result: Normalization) -> str:
+    hyphenated = {fold(m.group(0)) for m in re.finditer(r"[A-Za-zÀ-ÿ]+-[A-Za-zÀ-ÿ]+", text)}
+
+    def fix(match: re.Match) -> str:
+        left, right = match.group(1), match.group(2)
+        result.edits[RULE_HYPHENATION] += 1
+        if left.isalpha() and right.isalpha() and right[0].islower() and fold(f"{left}-{right}") not in hyphenated:
+            return left + right
+        return f"{left}-{right}"
+
+    return _HYPHEN_BREAK_RE.sub(fix, text)
+
+
+def _fix_case_boundaries(text: str, vocabulary: Counter, result: Normalization) -> str:
+    def fix(match: re.Match) -> str:
+        word = match.group(0)
+        parts = _CASE_BOUNDARY_RE.split(word)
+        if len(parts) == 1:
+            return word
+        # Each boundary is kept only if a side is a word of the corpus ("MacLennan" stays)
+        fixed = parts[0]
+        for part in parts[1:]:
+            previous = fixed.rsplit(" ", 1)[-1]
+            if vocabulary[fold(previous)] or vocabulary[fold(part)]:
+                fixed += " " + part
+                result.edits[RULE_CASE_BOUNDARY] += 1
+            else:
+                fixed += part
+        return fixed
+
+    return _WORD_RE.sub(fix, text)
+
+
+def _split_glued(word: str, vocabulary: Counter) -> Optional[List[str]]:
+    """The shortest split of a word into corpus words, None if there is none."""
+    folded = fold(word)
+    if len(folded) != len(word):
+        return None
+    best: List[Optional[List[int]]] = [None] * (len(folded) + 1)
+    best[0] = []
+    for end in range(MIN_PART, len(folded) + 1):
+        for start in range(0, end - MIN_PART + 1):
+            part = folded[start:end]
+            if best[start] is None or vocabulary[part] < 2:
+                continue
+            if end < len(folded) and part in _COMPOUND_PREFIXES:
+                continue
+            if best[end] is None or len(best[start]) + 1 < len(best[end]):
+                best[end] = best[start] + [end]
+    if best[-1] is None or len(best[-1]) < 2:
+        return None
+    starts = [0] + best[-1][:-1]
+    return [word[start:end] for start, end in zip(starts, best[-1])]
+
+
+def _fix_glued_words(text: str, vocabulary: Counter, result: Normalization) -> str:
+    def fix(match: re.Match) -> str:
+        word = match.group(0)
+        if len(word) < MIN_GLUED or not (word.islower() or word.isupper()) or vocabulary[fold(word)] > 1:
+            return word
+        parts = _split_glued(word, vocabulary)
+        if parts is None:
+            return word
+        result.edits[RULE_GLUED_WORDS] += 1
+        return " ".join(parts)
+
+    return _WORD_RE.sub(fix, text)
+
+
+def _fix_spacing(text: str, result: Normalization) -> str:
+    fixed = _TRAILING_SPACES_RE.sub("", _SPACES_RE.sub(" ", text))
+    result.edits[RULE_SPACING] += sum(a != b for a, b in zip(text.splitlines(), fixed.splitlines()))
+    return fixed
+
+
+@functools.lru_cache(maxsize=2)
+def normalize_text(text: str) -> Normalization:
+    """
+    Applies the normalization rules to the PDTA text. Cached by text, so the store and
+    load_corpus() normalize the same source once. Callers must not modify the result.
+
+    Args:
+        text: The `pdta_text` of the corpus source.
+
+    Returns:
+        The normalized text, with the edits of each rule.
+    """
+    result = Normalization(text)
+    fixed = _fix_symbols(text, result)
+    fixed = _fix_pages(fixed, result)
+    fixed = _fix_hyphenation(fixed, result)
+    # The vocabulary comes from the text with the line breaks fixed
+    vocabulary = _vocabulary(fixed)
+    fixed = _fix_case_boundaries(fixed, vocabulary, result)
+    fixed = _fix_glued_words(fixed, vocabulary, result)
+    result.text = _fix_spacing(fixed, result)
+    return result
+
+
+def normalize_enabled() -> bool:
+    """
+    Whether the transcription artifacts are normalized when the corpus is built (PDTA_NORMALIZE, "on" by default).
+    """
+    return get_bool_setting("PDTA_NORMALIZE", True)
+
+
+if __name__ == "__main__":
+    from .corpus_store import DEFAULT_SOURCE, read_source
+
+    normalization = normalize_text(read_source(get_setting("PDTA_CORPUS_PATH") or DEFAULT_SOURCE)["pdta_text"])
+    for line in normalization.diff():
+        print(line)
+    report = normalization.report()
+    edits = ", ".join(f"{rule} {report[rule]}" for rule in RULES)
+    print(f"{edits}: {report['tokens_before']} -> {report['tokens_after']} tokens")
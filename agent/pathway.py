@@ -0,0 +1,308 @@
+"""
+The PDTA pathway as a local state machine.
+
+Section 8 (FLOWCHART OPERATIVO) and sections 5.1-5.9 describe a deterministic sequence:
+access and radiological/pneumological evaluation, entry into IOV by clinical stage (first
+oncology or radiotherapy visit, GOM discussion), take-in-charge, parallel services and
+follow-up. locate() reads the case facts from the user's messages with the same kind of
+patterns as the clarification fast path and returns the patient's current phase, the next
+steps with their sections and codes, and the prerequisites still missing, in microseconds.
+
+A fact only counts when it is asserted: a mention governed by a negation ("non operato",
+"esclusa diagnosi di carcinoma"), by a pending or planned event ("in attesa di chemioterapia",
+"intervento programmato") or by a suspicion ("sospetto carcinoma") is recorded as qualified
+instead, and does not move the case along the pathway. The same holds for the stage: with
+"sospetta metastasi epatica" the stage stays unknown and is recorded as qualified.
+
+The state is given to the model as a compact hint after the user's message, or returned
+directly when a well-specified case only asks for the next step of the percorso and no fact
+of the case is qualified.
+
+- PDTA_PATHWAY_HINTS: "off" disables the hint ("on" by default).
+- PDTA_PATHWAY_ANSWERS: "off" disables the direct answers ("on" by default).
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .config import get_bool_setting
+from .text import fold
+
+PHASE_ACCESS = "accesso"
+PHASE_DIAGNOSIS = "diagnosi"
+PHASE_ENTRY = "ingresso_iov"
+PHASE_GOM = "gom"
+PHASE_TAKE_IN_CHARGE = "presa_in_carico"
+PHASE_TREATMENT = "trattamento"
+PHASE_FOLLOW_UP = "follow_up"
+
+# Phase labels and the sections describing them, in pathway order (section 8, steps 1-6)
+PHASES: Dict[str, tuple] = {
+    PHASE_ACCESS: ("Accesso e valutazione radiologica/pneumologica", "5.1"),
+    PHASE_DIAGNOSIS: ("Conferma diagnostica e stadiazione (ULSS/AOUP)", "5.1"),
+    PHASE_ENTRY: ("Ingresso allo IOV secondo stadio clinico", "5.1"),
+    PHASE_GOM: ("Discussione multidisciplinare GOM", "5.2"),
+    PHASE_TAKE_IN_CHARGE: ("Presa in carico", "5.6"),
+    PHASE_TREATMENT: ("Trattamento e valutazioni parallele", "5.7-5.8"),
+    PHASE_FOLLOW_UP: ("Follow-up periodico", "5.9"),
+}
+
+_FACT_PATTERNS = {
+    "case": r"\bpaziente\b|\bpz\b|\bassistit[oa]\b|\buomo\b|\bdonna\b|\bsignor[ae]?\b|\d+\s?(anni|aa|enne)\b|\bcaso\b",
+    "chest_xray": r"\brx\b|radiografi",
+    "chest_ct": r"\btc\b|\btac\b|tomografi|\bhrtc\b|pet[- ]tc",
+    "pneumology": r"pneumolog",
+    "diagnosis": (
+        r"istologic|citologic|diagnosi (di|confermata)|adenocarcinoma|carcinoma|microcitoma|\bnsclc\b|\bsclc\b|"
+        r"biopsia (positiva|ha confermato)|tumore (polmonare )?(confermato|accertato)"
+    ),
+    "inoperable": r"non operabil|inoperabil|non candidabil\w* (a|alla) chirurgi|non resecabil|controindicazion\w* (alla )?chirurgi",
+    "oncology_visit": r"(visita oncologica|dall.oncologo|oncologo)\s*(gia\s*)?(eseguit|effettuat|fatt|svolt|vist)|gia seguit\w* (in|dall.)oncologi",
+    "radiotherapy_visit": r"(visita radioterapica|dal radioterapista)\s*(gia\s*)?(eseguit|effettuat|fatt|svolt)",
+    "gom_discussed": r"discuss\w* (in|al|nel|dal) gom|(valutat|presentat)\w* (in|al|nel|dal) gom|post[- ]gom|dopo (il |la discussione )?(in )?gom|gom (ha|gia)",
+    "surgery": r"operat[oa]\b|intervento chirurgic|lobectomi|pneumonectomi|resezion\w* (polmonar|chirurgic)|sottopost\w* a chirurgi",
+    "therapy": (
+        r"in trattamento|chemioterapi|immunoterapi|terapia (oncologica|in corso|target)|radioterapia (in corso|eseguit|effettuat)|"
+        r"\btki\b|osimertinib|pembrolizumab"
+    ),
+    "completed": r"terminat|conclus|completat|fine (del |della )?(trattamento|terapia|chemio)",
+    "follow_up": r"follow[- ]?up|controlli periodici",
+    "smoker": r"\bfum(o|a|ava|atore|atrice)\b|sigarett|tabag",
+    "trial": r"\btrial\b|studio clinico|sperimentazion",
+}
+_FACT_RE = {fact: re.compile(pattern) for fact, pattern in _FACT_PATTERNS.items()}
+# Facts that move the case along the pathway, with the label used in the hint
+_PHASE_FACTS = {
+    "stage": "stadio clinico",
+    "diagnosis": "diagnosi",
+    "oncology_visit": "visita oncologica",
+    "radiotherapy_visit": "visita radioterapica",
+    "gom_discussed": "discussione in GOM",
+    "surgery": "intervento chirurgico",
+    "therapy": "terapia oncologica",
+    "completed": "fine del trattamento",
+    "follow_up": "follow-up",
+}
+# Facts never qualified: "case" is not a clinical event, "inoperable" is a negation itself
+_UNQUALIFIED_FACTS = {"case", "inoperable"}
+# Qualifiers apply within a clause
+_CLAUSE_RE = re.compile(r"[,;.:!?()\n]|\b(?:perche|ma|pero|mentre|quindi|poi)\b")
+_QUALIFIER_RE = re.compile(
+    r"\b(?:non|mai|senza|nessun\w*|esclus\w*|attesa|programmat\w*|previst\w*|candidat\w*|propost\w*|"
+    r"deve|devono|dovra|da|sospett\w*|dubbi\w*|possibil\w*|probabil\w*|ipotesi)$")
+# Words allowed between a qualifier and the fact it governs ("non e ancora stato operato")
+_QUALIFIER_FILLERS = frozenset("""
+a ad al alla allo di del della un una uno il la lo e ha hanno stato stata stati state ancora mai piu gia
+viene vengono essere sottoposto sottoposta sottoposti iniziare iniziato eseguire eseguito effettuare
+ricevere ricevuto fare per
+""".split())
+_QUALIFIER_WINDOW = 4
+_QUALIFIER_AFTER_RE = re.compile(
+    r"\s*(?:\w+\s+)?(?:programmat|da (?:programmare|eseguire|iniziare|fare|discutere|confermare)|previst|"
+    r"in programma|in attesa|esclus|non confermat)")
+_STAGE_RE = re.compile(r"\bstadio\s+(iv|iii|ii|i|4|3|2|1)\s?([abc])?\b|\b(pancoast)\b|\b(metastatic\w*|metastasi)\b")
+_STAGES = {"i": "I", "1": "I", "ii": "II", "2": "II", "iii": "III", "3": "III", "iv": "IV", "4": "IV"}
+_NEXT_STEP_RE = re.compile(
+    r"prossim[oi] pass|cosa (devo|dobbiamo|bisogna) fare|come (devo )?procedo|come proseguo|a chi (lo |la )?(invio|indirizzo|mando)|"
+    r"(qual e|quale) (il )?percorso|che percorso|dove (lo |la )?(invio|mando)|step successiv")
+
+
+@dataclass
+class CaseFacts:
+    """The pathway facts found in the conversation."""
+    facts: set = field(default_factory=set)
+    stage: Optional[str] = None
+    # Phase facts only mentioned negated, pending or suspected
+    qualified: set = field(default_factory=set)
+
+    def has(self, fact: str) -> bool:
+        return fact in self.facts
+
+
+@dataclass
+class PathwayState:
+    """Where a case stands in the PDTA and what comes next."""
+    phase: str
+    facts: CaseFacts
+    next_steps: List[str]
+    missing: List[str]
+
+    @property
+    def label(self) -> str:
+        return PHASES[self.phase][0]
+
+    @property
+    def section(self) -> str:
+        return PHASES[self.phase][1]
+
+    def hint(self) -> str:
+        """
+        Renders the state as a compact note for the model.
+        """
+        stage = f"stadio {self.facts.stage}" if self.facts.stage else "stadio non indicato"
+        lines = [f"[Stato del percorso calcolato dal PDTA] Fase: {self.label} (sez. {self.section}); {stage}."]
+        if self.facts.qualified:
+            lines.append("Non avvenuti o non confermati (negati, in attesa o sospetti): " +
+                         ", ".join(_PHASE_FACTS[fact] for fact in sorted(self.facts.qualified)) + ".")
+        if self.missing:
+            lines.append("Prerequisiti mancanti: " + "; ".join(self.missing) + ".")
+        lines.append("Passi successivi: " + "; ".join(self.next_steps) + ".")
+        return "\n".join(lines)
+
+    def answer(self) -> str:
+        """
+        Renders the state as the reply to a next-step question.
+        """
+        stage = f", stadio {self.facts.stage}" if self.facts.stage else ""
+        lines = [f"In base al PDTA, il paziente si trova nella fase «{self.label}»{stage} "
+                 f"(Sezione {self.section}). Passi successivi:"]
+        lines.extend(f"{index}. {step}" for index, step in enumerate(self.next_steps, 1))
+        if self.missing:
+            lines.append("\nPrima di procedere vanno completati: " + "; ".join(self.missing) + ".")
+        return "\n".join(lines)
+
+
+def _qualified(clause: str, start: int, end: int) -> bool:
+    """Whether the mention clause[start:end] is negated, pending or suspected."""
+    if _QUALIFIER_AFTER_RE.match(clause, end):
+        return True
+    words = clause[:start].split()
+    for index in range(len(words) - 1, max(-1, len(words) - 1 - _QUALIFIER_WINDOW), -1):
+        if _QUALIFIER_RE.search(words[index]):
+            return True
+        if words[index] not in _QUALIFIER_FILLERS:
+            return False
+    return False
+
+
+def _clause_facts(clause: str, asserted: set, mentioned: set) -> None:
+    for fact, pattern in _FACT_RE.items():
+        previous_end, previous_qualified = None, False
+        for match in pattern.finditer(clause):
+            if fact in _UNQUALIFIED_FACTS:
+                qualified = False
+            elif previous_end is not None and not clause[previous_end:match.start()].strip():
+                # Adjacent mentions share the qualifier: "esclusa diagnosi di carcinoma"
+                qualified = previous_qualified
+            else:
+                qualified = _qualified(clause, match.start(), match.end())
+            mentioned.add(fact)
+            if not qualified:
+                asserted.add(fact)
+            previous_end, previous_qualified = match.end(), qualified
+
+
+def extract_facts(text: str) -> CaseFacts:
+    """
+    Finds the pathway facts asserted in a text (usually the user's messages of a conversation).
+    """
+    folded = fold(text)
+    facts: set = set()
+    mentioned: set = set()
+    for clause in _CLAUSE_RE.split(folded):
+        if clause:
+            _clause_facts(clause, facts, mentioned)
+    qualified = {fact for fact in mentioned - facts if fact in _PHASE_FACTS}
+    stage, stage_qualified = None, False
+    for clause in _CLAUSE_RE.split(folded):
+        for match in _STAGE_RE.finditer(clause or ""):
+            if _qualified(clause, match.start(), match.end()) or re.search(r"assenza di metasta", clause):
+                # "sospetta metastasi epatica", "stadio IV da confermare"
+                stage_qualified = True
+            elif match.group(1):
+                stage = _STAGES[match.group(1)] + (match.group(2) or "").upper()
+            elif match.group(3):
+                stage = stage or "Pancoast"
+            elif match.group(4):
+                stage = stage or "IV"
+    if stage is None and stage_qualified:
+        qualified.add("stage")
+    return CaseFacts(facts, stage, qualified)
+
+
+def _entry_steps(facts: CaseFacts) -> List[str]:
+    stage = (facts.stage or "").rstrip("ABC")
+    if stage == "I" and facts.has("inoperable"):
+        return ["Prima visita radioterapica (Sezione 5.4): impegnativa PRIMA VISITA CVP 89.7C.1_2, esenzione 048; "
+                "prenotazione tramite Case Manager → Ufficio Accettazione Radioterapia (I_RT_P01)"]
+    if stage == "I":
+        return ["Valutazione chirurgica presso UOC Chirurgia Toracica AOUP (Sezione 5.6); lo Stadio I non è "
+                "discusso in GOM"]
+    if stage == "IV":
+        return ["Prima visita oncologica (Sezione 5.3): impegnativa PRIMA VISITA ONCOLOGICA CVP 89.7B.6_2, "
+                "esenzione 048; prenotazione CUP (classe B) o percorso interno",
+                "Discussione multidisciplinare GOM se indicata (Sezione 5.2)"]
+    return ["Discussione multidisciplinare GOM (Sezione 5.2), proposta dal pneumologo AOUP o da uno "
+            "specialista esterno abilitato; il Case Manager comunica appuntamenti e tappe successive"]
+
+
+def locate(text: str) -> Optional[PathwayState]:
+    """
+    Computes the current phase of a case, its next steps and the missing prerequisites.
+
+    Args:
+        text: The case facts, usually all the user's messages of the conversation.
+
+    Returns:
+        The pathway state, or None if the text does not describe a case.
+    """
+    facts = extract_facts(text)
+    if not facts.has("case"):
+        return None
+    if facts.has("follow_up") or (facts.has("completed") and (facts.has("surgery") or facts.has("therapy"))):
+        steps = ["Follow-up in ambito oncologico secondo il PDTA regionale (Sezione 5.9)",
+                 "Possibile ripresentazione del caso in GOM per una nuova discussione"]
+        if (facts.stage or "").rstrip("ABC") == "I" and not facts.has("trial"):
+            steps[0] = "Stadio I non in trial: follow-up chirurgico toracico AOUP (Sezione 5.9)"
+        return PathwayState(PHASE_FOLLOW_UP, facts, steps, [])
+    if facts.has("surgery") or facts.has("therapy"):
+        steps = ["Valutazioni parallele (Sezione 5.8): supporto psicologico (I_PSI_P01), valutazione dietistica "
+                 "(I_DN_P01), biopsia liquida EGFR/NGS se indicata (I_OST_IO01/I_OST_IO02)",
+                 "Cure simultanee su richiesta (Sezione 5.7, I_DON_P10)"]
+        if facts.has("smoker"):
+            steps.append("Disassuefazione dal fumo: Ambulatorio Antifumo, prenotazione CUP (Sezione 5.8)")
+        return PathwayState(PHASE_TREATMENT, facts, steps, [])
+    if facts.has("gom_discussed") or facts.has("oncology_visit") or facts.has("radiotherapy_visit"):
+        steps = ["Presa in carico secondo la decisione del GOM o dello specialista (Sezione 5.6): chirurgica "
+                 "(Chirurgia Toracica AOUP), oncologica (CVP 89.7B.6_2, I_DON_P04) o radioterapica (CVP 89.01.P_2)",
+                 "Approfondimenti diagnostici decisi dal GOM e prenotati dal Case Manager (Sezione 5.5)"]
+        return PathwayState(PHASE_TAKE_IN_CHARGE, facts, steps, [])
+    if facts.has("diagnosis") or facts.stage:
+        missing = [] if facts.stage else ["stadio clinico (determina il punto di ingresso allo IOV)"]
+        stage = (facts.stage or "").rstrip("ABC")
+        phase = PHASE_GOM if stage in ("II", "III", "Pancoast") else PHASE_ENTRY
+        return PathwayState(phase, facts, _entry_steps(facts), missing)
+    missing = []
+    if not facts.has("chest_ct"):
+        missing.append("TC torace con mezzo di contrasto" if facts.has("chest_xray") else "RX/TC torace")
+    if not facts.has("pneumology"):
+        missing.append("visita pneumologica")
+    if missing:
+        steps = ["Completare l'accertamento del sospetto diagnostico da MMG, specialista SSN o PS: RX/TC torace "
+                 "e visita pneumologica (Sezione 5.1)"]
+        return PathwayState(PHASE_ACCESS, facts, steps, missing)
+    steps = ["Conferma diagnostica (istologica/citologica) e stadiazione in ULSS o AOUP; lo IOV subentra a "
+             "diagnosi confermata (Sezione 5.1)",
+             "In alternativa, invio da MMG/specialista per visita oncologica (CVP 89.7B.6_2)"]
+    return PathwayState(PHASE_DIAGNOSIS, facts, steps, ["diagnosi istologica/citologica", "stadio clinico"])
+
+
+def is_next_step_question(message: str) -> bool:
+    """
+    Whether a message asks for the next step of the percorso ("come procedo?", "a chi lo invio?").
+    """
+    return bool(_NEXT_STEP_RE.search(fold(message)))
+
+
+def pathway_hints_enabled() -> bool:
+    """
+    Whether the pathway state is given to the model as a hint (PDTA_PATHWAY_HINTS, "on" by default).
+    """
+    return get_bool_setting("PDTA_PATHWAY_HINTS", True)
+
+
+def pathway_answers_enabled() -> bool:
+    """
+    Whether next-step questions on well-specified cases are answered locally (PDTA_PATHWAY_ANSWERS, "on" by default).
+    """
+    return get_bool_setting("PDTA_PATHWAY_ANSWERS", True)
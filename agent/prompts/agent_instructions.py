@@ -67,6 +67,27 @@ L’agente deve agire come un **supporto decisionale clinico per i MMG**, con lo
 
 
 
+TOOLS_INSTRUCTIONS = """
+### 📚 CONSULTAZIONE DEL PDTA
+Il testo del PDTA non è incluso in queste istruzioni: consultalo con gli strumenti disponibili prima di rispondere.
+- `search_pdta(query, k)`: cerca i passaggi più pertinenti (sezioni del PDTA IOV e pagine del PDTA ROV 2017).
+- `get_section(code)`: restituisce una sezione del PDTA IOV (es. "5.3", "7").
+- `get_page(n)`: restituisce la PAGINA n del PDTA ROV 2017.
+- `get_table(table_id)`: restituisce una tabella del PDTA (es. matrice RACI, cloni anticorpali, TPS di PD-L1) in formato compatto.
+Puoi chiamare più strumenti in parallelo. Recupera solo i passaggi che ti servono e basa la risposta
+**esclusivamente** sul loro contenuto; se non trovi l’informazione, dichiara che non è riportata nel PDTA.
+"""
+
+
+# Rule 5 as written in AGENT_INSTRUCTIONS, and the rule replacing it when the sources are appended
+# to the answer locally (PDTA_LOCAL_CITATIONS, see agent/citations.py)
+CITATION_RULE = """- Cita sempre la **fonte** o **sezione** del PDTA da cui ricavi l’informazione (es. “Sezione 5.4 – Diagnosi iniziale”, “Procedura I_DS_P33”).
+"""
+LOCAL_CITATION_RULE = """- Le **fonti** (documento, sezione e pagina del PDTA) vengono aggiunte automaticamente in fondo alla risposta: **non** scrivere un elenco di fonti o di riferimenti.
+- Riporta nel testo i codici di procedura o di impegnativa (es. “Procedura I_DS_P33”, “CVP 89.7B.6_2”) quando servono al MMG per agire.
+"""
+
+
 PDTA_INSTRUCTIONS = """
 Leggi attentamente il seguente estratto del PDTA:
 {pdta_text}
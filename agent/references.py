@@ -0,0 +1,175 @@
+"""
+Exact-reference lookup table for the PDTA corpus.
+
+The PDTA refers to internal procedure and instruction codes (I_DON_P04, I_DS_P33, I_OST_IO01...),
+prestazione codes of the regional catalogues (CVP 89.7B.6_2, NTR 94.09), numbered IOV sections
+(5.1-5.9, 6, 7, 8), ROV 2017 pages and acronyms (GOM, CUP, CVP, NTR, RACI...). ReferenceIndex
+maps each of them to its defining passages and their pages once per corpus version, so a
+question naming one is resolved with a dictionary lookup instead of a search, and the
+passages can be pinned into the model input.
+
+- PDTA_PIN_REFERENCES: "off" disables pinning the passages of the references named in a
+  question ("on" by default). Passages are pinned only in the tools context mode: in the full
+  context mode they are already in the instructions.
+
+The table of a reference can be printed with `python -m agent.references I_DON_P04 "sezione 7"`.
+"""
+import re
+import sys
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .config import get_bool_setting
+from .corpus import DOC_IOV, DOC_ROV_2017, Chunk, Corpus
+
+KIND_CODE = "code"
+KIND_SECTION = "section"
+KIND_PAGE = "page"
+KIND_ACRONYM = "acronym"
+
+# Acronyms of the PDTA indexed even though the text never spells them out
+ACRONYMS = (
+    "GOM", "CUP", "CVP", "NTR", "RACI", "MMG", "PDTA", "IOV", "ROV", "SSN", "PS", "AOUP", "GIVOP",
+    "NSCLC", "SCLC", "EBUS", "EUS", "TBNA", "TBB", "ROSE", "PET", "HRTC", "PFR", "NGS", "EGFR",
+    "ALK", "TKI", "TPS",
+)
+
+# Passages pinned for one question, and occurrences kept per reference
+MAX_PINNED = 3
+MAX_OCCURRENCES = 8
+
+CODE_RE = re.compile(r"\bI_[A-Z]+_[A-Z]*\d+\b")
+PRESTAZIONE_RE = re.compile(r"\b(CVP|NTR)\s+(\d{2}\.[0-9A-Z]+(?:\.[0-9A-Z]+)*(?:_\d+)?)")
+_SECTION_QUERY_RE = re.compile(r"\b(?:sezione|sezioni|sez\.|paragrafo|par\.|capitolo|cap\.|§)\s*(\d+(?:\.\d+)?)", re.IGNORECASE)
+_PAGE_QUERY_RE = re.compile(r"\b(?:pagina|pag\.|p\.)\s*(\d+)", re.IGNORECASE)
+_ACRONYM_RE = re.compile(r"\b(" + "|".join(sorted(ACRONYMS, key=len, reverse=True)) + r")\b")
+
+
+@dataclass(frozen=True)
+class Occurrence:
+    """Where a reference appears: the chunk, the character offset in its text and the line."""
+    chunk_id: str
+    offset: int
+    line: str
+
+
+@dataclass(frozen=True)
+class Reference:
+    """A code, section, page or acronym and its defining passages, most relevant first."""
+    key: str
+    kind: str
+    chunk_ids: Tuple[str, ...]
+    pages: Tuple[str, ...]
+    occurrences: Tuple[Occurrence, ...] = ()
+
+
+def _pages(chunk: Chunk) -> str:
+    return str(chunk.page) if chunk.page is not None else (chunk.source_pages or "")
+
+
+def _line_at(text: str, offset: int) -> str:
+    start = text.rfind("\n", 0, offset) + 1
+    end = text.find("\n", offset)
+    return text[start:end if end >= 0 else len(text)].strip()
+
+
+class ReferenceIndex:
+    """
+    Dictionary index from exact references to corpus passages.
+    """
+    def __init__(self, corpus: Corpus):
+        """
+        Args:
+            corpus: The parsed PDTA corpus.
+        """
+        self.corpus = corpus
+        self.references: Dict[str, Reference] = {}
+        found: Dict[Tuple[str, str], List[Occurrence]] = {}
+        for chunk in corpus.chunks:
+            if not chunk.has_text:
+                continue
+            if chunk.document == DOC_IOV and chunk.section:
+                self._add(Reference(chunk.section, KIND_SECTION, (chunk.chunk_id,), (_pages(chunk),)))
+            if chunk.document == DOC_ROV_2017 and chunk.page is not None:
+                self._add(Reference(str(chunk.page), KIND_PAGE, (chunk.chunk_id,), (_pages(chunk),)))
+            matches = [(KIND_CODE, m.group(0), m.start()) for m in CODE_RE.finditer(chunk.text)]
+            matches += [(KIND_CODE, m.group(2), m.start(2)) for m in PRESTAZIONE_RE.finditer(chunk.text)]
+            matches += [(KIND_ACRONYM, m.group(1), m.start()) for m in _ACRONYM_RE.finditer(chunk.text)]
+            for kind, key, offset in matches:
+                found.setdefault((kind, key), []).append(Occurrence(chunk.chunk_id, offset, _line_at(chunk.text, offset)))
+        for (kind, key), occurrences in found.items():
+            # The chunks naming the reference most often define it, a mention in parentheses
+            # after what it denotes ("valutazione dietistica (I_DN_P01)") counting double; ties
+            # keep the corpus order
+            counts: Counter = Counter()
+            for occurrence in occurrences:
+                text = corpus.by_id[occurrence.chunk_id].text
+                counts[occurrence.chunk_id] += 2 if text[occurrence.offset - 1:occurrence.offset] == "(" else 1
+            chunk_ids = tuple(sorted(counts, key=lambda chunk_id: -counts[chunk_id]))
+            self._add(Reference(key, kind, chunk_ids, tuple(_pages(corpus.by_id[c]) for c in chunk_ids),
+                                tuple(occurrences[:MAX_OCCURRENCES])))
+
+    def _add(self, reference: Reference) -> None:
+        self.references[f"{reference.kind}:{reference.key.upper()}"] = reference
+
+    def get(self, kind: str, key: str) -> Optional[Reference]:
+        """
+        Returns the reference of a kind with the given key (codes and acronyms are matched
+        case-insensitively), or None.
+        """
+        return self.references.get(f"{kind}:{key.strip().upper()}")
+
+    def resolve(self, text: str) -> List[Reference]:
+        """
+        Finds the exact references named in a question: procedure and prestazione codes,
+        "sezione 5.3", "pag. 30" and the known acronyms.
+
+        Args:
+            text: The user's question.
+
+        Returns:
+            The references found in the index, in order of appearance, without duplicates.
+        """
+        candidates = [(m.start(), KIND_CODE, m.group(0)) for m in CODE_RE.finditer(text.upper())]
+        candidates += [(m.start(2), KIND_CODE, m.group(2)) for m in PRESTAZIONE_RE.finditer(text.upper())]
+        candidates += [(m.start(), KIND_SECTION, m.group(1)) for m in _SECTION_QUERY_RE.finditer(text)]
+        candidates += [(m.start(), KIND_PAGE, m.group(1)) for m in _PAGE_QUERY_RE.finditer(text)]
+        candidates += [(m.start(), KIND_ACRONYM, m.group(1)) for m in _ACRONYM_RE.finditer(text)]
+        resolved: List[Reference] = []
+        for _, kind, key in sorted(candidates):
+            reference = self.get(kind, key)
+            if reference is not None and reference not in resolved:
+                resolved.append(reference)
+        return resolved
+
+    def passages(self, references: Iterable[Reference], limit: int = MAX_PINNED) -> List[Chunk]:
+        """
+        Returns the defining passages of some references, without duplicates. Codes, sections
+        and pages come before acronyms, which are usually named in passing.
+        """
+        ranked = sorted(references, key=lambda reference: reference.kind == KIND_ACRONYM)
+        chunks: List[Chunk] = []
+        for reference in ranked:
+            chunk = self.corpus.by_id[reference.chunk_ids[0]]
+            if chunk not in chunks:
+                chunks.append(chunk)
+        return chunks[:limit]
+
+
+def pin_references_enabled() -> bool:
+    """
+    Whether the passages of the references named in a question are pinned into the model
+    input (PDTA_PIN_REFERENCES, "on" by default).
+    """
+    return get_bool_setting("PDTA_PIN_REFERENCES", True)
+
+
+if __name__ == "__main__":
+    from .corpus import load_corpus
+
+    index = ReferenceIndex(load_corpus())
+    for reference in index.resolve(" ".join(sys.argv[1:])):
+        print(f"{reference.kind} {reference.key}: {', '.join(reference.chunk_ids)} (pagg. {', '.join(reference.pages)})")
+        for occurrence in reference.occurrences:
+            print(f"    {occurrence.chunk_id}@{occurrence.offset}: {occurrence.line[:100]}")
@@ -0,0 +1,181 @@
+"""
+Registry of the PDTA documents, one retrieval index per document.
+
+`pdta_text` mixes the IOV document (I_DG_PDTA08) and the ROV 2017 transcription, and more
+PDTAs are expected. Instead of a single index over everything, each document gets its own
+Retriever, serialized to an index file when the registry is built. The registry keeps a small
+summary of each document (title, size and vocabulary); an index is read back from its file when
+a query is routed to its document, and the least recently used ones are evicted beyond
+`max_loaded`.
+
+Memory: a loaded index is a full unpickled copy of the document's Retriever, chunk texts
+included (about 1.2 MB for the IOV and ROV 2017 indexes together), on top of the corpus the
+CorpusVersion keeps resident anyway. Eviction bounds the number of such copies; it does not make
+the chunk texts lazy. What the files save is rebuilding an evicted index from the text.
+
+route() picks the documents worth searching for a query from their vocabularies, so the
+retrieved context grows with the documents a query touches, not with the number of documents
+registered.
+"""
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from .corpus import DOCUMENT_TITLES, Corpus
+from .retrieval import Retriever, ScoredChunk
+from .text import terms
+from .tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class DocumentInfo:
+    """The resident summary of a registered document."""
+    document: str
+    title: str
+    chunks: int
+    tokens: int
+    path: str
+    document_frequency: Counter
+
+
+class CorpusRegistry:
+    """
+    Per-document indexes with on-demand loading and LRU eviction.
+    """
+    def __init__(self, corpus: Corpus, directory: Optional[str] = None, max_loaded: int = 4,
+                 route_ratio: float = 0.5):
+        """
+        Args:
+            corpus: The corpus to split by document.
+            directory: Where the index files are written. Defaults to a private temporary
+                directory removed with the registry.
+            max_loaded: Maximum number of document indexes kept in memory.
+            route_ratio: route() keeps the documents scoring at least this fraction of the best one.
+        """
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix="pdta_index_")
+            weakref.finalize(self, shutil.rmtree, directory, True)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_loaded = max(1, max_loaded)
+        self.route_ratio = route_ratio
+        self.documents: Dict[str, DocumentInfo] = {}
+        self._loaded: "OrderedDict[str, Retriever]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_chunks = 0
+
+        by_document: Dict[str, list] = {}
+        for chunk in corpus.chunks:
+            by_document.setdefault(chunk.document, []).append(chunk)
+        for document, chunks in by_document.items():
+            self.add(document, Corpus(chunks))
+
+    def add(self, document: str, corpus: Corpus) -> DocumentInfo:
+        """
+        Indexes a document and writes its index file. Replaces a document with the same id.
+        """
+        retriever = Retriever(corpus)
+        path = os.path.join(self.directory, f"{document}.idx")
+        with open(path, "wb") as index_file:
+            pickle.dump(retriever, index_file, protocol=pickle.HIGHEST_PROTOCOL)
+        info = DocumentInfo(
+            document=document,
+            title=DOCUMENT_TITLES.get(document, document),
+            chunks=len(corpus.chunks),
+            tokens=sum(estimate_tokens(chunk.text) for chunk in corpus.chunks),
+            path=path,
+            document_frequency=corpus.document_frequency,
+        )
+        with self._lock:
+            self.documents[document] = info
+            self._loaded.pop(document, None)
+            self._total_chunks = sum(d.chunks for d in self.documents.values())
+        return info
+
+    def index(self, document: str) -> Retriever:
+        """
+        Returns the index of a document, loading it from its file if it is not in memory.
+        """
+        with self._lock:
+            retriever = self._loaded.get(document)
+            if retriever is not None:
+                self._loaded.move_to_end(document)
+                return retriever
+            path = self.documents[document].path
+        with open(path, "rb") as index_file:
+            retriever = pickle.load(index_file)
+        with self._lock:
+            self._loaded[document] = retriever
+            self._loaded.move_to_end(document)
+            while len(self._loaded) > self.max_loaded:
+                evicted, _ = self._loaded.popitem(last=False)
+                logger.debug("Evicted index of document %s.", evicted)
+        logger.debug("Loaded index of document %s.", document)
+        return retriever
+
+    def loaded(self) -> List[str]:
+        """The documents whose index is in memory, least recently used first."""
+        with self._lock:
+            return list(self._loaded)
+
+    def route(self, query: str, max_documents: Optional[int] = None) -> List[str]:
+        """
+        Chooses the documents to search for a query.
+
+        Each document is scored by the IDF-weighted share of the query terms occurring in it
+        (IDF over the chunks of all documents); documents scoring at least `route_ratio` of the
+        best one are kept, best first. A query matching no document is routed to all of them.
+
+        Args:
+            query: The user's question.
+            max_documents: Upper bound on the documents returned.
+
+        Returns:
+            The ids of the documents to search.
+        """
+        query_terms = set(terms(query))
+        with self._lock:
+            documents = list(self.documents.values())
+            total = self._total_chunks
+        scores = {}
+        for info in documents:
+            score = 0.0
+            for term in query_terms:
+                frequency = info.document_frequency.get(term, 0)
+                if frequency:
+                    overall = sum(d.document_frequency.get(term, 0) for d in documents)
+                    score += (frequency / info.chunks) ** 0.5 * (1.0 + (total / overall) ** 0.5)
+            scores[info.document] = score
+        best = max(scores.values(), default=0.0)
+        if best <= 0:
+            routed = [info.document for info in documents]
+        else:
+            routed = sorted((d for d, s in scores.items() if s >= best * self.route_ratio), key=lambda d: -scores[d])
+        return routed[:max_documents] if max_documents else routed
+
+    def search(self, query: str, k: int = 5, documents: Optional[Sequence[str]] = None) -> List[ScoredChunk]:
+        """
+        Searches the routed (or the given) documents and merges their best chunks by score.
+
+        Args:
+            query: The user's question.
+            k: The maximum number of chunks.
+            documents: The documents to search; defaults to route(query).
+
+        Returns:
+            The scored chunks, best first.
+        """
+        results: List[ScoredChunk] = []
+        for document in documents if documents is not None else self.route(query):
+            results.extend(self.index(document).search(query, k))
+        results.sort(key=lambda scored: -scored.score)
+        return results[:k]
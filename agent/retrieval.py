@@ -0,0 +1,109 @@
+"""
+Lexical retrieval over the PDTA corpus.
+
+An in-memory inverted index over the corpus chunks (IOV sections and ROV 2017 pages), scored
+with BM25 or TF-IDF cosine on the same stemmed terms used by the other local components.
+Chunks without extractable text are not indexed. Retrieval runs in-process in well under a
+millisecond per query, so it can sit in front of every turn.
+
+`benchmarks.retrieval` measures recall and context size of the configurations below against
+a labeled question set.
+"""
+import math
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from .corpus import Chunk, Corpus, chunk_term_counts, load_corpus
+from .text import terms
+
+SCORING_BM25 = "bm25"
+SCORING_TFIDF = "tfidf"
+
+
+@dataclass(frozen=True)
+class ScoredChunk:
+    """A retrieved chunk and its score."""
+    chunk: Chunk
+    score: float
+
+
+class Retriever:
+    """
+    Ranks corpus chunks against a query.
+    """
+    def __init__(self, corpus: Corpus, scoring: str = SCORING_BM25, k1: float = 1.2, b: float = 0.75,
+                 documents: Optional[Sequence[str]] = None):
+        """
+        Args:
+            corpus: The parsed PDTA corpus.
+            scoring: SCORING_BM25 or SCORING_TFIDF.
+            k1: BM25 term frequency saturation.
+            b: BM25 length normalization.
+            documents: Only index chunks of these documents (e.g. DOC_IOV); defaults to all.
+        """
+        if scoring not in (SCORING_BM25, SCORING_TFIDF):
+            raise ValueError(f"Unknown scoring '{scoring}'. Use {SCORING_BM25} or {SCORING_TFIDF}.")
+        self.corpus = corpus
+        self.scoring = scoring
+        self.k1 = k1
+        self.b = b
+        self.chunks = [c for c in corpus.chunks if c.has_text and (documents is None or c.document in documents)]
+        self._postings: Dict[str, List[tuple]] = defaultdict(list)
+        self._lengths: List[int] = []
+        for index, chunk in enumerate(self.chunks):
+            counts = chunk_term_counts(chunk.text)
+            self._lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                self._postings[term].append((index, count))
+        self._average_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+        self._idf = {term: self._term_idf(len(postings)) for term, postings in self._postings.items()}
+        self._norms = [0.0] * len(self.chunks)
+        if scoring == SCORING_TFIDF:
+            for term, postings in self._postings.items():
+                for index, count in postings:
+                    self._norms[index] += (count * self._idf[term]) ** 2
+            self._norms = [math.sqrt(norm) for norm in self._norms]
+
+    def _term_idf(self, frequency: int) -> float:
+        total = len(self.chunks)
+        if self.scoring == SCORING_BM25:
+            return math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+        return math.log((1 + total) / (1 + frequency)) + 1.0
+
+    def search(self, query: str, k: int = 5) -> List[ScoredChunk]:
+        """
+        Returns the `k` best chunks for a query, best first. Chunks sharing no term with the
+        query are never returned.
+
+        Args:
+            query: The user's question or any free text.
+            k: The maximum number of chunks.
+
+        Returns:
+            The scored chunks.
+        """
+        query_terms = Counter(terms(query))
+        scores: Dict[int, float] = defaultdict(float)
+        for term, query_count in query_terms.items():
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf[term]
+            for index, count in postings:
+                if self.scoring == SCORING_BM25:
+                    norm = 1 - self.b + self.b * self._lengths[index] / self._average_length
+                    scores[index] += idf * count * (self.k1 + 1) / (count + self.k1 * norm)
+                else:
+                    scores[index] += query_count * idf * count * idf
+        if self.scoring == SCORING_TFIDF:
+            scores = {index: score / self._norms[index] for index, score in scores.items()}
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [ScoredChunk(self.chunks[index], score) for index, score in best]
+
+
+def default_retriever(scoring: str = SCORING_BM25) -> Retriever:
+    """
+    Builds a retriever over the whole PDTA corpus.
+    """
+    return Retriever(load_corpus(), scoring=scoring)
@@ -0,0 +1,145 @@
+"""
+Per-turn model routing.
+
+Cheap turns (clarifying questions, short follow-ups, reformulations, general questions on the
+PDTA) are sent to a fast model, while turns that lead to the final referral recommendation use a
+stronger one. Each turn is
+classified locally into a kind, and a policy maps kinds to routes:
+
+- PDTA_MODEL_FAST / PDTA_MODEL_STRONG: the model of each route (both default to the agent model,
+  i.e. routing only labels the turns until a second model is configured);
+- PDTA_ROUTING_POLICY: overrides of the kind -> route mapping, e.g.
+  "followup=fast,referral=strong,other=fast".
+"""
+import logging
+import re
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
+
+from .clarification import SLOT_IMAGING, SLOT_SMOKING, SLOT_SYMPTOMS, detect_slots
+from .config import get_setting
+from .text import fold, terms
+
+if TYPE_CHECKING:
+    from agents import Model
+
+logger = logging.getLogger(__name__)
+
+ROUTE_FAST = "fast"
+ROUTE_STRONG = "strong"
+
+KIND_REFORMULATION = "reformulation"
+KIND_CLARIFICATION = "clarification"
+KIND_FOLLOWUP = "followup"
+KIND_REFERRAL = "referral"
+KIND_QUESTION = "question"
+KIND_OTHER = "other"
+
+DEFAULT_POLICY = {
+    KIND_REFORMULATION: ROUTE_FAST,
+    KIND_CLARIFICATION: ROUTE_FAST,
+    KIND_FOLLOWUP: ROUTE_FAST,
+    KIND_REFERRAL: ROUTE_STRONG,
+    KIND_QUESTION: ROUTE_FAST,
+    KIND_OTHER: ROUTE_STRONG,
+}
+
+# Follow-ups with at most this many content terms are considered short
+SHORT_FOLLOWUP_TERMS = 6
+
+_REFORMULATION_RE = re.compile(
+    r"riformul|riassum|ripet|spiega(mi)? meglio|in (breve|sintesi)|piu semplice|in altre parole|elenco puntato|"
+    r"non ho capito")
+# Referral intent: sending the patient to IOV, the impegnativa and booking, or the next step of a case
+_REFERRAL_RE = re.compile(
+    r"\binvi(o|a|are|arl[oa]|ato|ata)\b|impegnativ|prenot|accesso (allo |all.)?iov|ingresso (allo |all.)?iov|"
+    r"presa in carico|cosa (devo|posso) fare|come (procedo|devo procedere)|a chi (lo |la )?(invio|indirizzo|mando)")
+
+
+def classify_turn(message: str, history: List[dict]) -> str:
+    """
+    Classifies a user turn for routing.
+
+    Args:
+        message: The user's message.
+        history: The conversation before this message.
+
+    Returns:
+        One of the KIND_* constants.
+    """
+    text = fold(message)
+    if history and _REFORMULATION_RE.search(text):
+        return KIND_REFORMULATION
+    last_reply = next((m.get("content", "") for m in reversed(history) if m.get("role") == "assistant"), "")
+    slots = detect_slots(message)
+    # Case facts answering the agent's questions lead to the final recommendation
+    if _REFERRAL_RE.search(text) or ("?" in str(last_reply) and slots.present):
+        return KIND_REFERRAL
+    if not history and slots.is_case and not slots.has_diagnosis:
+        if any(not slots.has(slot) for slot in (SLOT_SYMPTOMS, SLOT_SMOKING, SLOT_IMAGING)):
+            return KIND_CLARIFICATION
+    if history and len(set(terms(message))) <= SHORT_FOLLOWUP_TERMS:
+        return KIND_FOLLOWUP
+    # A question on the PDTA that describes no case ("Quali esami servono per la stadiazione?")
+    if not slots.is_case:
+        return KIND_QUESTION
+    return KIND_OTHER
+
+
+def parse_policy(spec: Optional[str]) -> Dict[str, str]:
+    """
+    Parses a "kind=route,..." policy override on top of DEFAULT_POLICY.
+    """
+    policy = dict(DEFAULT_POLICY)
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        kind, _, route = part.partition("=")
+        kind, route = kind.strip(), route.strip()
+        if kind not in DEFAULT_POLICY or route not in (ROUTE_FAST, ROUTE_STRONG):
+            raise ValueError(f"Invalid routing policy entry '{part}'. Use <kind>=fast|strong with kinds "
+                             f"{', '.join(DEFAULT_POLICY)}.")
+        policy[kind] = route
+    return policy
+
+
+class ModelRouter:
+    """
+    Chooses the route (and so the model) of each turn.
+    """
+    def __init__(self, routes: Dict[str, Union[str, "Model"]], policy: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            routes: The model of each route (ROUTE_FAST and ROUTE_STRONG).
+            policy: Mapping from turn kind to route; defaults to DEFAULT_POLICY.
+        """
+        missing = {ROUTE_FAST, ROUTE_STRONG} - set(routes)
+        if missing:
+            raise ValueError(f"Missing model for routes: {', '.join(sorted(missing))}")
+        self.routes = dict(routes)
+        self.policy = dict(policy or DEFAULT_POLICY)
+
+    def route(self, message: str, history: List[dict]) -> Tuple[str, str]:
+        """
+        Returns the (kind, route) pair of a turn.
+        """
+        kind = classify_turn(message, history)
+        return kind, self.policy.get(kind, ROUTE_STRONG)
+
+
+def router_from_env(model: Union[str, "Model"]) -> ModelRouter:
+    """
+    Builds the router configured by PDTA_MODEL_FAST, PDTA_MODEL_STRONG and PDTA_ROUTING_POLICY.
+    Model instances (e.g. the offline MockModel) are used for both routes.
+
+    Args:
+        model: The agent's default model.
+    """
+    routes: Dict[str, Union[str, "Model"]] = {ROUTE_FAST: model, ROUTE_STRONG: model}
+    if isinstance(model, str):
+        routes[ROUTE_FAST] = get_setting("PDTA_MODEL_FAST") or model
+        routes[ROUTE_STRONG] = get_setting("PDTA_MODEL_STRONG") or model
+    router = ModelRouter(routes, parse_policy(get_setting("PDTA_ROUTING_POLICY")))
+    if routes[ROUTE_FAST] != routes[ROUTE_STRONG]:
+        logger.info("Model routing enabled: fast=%s, strong=%s", routes[ROUTE_FAST], routes[ROUTE_STRONG])
+    return router
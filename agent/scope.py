@@ -0,0 +1,218 @@
+"""
+Local scope detection for incoming questions.
+
+Rule 2 of the agent instructions makes the model answer questions outside the lung cancer
+PDTA with a fixed refusal. ScopeClassifier recognizes the clear cases locally, so the refusal
+is returned instantly instead of paying a full-context model call for a canned sentence.
+
+The score combines:
+
+- coverage: the share of the question's terms (IDF-weighted) that occur in the PDTA corpus;
+- similarity to a small labeled set of in-scope and out-of-scope questions;
+- anchor terms: terms of the in-scope examples that appear in the corpus and in no
+  out-of-scope example. A question with an anchor term is never refused locally.
+
+Only confident out-of-scope questions are answered locally; everything else goes to the model.
+Precision and recall on the labeled set (leave-one-out) are logged when a corpus version is
+built (see agent/corpus_store.py) and can be printed with `python -m agent.scope`.
+"""
+import json
+import logging
+import math
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .config import get_bool_setting
+from .corpus import Corpus, load_corpus
+from .text import terms
+
+logger = logging.getLogger(__name__)
+
+IN_SCOPE = "in_scope"
+OUT_OF_SCOPE = "out_of_scope"
+UNCERTAIN = "uncertain"
+
+# Fixed refusal of Rule 2 in AGENT_INSTRUCTIONS
+OUT_OF_SCOPE_REPLY = (
+    "Sono un agente specializzato nel PDTA Tumore del Polmone dello IOV. "
+    "La tua domanda è fuori dall’ambito di questo documento. "
+    "Posso aiutarti con questioni relative al PDTA del Polmone."
+)
+
+LABELED_EXAMPLES: List[Tuple[str, str]] = [
+    ("Paziente di 65 anni forte fumatore con tosse persistente da 6 settimane, cosa devo fare?", IN_SCOPE),
+    ("Quali esami servono prima della prima visita oncologica allo IOV?", IN_SCOPE),
+    ("Come si prenota la prima visita oncologica tramite CUP?", IN_SCOPE),
+    ("Nodulo polmonare di 8 mm alla TC, come procedo?", IN_SCOPE),
+    ("Quando un caso viene discusso nel GOM polmone?", IN_SCOPE),
+    ("Che cosa fa il Case Manager nel percorso?", IN_SCOPE),
+    ("Emoftoe in paziente ex fumatore, serve una TC torace?", IN_SCOPE),
+    ("Quali sono i codici CVP della prima visita radioterapica?", IN_SCOPE),
+    ("Come funziona il follow-up dopo intervento chirurgico per tumore polmonare?", IN_SCOPE),
+    ("Chi è responsabile della presa in carico radioterapica secondo la matrice RACI?", IN_SCOPE),
+    ("Come richiedo la biopsia liquida per EGFR?", IN_SCOPE),
+    ("Il paziente ha un versamento pleurico, che esami prevede il percorso?", IN_SCOPE),
+    ("Quali indicatori monitora il PDTA del polmone?", IN_SCOPE),
+    ("Come invio il mio paziente all'ambulatorio antifumo?", IN_SCOPE),
+    ("Adenocarcinoma in stadio IV, a chi lo invio allo IOV?", IN_SCOPE),
+    ("Serve la PET-TC per la stadiazione di una neoplasia periferica?", IN_SCOPE),
+    ("Quali chemioterapie di prima linea sono previste per la malattia metastatica?", IN_SCOPE),
+    ("RX torace con opacità sospetta, deve fare la broncoscopia?", IN_SCOPE),
+    ("Come si attiva la valutazione per le cure simultanee?", IN_SCOPE),
+    ("Quale esenzione va indicata sull'impegnativa?", IN_SCOPE),
+    ("Calo ponderale e tosse in un ex fumatore di 70 anni", IN_SCOPE),
+    ("Che ruolo ha lo pneumologo nella diagnosi?", IN_SCOPE),
+    ("Il supporto psicologico è previsto per i pazienti con tumore del polmone?", IN_SCOPE),
+    ("Quali sono i tempi di refertazione NGS?", IN_SCOPE),
+    ("Operaio edile esposto ad amianto con dispnea da sforzo", IN_SCOPE),
+    ("Febbre e dolore toracico da tre settimane nonostante l'antibiotico", IN_SCOPE),
+    ("Qual è la ricetta della carbonara?", OUT_OF_SCOPE),
+    ("Chi ha vinto il campionato di calcio l'anno scorso?", OUT_OF_SCOPE),
+    ("Che tempo farà domani a Padova?", OUT_OF_SCOPE),
+    ("Scrivimi una poesia sul mare", OUT_OF_SCOPE),
+    ("Come si installa Python su Windows?", OUT_OF_SCOPE),
+    ("Consigli per un viaggio in Giappone", OUT_OF_SCOPE),
+    ("Qual è la capitale dell'Australia?", OUT_OF_SCOPE),
+    ("Traduci in inglese questa frase: buongiorno a tutti", OUT_OF_SCOPE),
+    ("Quanto costa un abbonamento a Netflix?", OUT_OF_SCOPE),
+    ("Come si calcola l'IVA su una fattura?", OUT_OF_SCOPE),
+    ("Raccontami una barzelletta divertente", OUT_OF_SCOPE),
+    ("Quali film mi consigli di vedere questo weekend?", OUT_OF_SCOPE),
+    ("Come cambio la camera d'aria della bicicletta?", OUT_OF_SCOPE),
+    ("Quali sono gli orari dei treni per Venezia?", OUT_OF_SCOPE),
+    ("Spiegami la teoria della relatività", OUT_OF_SCOPE),
+    ("Come si coltivano i pomodori sul balcone?", OUT_OF_SCOPE),
+    ("Quale smartphone mi consigli di comprare?", OUT_OF_SCOPE),
+    ("Scrivi una mail per chiedere le ferie al mio capo", OUT_OF_SCOPE),
+    ("Chi era Napoleone Bonaparte?", OUT_OF_SCOPE),
+    ("Come preparo un curriculum vitae efficace?", OUT_OF_SCOPE),
+    ("Qual è la terapia per l'ipertensione arteriosa?", OUT_OF_SCOPE),
+    ("Come si tratta l'emicrania cronica?", OUT_OF_SCOPE),
+    ("Dosaggio dell'amoxicillina nei bambini", OUT_OF_SCOPE),
+]
+
+
+@dataclass(frozen=True)
+class ScopeDecision:
+    """The outcome of a scope check."""
+    label: str
+    score: float
+    coverage: float
+    anchors: Tuple[str, ...] = ()
+
+
+def _cosine(a: Counter, b: Counter) -> float:
+    if not a or not b:
+        return 0.0
+    dot = sum(value * b.get(term, 0) for term, value in a.items())
+    return dot / (math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values())))
+
+
+class ScopeClassifier:
+    """
+    Decides whether a question is about the lung cancer PDTA without calling the model.
+    """
+    def __init__(self, corpus: Corpus, examples: Sequence[Tuple[str, str]] = LABELED_EXAMPLES,
+                 out_threshold: float = 0.25, in_threshold: float = 0.75, min_terms: int = 2):
+        """
+        Args:
+            corpus: The parsed PDTA corpus providing the vocabulary.
+            examples: Labeled (question, label) pairs.
+            out_threshold: Scores at or below this are out of scope.
+            in_threshold: Scores at or above this are in scope; scores in between are uncertain.
+            min_terms: Questions with fewer distinct terms are always uncertain.
+        """
+        self.corpus = corpus
+        self.examples = list(examples)
+        self.out_threshold = out_threshold
+        self.in_threshold = in_threshold
+        self.min_terms = min_terms
+        self._max_idf = corpus.idf("")
+        self._vectors = [(self._vector(terms(text)), label) for text, label in self.examples]
+        in_terms = {t for text, label in self.examples if label == IN_SCOPE for t in terms(text)}
+        out_terms = {t for text, label in self.examples if label == OUT_OF_SCOPE for t in terms(text)}
+        self.anchors = frozenset(t for t in in_terms - out_terms if t in corpus.document_frequency)
+
+    def _vector(self, question_terms: Iterable[str]) -> Counter:
+        return Counter({t: self.corpus.idf(t) for t in set(question_terms)})
+
+    def classify(self, message: str) -> ScopeDecision:
+        """
+        Scores a user message.
+
+        Args:
+            message: The user's question.
+
+        Returns:
+            The decision; only OUT_OF_SCOPE decisions should be answered locally.
+        """
+        question_terms = terms(message)
+        distinct = set(question_terms)
+        if not distinct:
+            return ScopeDecision(UNCERTAIN, 0.0, 0.0)
+
+        known = sum(self.corpus.idf(t) for t in distinct if t in self.corpus.document_frequency)
+        total = known + self._max_idf * sum(1 for t in distinct if t not in self.corpus.document_frequency)
+        coverage = known / total if total else 0.0
+
+        vector = self._vector(distinct)
+        in_similarity = max((_cosine(vector, v) for v, label in self._vectors if label == IN_SCOPE), default=0.0)
+        out_similarity = max((_cosine(vector, v) for v, label in self._vectors if label == OUT_OF_SCOPE), default=0.0)
+        score = coverage + in_similarity - out_similarity
+        anchors = tuple(sorted(distinct & self.anchors))
+
+        if anchors or score >= self.in_threshold:
+            label = IN_SCOPE
+        elif score <= self.out_threshold and len(distinct) >= self.min_terms:
+            label = OUT_OF_SCOPE
+        else:
+            label = UNCERTAIN
+        return ScopeDecision(label, score, coverage, anchors)
+
+    def evaluate(self, examples: Optional[Sequence[Tuple[str, str]]] = None) -> Dict[str, float]:
+        """
+        Measures the local refusals on a labeled set. When evaluating the classifier's own
+        examples, each one is scored by a classifier built without it (leave-one-out).
+
+        Returns:
+            Precision and recall of the out-of-scope decisions, the share of questions escalated
+            to the model and the number of in-scope questions wrongly refused.
+        """
+        leave_one_out = examples is None
+        examples = self.examples if leave_one_out else list(examples)
+        true_positives = false_positives = escalated = 0
+        positives = sum(1 for _, label in examples if label == OUT_OF_SCOPE)
+        for index, (text, label) in enumerate(examples):
+            classifier = self
+            if leave_one_out:
+                classifier = ScopeClassifier(
+                    self.corpus, examples[:index] + examples[index + 1:],
+                    self.out_threshold, self.in_threshold, self.min_terms)
+            decision = classifier.classify(text)
+            if decision.label == OUT_OF_SCOPE:
+                if label == OUT_OF_SCOPE:
+                    true_positives += 1
+                else:
+                    false_positives += 1
+            elif decision.label == UNCERTAIN:
+                escalated += 1
+        refused = true_positives + false_positives
+        return {
+            "examples": len(examples),
+            "precision": true_positives / refused if refused else 1.0,
+            "recall": true_positives / positives if positives else 0.0,
+            "escalation_rate": escalated / len(examples) if examples else 0.0,
+            "false_refusals": false_positives,
+        }
+
+
+def scope_filter_enabled() -> bool:
+    """
+    Whether the local scope filter is enabled (PDTA_SCOPE_FILTER, "on" by default).
+    """
+    return get_bool_setting("PDTA_SCOPE_FILTER", True)
+
+
+if __name__ == "__main__":
+    print(json.dumps(ScopeClassifier(load_corpus()).evaluate(), indent=2))
@@ -0,0 +1,175 @@
+"""
+Single-flight coalescing of identical concurrent model calls.
+
+When several sessions send the same conversation at the same time (typically the same opening
+question after a training session), only the first one starts an upstream call; the others
+subscribe to it and receive the same stream of events. Each subscriber has its own buffer,
+so a slow reader never holds back the others, and late subscribers get the events published
+so far replayed before the live ones.
+
+Upstream calls run on a dedicated background event loop, because subscribers may live on
+different threads and loops (Streamlit runs each session on its own script thread). A call is
+cancelled as soon as its last subscriber leaves, and forgotten when it completes: this is
+in-flight deduplication, not a response cache.
+"""
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+class _Failure:
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class Subscription:
+    """
+    The stream of a shared call as seen by one subscriber. Iterate it with `async for` on the
+    subscriber's own event loop; `cancel()` ends the iteration and unsubscribes.
+    """
+    def __init__(self, flight: "_Flight", loop: asyncio.AbstractEventLoop, leader: bool):
+        self.flight = flight
+        self.leader = leader
+        self._loop = loop
+        self._queue: "asyncio.Queue[Any]" = asyncio.Queue()
+
+    def push(self, item: Any) -> None:
+        """Delivers an item from any thread."""
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[Any]:
+        try:
+            while True:
+                item = await self._queue.get()
+                if item is _END:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+        finally:
+            self.flight.unsubscribe(self)
+
+    def cancel(self) -> None:
+        """Stops this subscriber; the shared call goes on for the others."""
+        self.flight.unsubscribe(self)
+        self._queue.put_nowait(_END)
+
+
+class _Flight:
+    """One upstream call and its subscribers."""
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.future: Optional[concurrent.futures.Future] = None
+        self._buffer: List[Any] = []
+        self._subscribers: List[Subscription] = []
+        self._finished = False
+        self._lock = threading.Lock()
+
+    def add(self, subscription: Subscription) -> None:
+        with self._lock:
+            for item in self._buffer:
+                subscription.push(item)
+            if self._finished:
+                subscription.push(_END)
+            else:
+                self._subscribers.append(subscription)
+
+    def publish(self, item: Any) -> None:
+        with self._lock:
+            self._buffer.append(item)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.push(item)
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._finished = True
+            subscribers, self._subscribers = self._subscribers, []
+        for subscription in subscribers:
+            subscription.push(_Failure(error) if error is not None else _END)
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription not in self._subscribers:
+                return
+            self._subscribers.remove(subscription)
+            abandoned = not self._subscribers and not self._finished
+        if abandoned and self.future is not None:
+            # Nobody reads the stream anymore: free the provider slot
+            self.future.cancel()
+
+
+class SingleFlight:
+    """
+    Shares in-flight calls between callers that use the same key.
+    """
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="single-flight", daemon=True)
+                thread.start()
+                self._loop = loop
+            return self._loop
+
+    def in_flight(self) -> int:
+        """Number of upstream calls currently running."""
+        return len(self._flights)
+
+    def subscribe(self, key: Hashable, start: Callable[[], AsyncIterator[Any]]) -> Subscription:
+        """
+        Joins the call running for `key`, or starts it with `start()` if there is none.
+        Must be called from a running event loop.
+
+        Args:
+            key: Identifies equivalent calls (e.g. model and normalized input).
+            start: Creates the upstream event iterator; only called by the first subscriber.
+
+        Returns:
+            The caller's subscription; `subscription.leader` tells whether it started the call.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight(key)
+                self._flights[key] = flight
+        subscription = Subscription(flight, loop, leader)
+        flight.add(subscription)
+        if leader:
+            flight.future = asyncio.run_coroutine_threadsafe(self._produce(flight, start), self._background_loop())
+        return subscription
+
+    async def _produce(self, flight: _Flight, start: Callable[[], AsyncIterator[Any]]) -> None:
+        try:
+            async for item in start():
+                flight.publish(item)
+        except asyncio.CancelledError:
+            flight.finish()
+            raise
+        except Exception as e:
+            logger.warning("Shared upstream call failed: %s", e)
+            flight.finish(e)
+        else:
+            flight.finish()
+        finally:
+            with self._lock:
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
@@ -0,0 +1,329 @@
+"""
+Tables of the PDTA, parsed into typed rows.
+
+The PDF transcription flattens tables into text: cells glued together, rows split across lines,
+headers separated from their values. That text costs tokens and matches poorly in retrieval.
+extract_tables() parses the known tables into Table records once per corpus version:
+
+- the RACI matrix of IOV section 7 (one row per phase, actors by role);
+- the IHC marker algorithm for NSCLC (ROV 2017 p. 55);
+- the anti-ALK (p. 56) and anti-PD-L1 (p. 57) antibody clones with their vendors;
+- the PD-L1 TPS expression classes and their prevalence (p. 58);
+- the sensitivity of the molecular methods (p. 64);
+- tables whose data the transcription does not contain ("Tabella 1" of new cases by
+  province, p. 13; the phenotypic tables of pp. 74-75), kept with their caption only so the
+  model can say the data is missing instead of guessing.
+
+Tables parsed from flattened text replace it, rendered densely, in the full-context
+instructions and in the passages returned by the PDTA tools. The RACI matrix also answers
+"who is Responsabile for X" questions locally, without calling the model.
+
+- PDTA_TABLE_ANSWERS: "off" disables the local RACI answers ("on" by default).
+
+A layout that no longer matches (e.g. after a corpus update) only drops that table, with a
+warning; the original text is then left untouched.
+"""
+import logging
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .citations import chunk_label
+from .config import get_bool_setting
+from .corpus import DOC_IOV, Chunk, Corpus
+from .text import fold, terms, tokenize
+
+logger = logging.getLogger(__name__)
+
+RACI_ROLES = {"R": "Responsabile", "A": "Supervisore", "C": "Consultato", "I": "Informato"}
+# Words of a question asking for a RACI role, by role letter
+_ROLE_WORDS = {"R": ("responsabil",), "A": ("supervis",), "C": ("consultat",), "I": ("informat",)}
+
+# Longer messages are case descriptions, not lookups
+MAX_LOOKUP_TERMS = 20
+
+MISSING_DATA_NOTE = "dati non trascritti nel PDTA"
+
+_RACI_ITEM_RE = re.compile(r"([^()]+?)\s*\(([RACI](?:/[RACI])*)\)")
+_ACTOR_SPLIT_RE = re.compile(r",\s*|\s+e\s+")
+_MARKER_RE = re.compile(r"[+-]\s*(?:\([^)]*\))?")
+_CAPTION_RE = re.compile(r"^TABELLA\s+(\d+)\s*[.:]\s*(.+)$", re.IGNORECASE | re.MULTILINE)
+
+
+@dataclass(frozen=True)
+class Table:
+    """A parsed table: typed rows under named columns, and the text it was parsed from."""
+    table_id: str
+    title: str
+    chunk_id: str
+    columns: Tuple[str, ...]
+    rows: Tuple[Tuple[str, ...], ...]
+    # The flattened text (or the caption) replaced by the dense rendering; empty for tables read from prose
+    source: str = ""
+    note: str = ""
+
+    @property
+    def records(self) -> List[Dict[str, str]]:
+        """The rows as column -> value dictionaries."""
+        return [dict(zip(self.columns, row)) for row in self.rows]
+
+    def render(self, title: bool = True) -> str:
+        """
+        Renders the table densely: title, header and one pipe-separated line per row.
+
+        Args:
+            title: Whether to start with the title (left out where the text keeps the caption).
+        """
+        lines = [self.title] if title or not self.rows else []
+        if self.rows:
+            lines.append("|".join(self.columns))
+            lines.extend("|".join(row) for row in self.rows)
+        if self.note:
+            lines.append(f"({self.note})")
+        return "\n".join(lines)
+
+
+def _between(text: str, start: str, end: Optional[str] = None) -> Optional[str]:
+    """The text from `start` up to (excluding) `end` or to the end, or None if a marker is missing."""
+    begin = text.find(start)
+    if begin < 0:
+        return None
+    if end is None:
+        return text[begin:]
+    finish = text.find(end, begin)
+    return text[begin:finish].rstrip() if finish >= 0 else None
+
+
+def _raci(chunk: Chunk) -> Optional[Table]:
+    source = _between(chunk.text, "Fasi principali:")
+    if source is None:
+        return None
+    rows = []
+    for line in source.splitlines()[1:]:
+        phase, _, assignments = line.lstrip("- ").partition(":")
+        actors: Dict[str, List[str]] = {role: [] for role in RACI_ROLES}
+        for names, roles in _RACI_ITEM_RE.findall(assignments.rstrip(".")):
+            for name in _ACTOR_SPLIT_RE.split(names.strip(" ,;")):
+                for role in roles.split("/"):
+                    actors[role].append(name.strip())
+        if phase and any(actors.values()):
+            rows.append((phase.strip(),) + tuple(", ".join(actors[role]) for role in RACI_ROLES))
+    return Table("raci", "Matrice RACI delle fasi del percorso (R = Responsabile, A = Supervisore, "
+                 "C = Consultato, I = Informato)", chunk.chunk_id, ("fase",) + tuple(RACI_ROLES),
+                 tuple(rows), source)
+
+
+def _ihc_algorithm(chunk: Chunk) -> Optional[Table]:
+    source = _between(chunk.text, "Markers Interpretazione", "*Quando")
+    if source is None:
+        return None
+    # Cells wrap inside their parentheses: join the lines back before splitting the rows
+    body = re.sub(r"\s*\n\s*", " ", source.split("\n", 2)[2])
+    rows = []
+    for markers, interpretation in re.findall(r"(.*?)(NSCLC (?:in favore di \w+|possibile \w+ \*|NOS\*\*))", body):
+        cells = [cell.replace(" ", "") for cell in _MARKER_RE.findall(markers)]
+        free_text = _MARKER_RE.sub("", markers).strip()
+        if free_text:
+            # "- Uno dei markers diffusamente positivi": negative TTF1, any of the others diffuse
+            cells = cells[:1] + [f"{free_text} (P63, P40 o CK5-6)", "", ""]
+        if len(cells) != 4:
+            return None
+        rows.append(tuple(cells) + (interpretation.strip(),))
+    if not rows:
+        return None
+    return Table("ihc_nsclc", "Algoritmo immunoistochimico nelle neoplasie NSCLC (* controlli interni appropriati e "
+                 "clinica non suggestiva di metastasi; ** in assenza di controlli)", chunk.chunk_id,
+                 ("TTF1/Napsina", "P63", "P40", "CK5-6", "interpretazione"), tuple(rows), source)
+
+
+def _alk_clones(chunk: Chunk) -> Optional[Table]:
+    rows = []
+    for clone, vendors in re.findall(r"clone\s+(\w+)\s*\(([^)]+)\)", chunk.text):
+        rows.append(("ALK", clone, vendors.replace(", e ", ", ").strip()))
+    if not rows:
+        return None
+    return Table("cloni_alk", "Anticorpi monoclonali anti-ALK in commercio", chunk.chunk_id,
+                 ("bersaglio", "clone", "ditta"), tuple(rows))
+
+
+_VENDORS = ("DAKO", "ROCHE", "CELL SIGNALING TECHNOLOGY")
+
+
+def _pdl1_clones(chunk: Chunk) -> Optional[Table]:
+    source = _between(chunk.text, "NOME PRODOTTO CLONE DITTA")
+    if source is None:
+        return None
+    body = re.sub(r"\s+", " ", source.split("\n", 1)[1])
+    rows = []
+    for segment, vendor in re.findall(r"(.+?)(" + "|".join(_VENDORS) + r")\s*", body):
+        # The clone is the last code of the row, glued to the product when it closes a parenthesis
+        segment = segment.strip()
+        if ")" in segment:
+            cut = segment.rindex(")") + 1
+            product, clone = segment[:cut], segment[cut:].strip()
+        else:
+            product, _, clone = segment.rpartition(" ")
+        if not re.fullmatch(r"[A-Z0-9]*\d[A-Z0-9]*", clone):
+            return None
+        rows.append(("PD-L1", product.strip(), clone, vendor.title()))
+    if len(rows) != len(_VENDORS):
+        return None
+    return Table("cloni_pdl1", "Cloni anti PD-L1 con maggiore sensibilità per gli attuali bersagli terapeutici",
+                 chunk.chunk_id, ("bersaglio", "prodotto", "clone", "ditta"), tuple(rows), source)
+
+
+def _pdl1_tps(chunk: Chunk) -> Optional[Table]:
+    source = _between(chunk.text, "NESSUNA")
+    if source is None:
+        return None
+    header = re.sub(r"ESPRESSIONE(?=[A-Z])", "ESPRESSIONE ", re.sub(r"\s+", " ", source))
+    levels = re.findall(r"NESSUNA ESPRESSIONE|BASSA ESPRESSIONE|ESPRESSIONE ALTA", header)
+    thresholds = re.findall(r"TPS\s*([<≥]\s*\d+%|\d+%-\d+%)", source)
+    prevalences = re.findall(r"(\d+(?:\.\d+)?%)\s*\((\d+)\)", source)
+    if not (len(levels) == len(thresholds) == len(prevalences) == 3):
+        return None
+    rows = tuple((fold(level).capitalize(), f"TPS {threshold}", share, cases)
+                 for level, threshold, (share, cases) in zip(levels, thresholds, prevalences))
+    return Table("pdl1_tps", "Espressione di PD-L1 da riportare nel referto come Tumor Proportion Score (TPS)",
+                 chunk.chunk_id, ("espressione", "TPS", "prevalenza", "casi"), rows, source)
+
+
+def _molecular_sensitivity(chunk: Chunk) -> Optional[Table]:
+    match = re.search(r"crescente a partire dal\s+(.+?)\s+fino all\W?(\d+%)\s+della\s+([^.]+?)\.", chunk.text, re.DOTALL)
+    if match is None:
+        return None
+    rows = []
+    pending: List[str] = []
+    for item in re.split(r",\s*(?:e\s+)?", re.sub(r"\s+", " ", match.group(1))):
+        value = re.search(r"\((?:tutti\s+)?(?:circa\s+)?([^)]+)\)", item)
+        pending.append(re.sub(r"\s*\([^)]*\)", "", item).strip())
+        if value:
+            rows.extend((method, value.group(1)) for method in pending)
+            pending = []
+    rows.append((match.group(3).strip(), match.group(2)))
+    if pending:
+        return None
+    return Table("sensibilita_metodi", "Sensibilità dei metodi di analisi molecolare (percentuale di allele mutato "
+                 "rilevabile nel campione)", chunk.chunk_id, ("metodo", "sensibilità"), tuple(rows))
+
+
+# Table parsers by the chunk holding the table
+_EXTRACTORS: Dict[str, Callable[[Chunk], Optional[Table]]] = {
+    f"{DOC_IOV}:7": _raci,
+    "rov2017:p55": _ihc_algorithm,
+    "rov2017:p56": _alk_clones,
+    "rov2017:p57": _pdl1_clones,
+    "rov2017:p58": _pdl1_tps,
+    "rov2017:p64": _molecular_sensitivity,
+}
+
+
+def _captions(corpus: Corpus) -> List[Table]:
+    """Tables announced by a caption ("Tabella 1. ...") whose data was not transcribed."""
+    tables = []
+    for chunk in corpus.chunks:
+        if chunk.chunk_id in _EXTRACTORS or not chunk.has_text:
+            continue
+        for match in _CAPTION_RE.finditer(chunk.text):
+            number, caption = match.group(1), match.group(2).strip()
+            tables.append(Table(f"tabella{number}_p{chunk.page}", f"Tabella {number}. {caption}", chunk.chunk_id,
+                                (), (), match.group(0), MISSING_DATA_NOTE))
+    return tables
+
+
+def extract_tables(corpus: Corpus) -> List[Table]:
+    """
+    Parses the known tables of the corpus.
+
+    Args:
+        corpus: The parsed PDTA corpus.
+
+    Returns:
+        The parsed tables, in corpus order, then the caption-only ones.
+    """
+    tables = []
+    for chunk_id, extract in _EXTRACTORS.items():
+        chunk = corpus.by_id.get(chunk_id)
+        table = extract(chunk) if chunk is not None else None
+        if table is None:
+            logger.warning("Table layout of %s not recognized, its text is left as is.", chunk_id)
+            continue
+        tables.append(table)
+    return tables + _captions(corpus)
+
+
+class TableSet:
+    """
+    The tables of a corpus version, with the dense rendering of their passages and the local
+    RACI lookups.
+    """
+    def __init__(self, corpus: Corpus):
+        """
+        Args:
+            corpus: The parsed PDTA corpus.
+        """
+        self.corpus = corpus
+        self.tables = extract_tables(corpus)
+        self.by_id = {table.table_id: table for table in self.tables}
+        self._dense: Dict[str, str] = {}
+        for table in self.tables:
+            chunk = corpus.by_id[table.chunk_id]
+            if table.source:
+                text = self._dense.get(chunk.chunk_id, chunk.text)
+                self._dense[chunk.chunk_id] = text.replace(table.source, table.render(title=not table.rows), 1)
+
+    def dense_text(self, chunk: Chunk) -> str:
+        """
+        Returns the text of a chunk with its flattened tables replaced by their dense rendering.
+        """
+        return self._dense.get(chunk.chunk_id, chunk.text)
+
+    def densify(self, text: str) -> str:
+        """
+        Replaces the flattened tables in a text containing the chunks (e.g. `pdta_text`).
+        """
+        for chunk_id, dense in self._dense.items():
+            text = text.replace(self.corpus.by_id[chunk_id].text, dense, 1)
+        return text
+
+    def answer(self, question: str) -> Optional[str]:
+        """
+        Answers a question about the roles of the RACI matrix in one phase of the percorso,
+        e.g. "Chi è responsabile della presa in carico radioterapica?".
+
+        The question must be short, ask "who" (or name the matrix), name a RACI role or the
+        matrix and match a single phase better than the others; anything else returns None and
+        goes to the model.
+        """
+        table = self.by_id.get("raci")
+        if table is None:
+            return None
+        question_terms = set(terms(question))
+        matrix = bool({"raci", "matric"} & question_terms)
+        if len(question_terms) > MAX_LOOKUP_TERMS or not (matrix or "chi" in tokenize(question)):
+            return None
+        asked = [role for role, words in _ROLE_WORDS.items() if any(t.startswith(words) for t in question_terms)]
+        if not asked and not matrix:
+            return None
+        scores = [(len(question_terms & set(terms(row[0]))), row) for row in table.rows]
+        scores.sort(key=lambda item: -item[0])
+        best, row = scores[0]
+        if best == 0 or (len(scores) > 1 and scores[1][0] == best):
+            return None
+        record = dict(zip(table.columns, row))
+        roles = [role for role in asked or RACI_ROLES if record[role]]
+        if not roles:
+            lines = [f"Nella matrice RACI la fase «{record['fase']}» non indica un "
+                     f"{' / '.join(RACI_ROLES[role] for role in asked)}."]
+        else:
+            lines = [f"Secondo la matrice RACI, nella fase «{record['fase']}»:"]
+            lines.extend(f"- {RACI_ROLES[role]} ({role}): {record[role]}" for role in roles)
+        lines.append(f"\n_Fonte: {chunk_label(self.corpus.by_id[table.chunk_id])}._")
+        return "\n".join(lines)
+
+
+def table_answers_enabled() -> bool:
+    """
+    Whether RACI questions are answered locally from the parsed matrix (PDTA_TABLE_ANSWERS, "on" by default).
+    """
+    return get_bool_setting("PDTA_TABLE_ANSWERS", True)
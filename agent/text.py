@@ -0,0 +1,62 @@
+"""
+Text normalization helpers shared by the local (model-free) components.
+
+Matching is done on lowercase, accent-free tokens with a light Italian suffix stripping,
+so that "polmone"/"polmoni" or "diagnosi"/"diagnostico" compare the way a reader would
+expect without depending on an NLP library.
+"""
+import re
+import unicodedata
+from typing import List
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+ITALIAN_STOPWORDS = frozenset("""
+a ad al alla alle allo agli ai anche avere che chi ci con come cosa cui da dal dalla dalle dagli dai
+degli dei del della delle dello di dove e ed essere fa gli ha hanno ho i il in io la le lei li lo loro
+lui ma me mi mia mio ne nei nel nella nelle nello no noi non o per perche piu po puo qual quale quali
+quando quanto quella quelle quello questa queste questo se sei si sia sono su sua sue sui sul sulla
+suo tra tu tua tuo un una uno va vi voi stato stata sta devo deve devono posso puoi sai sapere
+dimmi vorrei grazie ciao buongiorno salve miei
+""".split())
+
+_VOWELS = "aeiou"
+
+
+def fold(text: str) -> str:
+    """
+    Lowercases the text and strips accents ("Modalità" -> "modalita").
+    """
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits the text into lowercase, accent-free alphanumeric tokens.
+    """
+    return _TOKEN_RE.findall(fold(text))
+
+
+def stem(token: str) -> str:
+    """
+    Light Italian stemming: drops the final vowel of longer words, so that singular and
+    plural forms ("tumore"/"tumori", "esame"/"esami") share a stem.
+    """
+    if len(token) > 4 and token[-1] in _VOWELS:
+        return token[:-1]
+    return token
+
+
+def terms(text: str) -> List[str]:
+    """
+    Returns the stemmed content terms of the text, without stopwords and single characters.
+    Numbers are kept, since doses, stages and section numbers are meaningful here.
+
+    Args:
+        text: The text to analyze.
+
+    Returns:
+        The list of terms, in order of appearance.
+    """
+    return [stem(token) for token in tokenize(text) if token not in ITALIAN_STOPWORDS and len(token) > 1]
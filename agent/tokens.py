@@ -0,0 +1,56 @@
+"""
+Lightweight token estimation helpers.
+
+The project does not depend on a tokenizer library, so token counts are estimated
+with the usual ~4 characters per token heuristic. The estimate is only used for
+reporting (benchmarks, corpus statistics) when the provider does not return usage.
+"""
+from typing import Any, Iterable
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens in a piece of text.
+
+    Args:
+        text: The text to measure.
+
+    Returns:
+        The estimated token count (at least 1 for non-empty text).
+    """
+    if not text:
+        return 0
+    return max(1, round(len(text) / CHARS_PER_TOKEN))
+
+
+def estimate_messages_tokens(messages: Iterable[Any]) -> int:
+    """
+    Estimates the number of tokens in a list of input items (role/content dicts, tool calls and
+    their outputs, or plain strings).
+
+    Args:
+        messages: The conversation items sent to the model.
+
+    Returns:
+        The estimated token count of all textual content.
+    """
+    total = 0
+    for message in messages:
+        if isinstance(message, str):
+            total += estimate_tokens(message)
+            continue
+        content = message.get("content") if isinstance(message, dict) else None
+        if isinstance(content, str):
+            total += estimate_tokens(content)
+        elif isinstance(content, list):
+            for part in content:
+                if isinstance(part, dict) and isinstance(part.get("text"), str):
+                    total += estimate_tokens(part["text"])
+        elif isinstance(message, dict):
+            # Function calls and their outputs (tools context mode)
+            for key in ("arguments", "output"):
+                if isinstance(message.get(key), str):
+                    total += estimate_tokens(message[key])
+    return total
@@ -0,0 +1,164 @@
+"""
+PDTA lookup tools for the model.
+
+In the "tools" context mode (PDTA_CONTEXT_MODE) the PDTA text is not put in the instructions:
+the model calls these function tools to fetch the passages it needs, a few hundred tokens per
+turn instead of the whole document. They are served in-process from the per-document indexes
+of a CorpusVersion, cached per version, and are safe to call in parallel.
+
+- search_pdta(query, k): the best passages for free text, across the routed documents.
+- get_section(code): an IOV section ("5.3", "Sezione 7", "blocco 1").
+- get_page(n): a page of the ROV 2017 transcription.
+- get_table(table_id): a table parsed from the PDTA (RACI matrix, IHC, PD-L1, ...), densely.
+
+Every passage starts with its reference, so the model can quote it and the local citations
+match it; the tables it contains are rendered densely.
+"""
+import functools
+import re
+import time
+from typing import TYPE_CHECKING, Callable, List, Optional
+
+from .citations import chunk_label
+from .config import get_setting
+from .corpus import DOC_IOV, DOC_ROV_2017, Chunk
+
+if TYPE_CHECKING:
+    from .corpus_store import CorpusVersion
+
+CONTEXT_FULL = "full"
+CONTEXT_TOOLS = "tools"
+
+DEFAULT_K = 4
+MAX_K = 8
+NOT_FOUND = "Nessun passaggio del PDTA trovato."
+
+_SECTION_CODE_RE = re.compile(r"(\d+(?:\.\d+)?)")
+
+
+def format_passage(chunk: Chunk, text: Optional[str] = None) -> str:
+    """
+    Renders a chunk for a tool result: its reference in brackets, then its text (or `text`).
+    """
+    return f"[{chunk_label(chunk)}]\n{chunk.text if text is None else text}"
+
+
+class PdtaTools:
+    """
+    The lookups of one corpus version, with their results cached.
+    """
+    def __init__(self, version: "CorpusVersion", cache_size: int = 256,
+                 on_search: Optional[Callable[[float], None]] = None):
+        """
+        Args:
+            version: The corpus version the tools read.
+            cache_size: Results kept per lookup.
+            on_search: Called with the duration in seconds of each search not served from the cache.
+        """
+        self.version = version
+        self.on_search = on_search
+        self.search = functools.lru_cache(maxsize=cache_size)(self._search)
+        self.get_section = functools.lru_cache(maxsize=cache_size)(self._get_section)
+        self.get_page = functools.lru_cache(maxsize=cache_size)(self._get_page)
+        self.get_table = functools.lru_cache(maxsize=cache_size)(self._get_table)
+
+    def _passage(self, chunk: Chunk) -> str:
+        return format_passage(chunk, self.version.passage_text(chunk))
+
+    def _search(self, query: str, k: int = DEFAULT_K) -> str:
+        started = time.perf_counter()
+        results = self.version.registry.search(query, max(1, min(k, MAX_K)))
+        if self.on_search is not None:
+            self.on_search(time.perf_counter() - started)
+        if not results:
+            return NOT_FOUND
+        return "\n\n".join(self._passage(scored.chunk) for scored in results)
+
+    def _get_section(self, code: str) -> str:
+        match = _SECTION_CODE_RE.search(code or "")
+        if match is None:
+            return f"Codice di sezione non valido: {code!r}. Usa ad esempio \"5.3\" o \"7\"."
+        number = match.group(1)
+        chunk_id = f"{DOC_IOV}:blocco{number}" if "blocco" in code.lower() else f"{DOC_IOV}:{number}"
+        chunk = self.version.corpus.by_id.get(chunk_id)
+        if chunk is None:
+            sections = ", ".join(c.section for c in self.version.corpus.chunks if c.document == DOC_IOV and c.section)
+            return f"Sezione {number} non presente nel PDTA IOV. Sezioni disponibili: {sections}."
+        return self._passage(chunk)
+
+    def _get_page(self, number: int) -> str:
+        chunk = self.version.corpus.by_id.get(f"{DOC_ROV_2017}:p{number}")
+        if chunk is None:
+            return f"Pagina {number} non presente nel PDTA ROV 2017."
+        if not chunk.has_text:
+            return f"[{chunk_label(chunk)}]\nPagina senza testo estraibile."
+        return self._passage(chunk)
+
+    def _get_table(self, table_id: str) -> str:
+        table = self.version.tables.by_id.get((table_id or "").strip().lower())
+        if table is None:
+            return f"Tabella {table_id!r} non trovata. Tabelle disponibili: {', '.join(self.version.tables.by_id)}."
+        return f"[{chunk_label(self.version.corpus.by_id[table.chunk_id])}]\n{table.render()}"
+
+    def function_tools(self) -> List:
+        """
+        Returns the SDK function tools backed by this version.
+        """
+        from agents import function_tool
+
+        def search_pdta(query: str, k: int = DEFAULT_K) -> str:
+            """
+            Cerca nel PDTA i passaggi più pertinenti a una domanda o a parole chiave.
+
+            Args:
+                query: La domanda o le parole chiave da cercare.
+                k: Numero massimo di passaggi (da 1 a 8).
+            """
+            return self.search(query, k)
+
+        def get_section(code: str) -> str:
+            """
+            Restituisce una sezione del PDTA IOV.
+
+            Args:
+                code: Il numero della sezione, ad esempio "5.3", "7" o "8".
+            """
+            return self.get_section(code)
+
+        def get_page(n: int) -> str:
+            """
+            Restituisce una pagina del PDTA ROV 2017.
+
+            Args:
+                n: Il numero della pagina.
+            """
+            return self.get_page(n)
+
+        def get_table(table_id: str) -> str:
+            """
+            Restituisce una tabella del PDTA in formato compatto.
+
+            Args:
+                table_id: L'identificativo della tabella.
+            """
+            return self.get_table(table_id)
+
+        tables = "; ".join(f"{table.table_id}: {table.title}" for table in self.version.tables.tables)
+        return [
+            function_tool(search_pdta),
+            function_tool(get_section),
+            function_tool(get_page),
+            function_tool(get_table, description_override=f"Restituisce una tabella del PDTA in formato compatto. "
+                                                          f"Tabelle disponibili: {tables}"),
+        ]
+
+
+def context_mode(value: Optional[str] = None) -> str:
+    """
+    Returns how the PDTA reaches the model: CONTEXT_FULL (the whole text in the instructions,
+    the default) or CONTEXT_TOOLS. Reads PDTA_CONTEXT_MODE when no value is given.
+    """
+    mode = (value or get_setting("PDTA_CONTEXT_MODE", CONTEXT_FULL) or CONTEXT_FULL).lower()
+    if mode not in (CONTEXT_FULL, CONTEXT_TOOLS):
+        raise ValueError(f"Unknown context mode '{mode}'. Use {CONTEXT_FULL} or {CONTEXT_TOOLS}.")
+    return mode
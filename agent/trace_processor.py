@@ -0,0 +1,269 @@
+"""
+Local tracing for the openai-agents SDK.
+
+LocalBatchTraceProcessor receives traces and spans from the SDK, buffers them in a bounded
+in-memory queue and writes them in batches to a rotating local file (JSONL or SQLite) from a
+background thread. When the queue is full new items are dropped instead of blocking, so
+tracing never adds latency to the response path and works without network access.
+
+The destination is configured with the PDTA_TRACE_EXPORT environment variable:
+
+- "remote" (default): keep the SDK's default exporter to the OpenAI tracing backend;
+- "jsonl:<path>" or "sqlite:<path>": replace it with the local batch processor;
+- "both:<jsonl|sqlite>:<path>": export locally and remotely;
+- "off": disable tracing.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from agents import TracingProcessor, add_trace_processor, set_trace_processors, set_tracing_disabled
+
+from .config import get_setting
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+
+
+class _RotatingFile:
+    """
+    Size-based rotation shared by the exporters: `path` is renamed to `path.1`, `path.1`
+    to `path.2` and so on, keeping at most `backup_count` old files.
+    """
+    def __init__(self, path: str, max_bytes: int, backup_count: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def should_rotate(self) -> bool:
+        return self.max_bytes > 0 and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes
+
+    def rotate(self) -> None:
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+class JsonlTraceExporter:
+    """Writes trace and span records as JSON lines to a rotating file."""
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES, backup_count: int = DEFAULT_BACKUP_COUNT):
+        self.file = _RotatingFile(path, max_bytes, backup_count)
+
+    def export(self, records: List[Dict[str, Any]]) -> None:
+        with open(self.file.path, "a", encoding="utf-8") as output:
+            for record in records:
+                output.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        if self.file.should_rotate():
+            self.file.rotate()
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteTraceExporter:
+    """Writes trace and span records to a rotating SQLite database."""
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS trace_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            object TEXT,
+            trace_id TEXT,
+            span_id TEXT,
+            parent_id TEXT,
+            span_type TEXT,
+            started_at TEXT,
+            ended_at TEXT,
+            data TEXT
+        )
+    """
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES, backup_count: int = DEFAULT_BACKUP_COUNT):
+        self.file = _RotatingFile(path, max_bytes, backup_count)
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            # Only the exporter thread uses the connection
+            self._connection = sqlite3.connect(self.file.path, check_same_thread=False)
+            self._connection.execute(self.SCHEMA)
+        return self._connection
+
+    def export(self, records: List[Dict[str, Any]]) -> None:
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                "INSERT INTO trace_items (object, trace_id, span_id, parent_id, span_type, started_at, ended_at, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        record.get("object"),
+                        record.get("trace_id"),
+                        record.get("id") if record.get("object") == "trace.span" else None,
+                        record.get("parent_id"),
+                        (record.get("span_data") or {}).get("type"),
+                        record.get("started_at"),
+                        record.get("ended_at"),
+                        json.dumps(record, ensure_ascii=False, default=str),
+                    )
+                    for record in records
+                ],
+            )
+        if self.file.should_rotate():
+            self.close()
+            self.file.rotate()
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class LocalBatchTraceProcessor(TracingProcessor):
+    """
+    A tracing processor that batches traces and spans to a local exporter on a background thread.
+    """
+    def __init__(self, exporter, max_queue_size: int = 8192, max_batch_size: int = 256,
+                 flush_interval: float = 5.0):
+        """
+        Args:
+            exporter: A JsonlTraceExporter or SQLiteTraceExporter.
+            max_queue_size: Items buffered in memory before new ones are dropped.
+            max_batch_size: Items written per batch.
+            flush_interval: Maximum seconds an item waits in memory before being written.
+        """
+        self.exporter = exporter
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue_size)
+        self._shutdown = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="local-trace-exporter", daemon=True)
+        self._thread.start()
+
+    def _enqueue(self, item: Any) -> None:
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            # Log the first drop and then every thousandth to keep the hot path cheap
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning("Trace queue full, %d items dropped so far.", self.dropped)
+
+    def on_trace_start(self, trace) -> None:
+        self._enqueue(trace)
+
+    def on_trace_end(self, trace) -> None:
+        pass
+
+    def on_span_start(self, span) -> None:
+        pass
+
+    def on_span_end(self, span) -> None:
+        # Spans are serialized on the exporter thread, not on the response path
+        self._enqueue(span)
+
+    def _drain(self, limit: int) -> List[Dict[str, Any]]:
+        records = []
+        while len(records) < limit:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                record = item.export()
+            except Exception as e:
+                logger.debug("Could not serialize trace item: %s", e)
+                continue
+            if record:
+                records.append(record)
+        return records
+
+    def _flush(self) -> None:
+        with self._flush_lock:
+            while True:
+                records = self._drain(self.max_batch_size)
+                if not records:
+                    return
+                try:
+                    self.exporter.export(records)
+                except Exception as e:
+                    logger.warning("Failed to write %d trace items: %s", len(records), e)
+
+    def _run(self) -> None:
+        last_flush = time.monotonic()
+        while not self._shutdown.is_set():
+            # Wake up early when a full batch is waiting
+            self._shutdown.wait(min(0.2, self.flush_interval))
+            if self._queue.qsize() >= self.max_batch_size or time.monotonic() - last_flush >= self.flush_interval:
+                self._flush()
+                last_flush = time.monotonic()
+        self._flush()
+
+    def force_flush(self) -> None:
+        self._flush()
+
+    def shutdown(self) -> None:
+        self._shutdown.set()
+        self._thread.join(timeout=5)
+        self.exporter.close()
+
+
+_configured = False
+
+
+def configure_tracing(spec: Optional[str] = None) -> Optional[LocalBatchTraceProcessor]:
+    """
+    Configures the SDK trace processors once per process.
+
+    Args:
+        spec: The export specification; defaults to the PDTA_TRACE_EXPORT environment variable.
+
+    Returns:
+        The local processor, if one was installed.
+    """
+    global _configured
+    if _configured:
+        return None
+    _configured = True
+
+    spec = (spec if spec is not None else get_setting("PDTA_TRACE_EXPORT", "remote")).strip()
+    if spec in ("", "remote"):
+        return None
+    if spec == "off":
+        set_tracing_disabled(True)
+        logger.info("Tracing disabled.")
+        return None
+
+    keep_remote = spec.startswith("both:")
+    if keep_remote:
+        spec = spec[len("both:"):]
+    kind, _, path = spec.partition(":")
+    if kind == "jsonl":
+        exporter = JsonlTraceExporter(path or os.path.join("traces", "traces.jsonl"))
+    elif kind == "sqlite":
+        exporter = SQLiteTraceExporter(path or os.path.join("traces", "traces.db"))
+    else:
+        raise ValueError(f"Unknown trace export '{spec}'. Use remote, off, jsonl:<path>, sqlite:<path> or both:<...>.")
+
+    processor = LocalBatchTraceProcessor(exporter)
+    atexit.register(processor.shutdown)
+    if keep_remote:
+        add_trace_processor(processor)
+    else:
+        set_trace_processors([processor])
+    logger.info("Traces exported locally to %s%s", exporter.file.path, " and remotely" if keep_remote else "")
+    return processor
@@ -0,0 +1,127 @@
+"""
+Shared helpers for the benchmark tools: percentiles, process memory and run metadata.
+"""
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """
+    Computes a percentile with linear interpolation between closest ranks.
+
+    Args:
+        values: The samples.
+        pct: The percentile, between 0 and 100.
+
+    Returns:
+        The percentile value, or None if there are no samples.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    if low == high:
+        return ordered[low]
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: Iterable[Optional[float]]) -> Dict[str, Any]:
+    """
+    Summarizes samples as count, mean, min, max and p50/p95/p99.
+
+    Args:
+        values: The samples; None entries are ignored.
+
+    Returns:
+        A JSON-serializable summary dictionary.
+    """
+    samples = [v for v in values if v is not None]
+    summary: Dict[str, Any] = {"count": len(samples)}
+    if not samples:
+        return summary
+    summary["mean"] = sum(samples) / len(samples)
+    summary["min"] = min(samples)
+    summary["max"] = max(samples)
+    for pct in PERCENTILES:
+        summary[f"p{pct}"] = percentile(samples, pct)
+    return summary
+
+
+def rss_bytes() -> int:
+    """
+    Returns the current resident set size of the process in bytes.
+    Falls back to the peak RSS where /proc is not available.
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def peak_rss_bytes() -> int:
+    """
+    Returns the peak resident set size of the process in bytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def git_revision() -> Optional[str]:
+    """
+    Returns the current git commit hash, if the code runs from a git checkout.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_metadata(**extra: Any) -> Dict[str, Any]:
+    """
+    Builds the metadata block stored with every benchmark report.
+
+    Args:
+        **extra: Benchmark-specific settings to record.
+
+    Returns:
+        A JSON-serializable metadata dictionary.
+    """
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        **extra,
+    }
+
+
+def write_report(report: Dict[str, Any], path: Optional[str]) -> None:
+    """
+    Writes a report as JSON to a file, or to stdout when no path is given.
+    """
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if path:
+        with open(path, "w", encoding="utf-8") as output:
+            output.write(payload + "\n")
+    else:
+        print(payload)
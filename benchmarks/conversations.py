@@ -0,0 +1,48 @@
+"""
+Scripted multi-turn clinical conversations used by the latency benchmark.
+Each conversation mimics a typical MMG consultation: an opening case description,
+answers to the clarifying questions and a request for the referral path.
+"""
+
+CONVERSATIONS = [
+    {
+        "name": "tosse_persistente_fumatore",
+        "turns": [
+            "Paziente di 64 anni con tosse persistente da circa un mese.",
+            "È fumatore da 40 anni, circa 20 sigarette al giorno. Non ha ancora fatto esami strumentali.",
+            "Ha riferito anche un episodio di emoftoe la settimana scorsa e un calo ponderale di 4 kg.",
+            "Quali esami devo prescrivere prima di inviarlo allo IOV e a chi mi rivolgo?",
+        ],
+    },
+    {
+        "name": "nodulo_rx_incidentale",
+        "turns": [
+            "Donna di 58 anni, ex fumatrice, RX torace eseguito per altro motivo mostra un nodulo di 2 cm al lobo superiore destro.",
+            "Nessun sintomo respiratorio. Non ha ancora eseguito la TC torace.",
+            "Dopo la TC con mezzo di contrasto come si accede alla valutazione multidisciplinare?",
+        ],
+    },
+    {
+        "name": "stadio_iv_accesso_oncologico",
+        "turns": [
+            "Ho un paziente con diagnosi istologica di adenocarcinoma polmonare stadio IV fatta in ULSS.",
+            "Quale impegnativa serve per la prima visita oncologica allo IOV e come si prenota?",
+            "Serve anche la biopsia liquida per EGFR? Come si richiede?",
+        ],
+    },
+    {
+        "name": "stadio_i_non_operabile",
+        "turns": [
+            "Paziente di 81 anni con carcinoma polmonare stadio I non operabile per comorbidità cardiache.",
+            "Quale percorso prevede il PDTA e quale impegnativa devo fare?",
+        ],
+    },
+    {
+        "name": "supporto_e_cure_simultanee",
+        "turns": [
+            "Un mio paziente in trattamento oncologico allo IOV chiede supporto psicologico e nutrizionale.",
+            "Quali codici NTR o CVP servono e come si prenota?",
+            "E per le cure simultanee chi pianifica la visita?",
+        ],
+    },
+]
@@ -0,0 +1,213 @@
+"""
+End-to-end latency benchmark for ConversationalAgent.
+
+Drives the agent through the scripted conversations in `benchmarks/conversations.py`
+and reports p50/p95/p99 time-to-first-token, inter-token latency, total latency,
+output tokens/s, prompt tokens per turn and process RSS as JSON.
+
+Usage:
+    python -m benchmarks.latency --provider mock --repeat 3 --output bench.json
+    python -m benchmarks.latency --provider openai --model gpt-4o-mini --output bench.json
+    python -m benchmarks.latency --provider mock --baseline old.json
+    python -m benchmarks.latency --provider mock --context tools --baseline full.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from agent.instrumentation import STAGE_GUARDRAILS
+from agent.logging_setup import configure_logging
+from agent.tokens import estimate_tokens
+
+from .common import peak_rss_bytes, rss_bytes, run_metadata, summarize, write_report
+from .conversations import CONVERSATIONS
+
+logger = logging.getLogger(__name__)
+
+
+def build_agent(args: argparse.Namespace):
+    """
+    Creates the ConversationalAgent under test for the selected provider.
+    """
+    from agent.agent import ConversationalAgent
+
+    if args.provider == "mock":
+        from agent.mock_model import MockModel
+
+        return ConversationalAgent(model=MockModel(ttft=args.mock_ttft, tokens_per_second=args.mock_tps),
+                                   context=getattr(args, "context", None))
+    return ConversationalAgent(model=args.model, context=getattr(args, "context", None))
+
+
+async def run_turn(agent, message: str, stream: bool) -> Dict[str, Any]:
+    """
+    Sends one message to the agent and measures its latency profile.
+
+    Args:
+        agent: The ConversationalAgent under test.
+        message: The user message.
+        stream: Whether to use the streaming API.
+
+    Returns:
+        A dictionary with the per-turn measurements.
+    """
+    history_items = len(agent.conversation_history)
+    started = time.perf_counter()
+    first_chunk_at: Optional[float] = None
+    chunk_times: List[float] = []
+    response = ""
+
+    if stream:
+        async for chunk in agent.get_streamed_response(message):
+            now = time.perf_counter()
+            if first_chunk_at is None:
+                first_chunk_at = now
+            chunk_times.append(now)
+            response += chunk
+    else:
+        response = await agent.get_response(message)
+        first_chunk_at = time.perf_counter()
+        chunk_times.append(first_chunk_at)
+
+    finished = time.perf_counter()
+    usage = agent.last_usage or {}
+    # The input checks run concurrently with the model call and are timed separately
+    stages = agent.last_turn_spans.durations if agent.last_turn_spans is not None else {}
+    output_tokens = usage.get("output_tokens") or estimate_tokens(response)
+    ttft = (first_chunk_at - started) if first_chunk_at is not None else None
+    # Streaming throughput is measured after the first token; without streaming only the total is known
+    if stream and first_chunk_at is not None:
+        generation_time = finished - first_chunk_at
+    else:
+        generation_time = finished - started
+
+    return {
+        "history_items": history_items,
+        "ttft_s": ttft,
+        "total_latency_s": finished - started,
+        "inter_token_latencies_s": [b - a for a, b in zip(chunk_times, chunk_times[1:])],
+        "chunks": len(chunk_times),
+        "prompt_tokens": usage.get("input_tokens"),
+        "output_tokens": output_tokens,
+        "model_requests": usage.get("requests"),
+        "guardrails_s": stages.get(STAGE_GUARDRAILS),
+        "tokens_per_s": output_tokens / generation_time if generation_time > 0 else None,
+        "usage_reported": bool(usage),
+        "rss_bytes": rss_bytes(),
+    }
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Runs every selected conversation `args.repeat` times and aggregates the results.
+    """
+    conversations = [c for c in CONVERSATIONS if not args.conversation or c["name"] in args.conversation]
+    if not conversations:
+        raise SystemExit(f"No conversation matches {args.conversation}")
+
+    rss_before = rss_bytes()
+    agent = build_agent(args)
+    rss_after_init = rss_bytes()
+
+    turns: List[Dict[str, Any]] = []
+    for repetition in range(args.repeat):
+        for conversation in conversations:
+            agent.clear_history()
+            for index, message in enumerate(conversation["turns"]):
+                measurement = await run_turn(agent, message, stream=not args.no_stream)
+                measurement.update(conversation=conversation["name"], turn=index, repetition=repetition)
+                turns.append(measurement)
+                logger.info(
+                    "%s turn %d: ttft=%.3fs total=%.3fs",
+                    conversation["name"], index, measurement["ttft_s"], measurement["total_latency_s"],
+                )
+
+    prompt_tokens_by_turn: Dict[str, Any] = {}
+    for index in sorted({t["turn"] for t in turns}):
+        prompt_tokens_by_turn[str(index)] = summarize(t["prompt_tokens"] for t in turns if t["turn"] == index)
+
+    return {
+        "metadata": run_metadata(
+            benchmark="latency",
+            provider=args.provider,
+            model=args.model if args.provider != "mock" else "mock",
+            stream=not args.no_stream,
+            context=agent.context_mode,
+            repeat=args.repeat,
+            conversations=[c["name"] for c in conversations],
+            mock_ttft_s=args.mock_ttft if args.provider == "mock" else None,
+            mock_tokens_per_s=args.mock_tps if args.provider == "mock" else None,
+        ),
+        "summary": {
+            "turns": len(turns),
+            "ttft_s": summarize(t["ttft_s"] for t in turns),
+            "total_latency_s": summarize(t["total_latency_s"] for t in turns),
+            "inter_token_latency_s": summarize(gap for t in turns for gap in t["inter_token_latencies_s"]),
+            "tokens_per_s": summarize(t["tokens_per_s"] for t in turns),
+            "prompt_tokens": summarize(t["prompt_tokens"] for t in turns),
+            "prompt_tokens_by_turn": prompt_tokens_by_turn,
+            "output_tokens": summarize(t["output_tokens"] for t in turns),
+            "model_requests": summarize(t["model_requests"] for t in turns),
+            "guardrails_s": summarize(t["guardrails_s"] for t in turns),
+            "rss_bytes": {
+                "before_init": rss_before,
+                "after_init": rss_after_init,
+                "end": rss_bytes(),
+                "peak": peak_rss_bytes(),
+            },
+        },
+        "turns": turns,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """
+    Produces human-readable deltas of the headline percentiles against a baseline report.
+    """
+    lines = []
+    for metric in ("ttft_s", "total_latency_s", "inter_token_latency_s", "tokens_per_s", "prompt_tokens", "model_requests"):
+        for pct in ("p50", "p95", "p99"):
+            new = report["summary"].get(metric, {}).get(pct)
+            old = baseline.get("summary", {}).get(metric, {}).get(pct)
+            if new is None or old is None:
+                continue
+            change = ((new - old) / old * 100) if old else 0.0
+            lines.append(f"{metric:<24} {pct:<4} {old:>12.4f} -> {new:>12.4f} ({change:+.1f}%)")
+    return lines
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="End-to-end latency benchmark for ConversationalAgent.")
+    parser.add_argument("--provider", choices=["mock", "openai"], default="mock",
+                        help="Run against the offline MockModel or a real OpenAI endpoint.")
+    parser.add_argument("--model", default="gpt-4o-mini", help="Model name for the openai provider.")
+    parser.add_argument("--conversation", action="append",
+                        help="Only run the named conversation (repeatable). Defaults to all.")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of passes over the conversations.")
+    parser.add_argument("--no-stream", action="store_true", help="Use get_response instead of streaming.")
+    parser.add_argument("--context", choices=["full", "tools"],
+                        help="How the PDTA reaches the model (defaults to PDTA_CONTEXT_MODE).")
+    parser.add_argument("--mock-ttft", type=float, default=0.35, help="MockModel time-to-first-token (s).")
+    parser.add_argument("--mock-tps", type=float, default=60.0, help="MockModel generation speed (tokens/s).")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+    parser.add_argument("--baseline", help="Previous JSON report to compare against.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    configure_logging()
+    args = parse_args(argv)
+    report = asyncio.run(run_benchmark(args))
+    write_report(report, args.output)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        print("\n".join(compare(report, baseline)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+"""
+Load generator that replays recorded conversations against the agent or an HTTP endpoint.
+
+Sessions are read from a JSONL file, one session per line:
+
+    {"session_id": "s1", "turns": [
+        {"timestamp": "2025-09-10T09:00:00", "role": "user", "content": "Paziente di 64 anni..."},
+        {"timestamp": "2025-09-10T09:00:40", "role": "user", "content": "È fumatore..."}]}
+
+Timestamps may be ISO 8601 strings or seconds; only user turns are replayed and the gaps
+between them are used as think time (scaled by --time-scale). Two load models are supported:
+
+- closed loop: a fixed number of simulated users, each starting a new session as soon as
+  the previous one ends (--mode closed --levels 1,2,4,8);
+- open loop: new sessions arrive at a target rate in sessions/s regardless of how fast the
+  system answers (--mode open --levels 0.5,1,2,4).
+
+Every level runs for --duration seconds. The report contains throughput, latency, queueing
+delay and error rates per level, and the saturation point: the first level at which throughput
+stops growing, the error rate exceeds --max-error-rate or p95 latency exceeds --slo.
+
+Usage:
+    python -m benchmarks.loadgen benchmarks/data/sessions.jsonl --mode closed --levels 1,4,16
+    python -m benchmarks.loadgen sessions.jsonl --target http --url http://localhost:8000/chat \\
+        --mode open --levels 1,2,4 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from agent.logging_setup import configure_logging
+
+from .common import run_metadata, summarize, write_report
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Session:
+    """A recorded session: its id and the user messages with their offsets in seconds."""
+    session_id: str
+    messages: List[str]
+    offsets: List[float]
+
+
+@dataclass
+class TurnResult:
+    """The outcome of a single replayed turn."""
+    level: float
+    session_id: str
+    turn: int
+    queue_delay_s: float
+    ttft_s: Optional[float] = None
+    latency_s: Optional[float] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class LevelState:
+    """Mutable bookkeeping for one load level."""
+    level: float
+    results: List[TurnResult] = field(default_factory=list)
+    in_flight: int = 0
+    max_in_flight: int = 0
+    sessions_started: int = 0
+
+
+def _parse_timestamp(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value)).timestamp()
+
+
+def load_sessions(path: str) -> List[Session]:
+    """
+    Reads recorded sessions from a JSONL file.
+
+    Args:
+        path: The JSONL file, one session per line.
+
+    Returns:
+        The sessions that contain at least one user turn.
+    """
+    sessions = []
+    with open(path, encoding="utf-8") as source:
+        for line_number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            turns = [t for t in record.get("turns", []) if t.get("role", "user") == "user"]
+            if not turns:
+                continue
+            stamps = [_parse_timestamp(t["timestamp"]) if "timestamp" in t else None for t in turns]
+            if None in stamps:
+                offsets = [0.0] * len(turns)
+            else:
+                offsets = [stamp - stamps[0] for stamp in stamps]
+            sessions.append(Session(
+                session_id=str(record.get("session_id", line_number)),
+                messages=[t["content"] for t in turns],
+                offsets=offsets,
+            ))
+    return sessions
+
+
+class AgentTarget:
+    """
+    Replays turns in-process against ConversationalAgent, one agent instance per session.
+    """
+    def __init__(self, args: argparse.Namespace):
+        from .latency import build_agent
+
+        self.args = args
+        self._build_agent = build_agent
+        # The first agent builds the corpus version (parsing, indexes, tables, dedup): build one
+        # before any level starts, so that cold start is not timed as part of the first level
+        started = time.perf_counter()
+        build_agent(args)
+        logger.info("Agent warmed up in %.2fs.", time.perf_counter() - started)
+
+    def open_session(self, session_id: str) -> "AgentSession":
+        return AgentSession(self._build_agent(self.args))
+
+    def close(self) -> None:
+        pass
+
+
+class AgentSession:
+    def __init__(self, agent):
+        self.agent = agent
+
+    async def send(self, message: str, started: float) -> Dict[str, Any]:
+        ttft = None
+        async for _ in self.agent.get_streamed_response(message):
+            if ttft is None:
+                ttft = time.perf_counter() - started
+        error = type(self.agent.last_error).__name__ if self.agent.last_error else None
+        return {"ttft": ttft, "error": error}
+
+
+class HttpTarget:
+    """
+    Replays turns against an HTTP endpoint. Each turn is sent as a JSON POST
+    `{"session_id": ..., "message": ...}`; the response body may be streamed, and the
+    arrival of its first bytes is recorded as time-to-first-token.
+    """
+    def __init__(self, url: str, timeout: float, workers: int):
+        self.url = url
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def open_session(self, session_id: str) -> "HttpSession":
+        return HttpSession(self, session_id)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False)
+
+    def post(self, session_id: str, message: str, started: float) -> Dict[str, Any]:
+        body = json.dumps({"session_id": session_id, "message": message}).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        ttft = None
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                while True:
+                    chunk = response.read1(4096)
+                    if not chunk:
+                        break
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+        except urllib.error.HTTPError as e:
+            return {"ttft": ttft, "error": f"HTTP {e.code}"}
+        except Exception as e:
+            return {"ttft": ttft, "error": type(e).__name__}
+        return {"ttft": ttft, "error": None}
+
+
+class HttpSession:
+    def __init__(self, target: HttpTarget, session_id: str):
+        self.target = target
+        self.session_id = session_id
+
+    async def send(self, message: str, started: float) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.target.executor, self.target.post, self.session_id, message, started)
+
+
+async def replay_session(target, session: Session, state: LevelState, slots: asyncio.Semaphore,
+                         time_scale: float, deadline: float, instance: int) -> None:
+    """
+    Replays one session. Each turn becomes ready after its recorded think time (and never
+    before the previous answer arrived); the time spent waiting for a free slot after that
+    is the queueing delay.
+    """
+    session_id = f"{session.session_id}#{instance}"
+    client = target.open_session(session_id)
+    state.sessions_started += 1
+    session_start = time.perf_counter()
+    for index, message in enumerate(session.messages):
+        ready_at = session_start + session.offsets[index] * time_scale
+        now = time.perf_counter()
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+        if time.perf_counter() >= deadline:
+            return
+        ready = time.perf_counter()
+        async with slots:
+            started = time.perf_counter()
+            state.in_flight += 1
+            state.max_in_flight = max(state.max_in_flight, state.in_flight)
+            try:
+                outcome = await client.send(message, started)
+            except Exception as e:
+                outcome = {"ttft": None, "error": type(e).__name__}
+            finally:
+                state.in_flight -= 1
+            finished = time.perf_counter()
+        state.results.append(TurnResult(
+            level=state.level,
+            session_id=session_id,
+            turn=index,
+            queue_delay_s=started - ready,
+            ttft_s=outcome["ttft"],
+            latency_s=finished - started,
+            error=outcome["error"],
+        ))
+
+
+async def run_closed_level(target, sessions: List[Session], users: int, args: argparse.Namespace) -> LevelState:
+    """
+    Runs `users` simulated users for `args.duration` seconds; each user replays sessions back to back.
+    """
+    state = LevelState(level=users)
+    slots = asyncio.Semaphore(args.max_inflight or users)
+    deadline = time.perf_counter() + args.duration
+    counter = iter(range(10 ** 9))
+
+    async def user(user_index: int) -> None:
+        position = user_index
+        while time.perf_counter() < deadline:
+            session = sessions[position % len(sessions)]
+            await replay_session(target, session, state, slots, args.time_scale, deadline, next(counter))
+            position += users
+
+    await asyncio.gather(*(user(i) for i in range(users)))
+    return state
+
+
+async def run_open_level(target, sessions: List[Session], rate: float, args: argparse.Namespace,
+                         rng: random.Random) -> LevelState:
+    """
+    Starts new sessions at `rate` sessions/s for `args.duration` seconds, independently of completions.
+    """
+    state = LevelState(level=rate)
+    slots = asyncio.Semaphore(args.max_inflight or 10 ** 6)
+    started = time.perf_counter()
+    deadline = started + args.duration
+    tasks = []
+    next_arrival = started
+    index = 0
+    while next_arrival < deadline:
+        now = time.perf_counter()
+        if next_arrival > now:
+            await asyncio.sleep(next_arrival - now)
+        session = sessions[index % len(sessions)]
+        tasks.append(asyncio.create_task(
+            replay_session(target, session, state, slots, args.time_scale, deadline + args.drain, index)
+        ))
+        index += 1
+        gap = rng.expovariate(rate) if args.arrival == "poisson" else 1.0 / rate
+        next_arrival += gap
+    await asyncio.gather(*tasks)
+    return state
+
+
+def summarize_level(state: LevelState, elapsed: float) -> Dict[str, Any]:
+    """
+    Aggregates the results of one load level.
+    """
+    results = state.results
+    errors: Dict[str, int] = {}
+    for result in results:
+        if result.error:
+            errors[result.error] = errors.get(result.error, 0) + 1
+    succeeded = [r for r in results if not r.error]
+    return {
+        "level": state.level,
+        "elapsed_s": elapsed,
+        "sessions_started": state.sessions_started,
+        "turns": len(results),
+        "throughput_turns_per_s": len(succeeded) / elapsed if elapsed > 0 else 0.0,
+        "error_rate": (len(results) - len(succeeded)) / len(results) if results else 0.0,
+        "errors_by_type": errors,
+        "max_in_flight": state.max_in_flight,
+        "latency_s": summarize(r.latency_s for r in succeeded),
+        "ttft_s": summarize(r.ttft_s for r in succeeded),
+        "queue_delay_s": summarize(r.queue_delay_s for r in results),
+    }
+
+
+def find_saturation(levels: List[Dict[str, Any]], args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Finds the first level at which the system saturates and the last level it sustained.
+    """
+    previous = None
+    for level in levels:
+        reasons = []
+        if level["error_rate"] > args.max_error_rate:
+            reasons.append(f"error rate {level['error_rate']:.1%} > {args.max_error_rate:.1%}")
+        p95 = level["latency_s"].get("p95")
+        if args.slo and p95 is not None and p95 > args.slo:
+            reasons.append(f"p95 latency {p95:.2f}s > SLO {args.slo:.2f}s")
+        if previous is not None and previous["throughput_turns_per_s"] > 0:
+            gain = level["throughput_turns_per_s"] / previous["throughput_turns_per_s"] - 1
+            if gain < args.min_gain:
+                reasons.append(f"throughput gain {gain:+.1%} < {args.min_gain:.0%}")
+        if reasons:
+            return {
+                "saturated_at": level["level"],
+                "max_sustained": previous["level"] if previous else None,
+                "max_sustained_throughput_turns_per_s": previous["throughput_turns_per_s"] if previous else None,
+                "reasons": reasons,
+            }
+        previous = level
+    return {
+        "saturated_at": None,
+        "max_sustained": previous["level"] if previous else None,
+        "max_sustained_throughput_turns_per_s": previous["throughput_turns_per_s"] if previous else None,
+        "reasons": ["not saturated within the tested levels"],
+    }
+
+
+async def run_load(args: argparse.Namespace) -> Dict[str, Any]:
+    sessions = load_sessions(args.sessions)
+    if not sessions:
+        raise SystemExit(f"No sessions with user turns found in {args.sessions}")
+    levels = [float(level) for level in args.levels.split(",")]
+    if args.mode == "closed":
+        levels = [int(level) for level in levels]
+
+    if args.target == "http":
+        if not args.url:
+            raise SystemExit("--url is required with --target http")
+        target = HttpTarget(args.url, args.timeout, workers=max(int(max(levels)) * 4, 32))
+    else:
+        target = AgentTarget(args)
+
+    rng = random.Random(args.seed)
+    reports = []
+    try:
+        for level in levels:
+            logger.info("Running %s-loop level %s for %ss...", args.mode, level, args.duration)
+            started = time.perf_counter()
+            if args.mode == "closed":
+                state = await run_closed_level(target, sessions, level, args)
+            else:
+                state = await run_open_level(target, sessions, level, args, rng)
+            report = summarize_level(state, time.perf_counter() - started)
+            reports.append(report)
+            logger.info(
+                "level %s: %.2f turns/s, p95 latency %s, error rate %.1f%%",
+                level, report["throughput_turns_per_s"], report["latency_s"].get("p95"), report["error_rate"] * 100,
+            )
+    finally:
+        target.close()
+
+    return {
+        "metadata": run_metadata(
+            benchmark="loadgen",
+            sessions_file=args.sessions,
+            sessions=len(sessions),
+            target=args.target,
+            url=args.url,
+            provider=args.provider if args.target == "agent" else None,
+            mode=args.mode,
+            arrival=args.arrival if args.mode == "open" else None,
+            duration_s=args.duration,
+            time_scale=args.time_scale,
+            max_inflight=args.max_inflight,
+        ),
+        "levels": reports,
+        "saturation": find_saturation(reports, args),
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Replay recorded conversations at configurable load.")
+    parser.add_argument("sessions", help="JSONL file with one recorded session per line.")
+    parser.add_argument("--target", choices=["agent", "http"], default="agent",
+                        help="Replay in-process against ConversationalAgent or against an HTTP endpoint.")
+    parser.add_argument("--url", help="Endpoint for --target http.")
+    parser.add_argument("--timeout", type=float, default=120.0, help="HTTP request timeout (s).")
+    parser.add_argument("--provider", choices=["mock", "openai"], default="mock",
+                        help="Model provider for --target agent.")
+    parser.add_argument("--model", default="gpt-4o-mini", help="Model name for the openai provider.")
+    parser.add_argument("--mock-ttft", type=float, default=0.35, help="MockModel time-to-first-token (s).")
+    parser.add_argument("--mock-tps", type=float, default=60.0, help="MockModel generation speed (tokens/s).")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed",
+                        help="closed: fixed concurrent users; open: sessions arrive at a fixed rate.")
+    parser.add_argument("--levels", default="1,2,4,8",
+                        help="Comma-separated concurrency levels (closed) or arrival rates in sessions/s (open).")
+    parser.add_argument("--arrival", choices=["poisson", "uniform"], default="poisson",
+                        help="Inter-arrival distribution for open-loop mode.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load per level.")
+    parser.add_argument("--drain", type=float, default=30.0,
+                        help="Open loop: extra seconds allowed for started sessions to finish.")
+    parser.add_argument("--time-scale", type=float, default=0.0,
+                        help="Multiplier for recorded think time between turns (0 = back to back).")
+    parser.add_argument("--max-inflight", type=int, default=0,
+                        help="Cap on concurrent requests, modelling the deployment's slots (0 = unlimited).")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Error rate considered saturated.")
+    parser.add_argument("--slo", type=float, default=0.0, help="p95 latency SLO in seconds (0 = disabled).")
+    parser.add_argument("--min-gain", type=float, default=0.1,
+                        help="Minimum relative throughput gain between levels before declaring saturation.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for open-loop arrivals.")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    configure_logging()
+    args = parse_args(argv)
+    write_report(asyncio.run(run_load(args)), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Retrieval quality vs. context size benchmark.
+
+Runs the labeled questions of benchmarks.retrieval_questions against several retriever
+configurations and reports, for each one, recall@k, hit rate and MRR on the labeled chunks,
+the retrieved context size in tokens and the retrieval latency. Runs fully offline, no model
+is called. The "full" configuration sends the whole corpus (today's full-context prompt) and
+is the recall baseline: the recommended configuration is the one with the smallest context
+whose recall stays within --max-recall-loss of it.
+
+Usage:
+    python -m benchmarks.retrieval
+    python -m benchmarks.retrieval --k 3 --k 5 --k 8 --output retrieval.json
+"""
+import argparse
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from agent.corpus import DOC_IOV, Corpus, load_corpus
+from agent.registry import CorpusRegistry
+from agent.retrieval import SCORING_BM25, SCORING_TFIDF, Retriever
+from agent.tokens import estimate_tokens
+
+from .common import run_metadata, summarize, write_report
+from .retrieval_questions import RETRIEVAL_QUESTIONS
+
+DEFAULT_K = (1, 3, 5, 8)
+
+
+def _full_context(corpus: Corpus) -> Callable[[str], List[str]]:
+    chunk_ids = [chunk.chunk_id for chunk in corpus.chunks if chunk.has_text]
+    return lambda question: chunk_ids
+
+
+def _top_k(retriever: Union[Retriever, CorpusRegistry], k: int) -> Callable[[str], List[str]]:
+    return lambda question: [scored.chunk.chunk_id for scored in retriever.search(question, k)]
+
+
+def build_configurations(corpus: Corpus, ks: List[int]) -> Dict[str, Callable[[str], List[str]]]:
+    """
+    Returns the retriever configurations to compare, as functions from a question to the
+    ranked chunk ids they would put in the prompt.
+    """
+    retrievers = {
+        SCORING_BM25: Retriever(corpus, scoring=SCORING_BM25),
+        SCORING_TFIDF: Retriever(corpus, scoring=SCORING_TFIDF),
+        f"{SCORING_BM25}-iov-only": Retriever(corpus, scoring=SCORING_BM25, documents=[DOC_IOV]),
+    }
+    configurations = {"full": _full_context(corpus)}
+    for name, retriever in retrievers.items():
+        for k in ks:
+            configurations[f"{name}@{k}"] = _top_k(retriever, k)
+    # Per-document indexes, searching only the documents routed for each question
+    registry = CorpusRegistry(corpus)
+    for k in ks:
+        configurations[f"registry@{k}"] = _top_k(registry, k)
+    return configurations
+
+
+def evaluate(retrieve: Callable[[str], List[str]], corpus: Corpus, questions: List[Dict[str, Any]],
+             repeat: int = 1) -> Dict[str, Any]:
+    """
+    Scores one configuration on the labeled questions.
+
+    Args:
+        retrieve: Maps a question to the ranked chunk ids sent to the model.
+        corpus: The corpus the chunk ids refer to.
+        questions: Labeled questions with their target chunk ids.
+        repeat: Timed runs per question; the latency samples of all runs are kept.
+
+    Returns:
+        The summary metrics and the per-question results.
+    """
+    results = []
+    latencies = []
+    for item in questions:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            retrieved = retrieve(item["question"])
+            latencies.append((time.perf_counter() - start) * 1000)
+        targets = set(item["targets"])
+        found = targets.intersection(retrieved)
+        rank = next((index for index, chunk_id in enumerate(retrieved, 1) if chunk_id in targets), None)
+        results.append({
+            "question": item["question"],
+            "targets": item["targets"],
+            "retrieved": retrieved if len(retrieved) <= 20 else retrieved[:20] + ["..."],
+            "recall": len(found) / len(targets),
+            "reciprocal_rank": 1 / rank if rank else 0.0,
+            "tokens": sum(estimate_tokens(corpus.by_id[chunk_id].text) for chunk_id in retrieved),
+        })
+    count = len(results)
+    return {
+        "summary": {
+            "recall": sum(r["recall"] for r in results) / count,
+            "hit_rate": sum(1 for r in results if r["recall"] > 0) / count,
+            "mrr": sum(r["reciprocal_rank"] for r in results) / count,
+            "context_tokens": summarize(r["tokens"] for r in results),
+            "latency_ms": summarize(latencies),
+        },
+        "questions": results,
+    }
+
+
+def recommend(summaries: Dict[str, Dict[str, Any]], max_recall_loss: float) -> Optional[str]:
+    """
+    Picks the configuration with the smallest mean context whose recall is within
+    `max_recall_loss` of the full-context baseline.
+    """
+    baseline = summaries["full"]["recall"]
+    eligible = [name for name, s in summaries.items() if s["recall"] >= baseline - max_recall_loss]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda name: summaries[name]["context_tokens"].get("mean", 0))
+
+
+def format_table(summaries: Dict[str, Dict[str, Any]], recommended: Optional[str]) -> List[str]:
+    """
+    Renders the comparison table of all configurations.
+    """
+    lines = [f"{'configuration':<22} {'recall':>7} {'hit':>6} {'mrr':>6} {'tokens':>8} {'p95 tok':>8} "
+             f"{'p50 ms':>8} {'p95 ms':>8}"]
+    for name, s in summaries.items():
+        marker = "  <- recommended" if name == recommended else ""
+        lines.append(
+            f"{name:<22} {s['recall']:>7.3f} {s['hit_rate']:>6.3f} {s['mrr']:>6.3f} "
+            f"{s['context_tokens']['mean']:>8.0f} {s['context_tokens']['p95']:>8.0f} "
+            f"{s['latency_ms']['p50']:>8.3f} {s['latency_ms']['p95']:>8.3f}{marker}")
+    return lines
+
+
+def run(ks: List[int], repeat: int, max_recall_loss: float) -> Dict[str, Any]:
+    corpus = load_corpus()
+    missing = {t for item in RETRIEVAL_QUESTIONS for t in item["targets"] if t not in corpus.by_id}
+    if missing:
+        raise ValueError(f"Labeled targets not in the corpus: {', '.join(sorted(missing))}")
+
+    configurations = {}
+    for name, retrieve in build_configurations(corpus, ks).items():
+        configurations[name] = evaluate(retrieve, corpus, RETRIEVAL_QUESTIONS, repeat)
+    summaries = {name: result["summary"] for name, result in configurations.items()}
+    recommended = recommend(summaries, max_recall_loss)
+    return {
+        "metadata": run_metadata(
+            benchmark="retrieval",
+            questions=len(RETRIEVAL_QUESTIONS),
+            chunks=len(corpus.chunks),
+            k=ks,
+            repeat=repeat,
+            max_recall_loss=max_recall_loss,
+        ),
+        "recommended": recommended,
+        "summary": summaries,
+        "configurations": configurations,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare retriever configurations on labeled PDTA questions.")
+    parser.add_argument("--k", type=int, action="append", help="Chunks per query (repeatable). Defaults to 1, 3, 5, 8.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per question.")
+    parser.add_argument("--max-recall-loss", type=float, default=0.05,
+                        help="Recall that may be lost against the full context when recommending a configuration.")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+    args = parser.parse_args(argv)
+    report = run(sorted(set(args.k or DEFAULT_K)), args.repeat, args.max_recall_loss)
+    if args.output:
+        write_report(report, args.output)
+    print("\n".join(format_table(report["summary"], report["recommended"])), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
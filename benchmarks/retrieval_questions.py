@@ -0,0 +1,138 @@
+"""
+Labeled questions for the retrieval benchmark.
+
+Each question lists the corpus chunks that must be retrieved to answer it: IOV sections as
+"iov:<section>" (or "iov:blocco<N>" for the block headers) and ROV 2017 pages as "rov2017:p<PAGINA>".
+Questions are phrased the way an MMG would ask them, not copied from the text.
+"""
+
+RETRIEVAL_QUESTIONS = [
+    {
+        "question": "Quale impegnativa serve per la prima visita oncologica allo IOV e con quale esenzione?",
+        "targets": ["iov:5.3"],
+    },
+    {
+        "question": "Come si prenota la prima visita radioterapica per uno stadio I non operabile?",
+        "targets": ["iov:5.4"],
+    },
+    {
+        "question": "Quali casi vengono discussi nel GOM polmone e chi li propone?",
+        "targets": ["iov:5.2"],
+    },
+    {
+        "question": "Quali sono i punti di ingresso del paziente allo IOV?",
+        "targets": ["iov:5.1"],
+    },
+    {
+        "question": "Chi prenota gli approfondimenti diagnostici decisi dal gruppo multidisciplinare?",
+        "targets": ["iov:5.5"],
+    },
+    {
+        "question": "Come si richiede la valutazione per le cure simultanee?",
+        "targets": ["iov:5.7"],
+    },
+    {
+        "question": "Come richiedo la biopsia liquida per EGFR o NGS?",
+        "targets": ["iov:5.8"],
+    },
+    {
+        "question": "Il mio paziente vuole smettere di fumare, a quale ambulatorio lo invio?",
+        "targets": ["iov:5.8"],
+    },
+    {
+        "question": "Il supporto psicologico è previsto anche per il caregiver?",
+        "targets": ["iov:5.8"],
+    },
+    {
+        "question": "Chi segue il follow-up di un paziente operato in stadio I?",
+        "targets": ["iov:5.9", "rov2017:p34"],
+    },
+    {
+        "question": "Entro quanti giorni deve essere refertato il test EGFR secondo gli indicatori?",
+        "targets": ["iov:6"],
+    },
+    {
+        "question": "Chi è responsabile della presa in carico radioterapica nella matrice RACI?",
+        "targets": ["iov:7"],
+    },
+    {
+        "question": "Quali sono le fasi del flowchart operativo del percorso?",
+        "targets": ["iov:8"],
+    },
+    {
+        "question": "Quali procedure interne richiama il documento IOV?",
+        "targets": ["iov:blocco1"],
+    },
+    {
+        "question": "Quando va sospettato un tumore polmonare in un paziente con tosse?",
+        "targets": ["rov2017:p30"],
+    },
+    {
+        "question": "Entro quanto tempo va fatta la RX torace in caso di sintomi sospetti?",
+        "targets": ["rov2017:p30"],
+    },
+    {
+        "question": "Quanti prelievi servono nella prima broncoscopia diagnostica?",
+        "targets": ["rov2017:p31"],
+    },
+    {
+        "question": "Quali esami di funzionalità respiratoria servono prima dell'intervento chirurgico?",
+        "targets": ["rov2017:p32"],
+    },
+    {
+        "question": "Quando serve la risonanza magnetica cerebrale per la stadiazione?",
+        "targets": ["rov2017:p33"],
+    },
+    {
+        "question": "Quali dosi prevede la radioterapia stereotassica per lo stadio IA non operabile?",
+        "targets": ["rov2017:p34"],
+    },
+    {
+        "question": "Come si conferma istologicamente un interessamento linfonodale N2, serve la mediastinoscopia?",
+        "targets": ["rov2017:p43"],
+    },
+    {
+        "question": "Cosa si fa con una singola metastasi surrenalica in una neoplasia resecabile?",
+        "targets": ["rov2017:p45"],
+    },
+    {
+        "question": "Quali criteri servono per avviare un malato alle cure simultanee?",
+        "targets": ["rov2017:p49"],
+    },
+    {
+        "question": "Cos'è il tumore di Pancoast?",
+        "targets": ["rov2017:p50"],
+    },
+    {
+        "question": "Come va riportata l'espressione di PD-L1 nel referto?",
+        "targets": ["rov2017:p58"],
+    },
+    {
+        "question": "Chi può richiedere l'esame molecolare e cosa deve contenere la richiesta?",
+        "targets": ["rov2017:p62"],
+    },
+    {
+        "question": "Entro quanti giorni lavorativi deve essere refertato un test molecolare predittivo?",
+        "targets": ["rov2017:p65"],
+    },
+    {
+        "question": "Quali marcatori immunoistochimici si usano per distinguere adenocarcinoma e squamoso?",
+        "targets": ["rov2017:p55"],
+    },
+    {
+        "question": "Come si descrive il pezzo operatorio nell'esame macroscopico?",
+        "targets": ["rov2017:p69"],
+    },
+    {
+        "question": "Quando è indicato afatinib nel NSCLC con mutazione EGFR?",
+        "targets": ["rov2017:p77"],
+    },
+    {
+        "question": "Qual è l'incidenza del tumore del polmone in Veneto negli uomini e nelle donne?",
+        "targets": ["rov2017:p10"],
+    },
+    {
+        "question": "Qual è la sopravvivenza a 5 anni del tumore del polmone in Veneto?",
+        "targets": ["rov2017:p15"],
+    },
+]
@@ -0,0 +1,82 @@
+"""
+Import-time and cold-start benchmark.
+
+Each scenario runs in a fresh interpreter so module caches do not hide the cost:
+
+- eager_imports: what importing agent.agent used to cost (streamlit, the agents SDK and the
+  prompt module loaded up front);
+- import_agent_module: `import agent.agent` with lazy imports;
+- first_agent: importing agent.agent and creating a ConversationalAgent on the mock model,
+  i.e. the full cold start of a worker.
+
+Usage:
+    python -m benchmarks.startup --repeat 5 --output startup.json
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+from .common import run_metadata, summarize, write_report
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "eager_imports": "import streamlit, agents, agent.prompts.agent_instructions",
+    "import_agent_module": "import agent.agent",
+    "first_agent": (
+        "import agent.agent, agent.mock_model\n"
+        "agent.agent.ConversationalAgent(model=agent.mock_model.MockModel())"
+    ),
+}
+
+TIMER = """
+import time
+_start = time.perf_counter()
+{code}
+print(time.perf_counter() - _start)
+"""
+
+
+def measure(code: str) -> float:
+    """
+    Runs `code` in a fresh interpreter and returns its wall-clock duration in seconds.
+    """
+    env = dict(os.environ, OPENAI_AGENTS_DISABLE_TRACING="1", PDTA_TRACE_EXPORT="off", PDTA_SPAN_SINK="none")
+    completed = subprocess.run(
+        [sys.executable, "-c", TIMER.format(code=code)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return float(completed.stdout.strip().splitlines()[-1])
+
+
+def run(repeat: int, scenarios: List[str]) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for name in scenarios:
+        samples = [measure(SCENARIOS[name]) for _ in range(repeat)]
+        results[name] = summarize(samples)
+    report: Dict[str, Any] = {
+        "metadata": run_metadata(benchmark="startup", repeat=repeat),
+        "scenarios": results,
+    }
+    eager = results.get("eager_imports", {}).get("p50")
+    lazy = results.get("import_agent_module", {}).get("p50")
+    if eager and lazy:
+        report["import_speedup"] = eager / lazy
+        report["import_time_saved_s"] = eager - lazy
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Measure import time and cold start of the agent.")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per scenario.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario to run (repeatable). Defaults to all.")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+    args = parser.parse_args(argv)
+    write_report(run(args.repeat, args.scenario or list(SCENARIOS)), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,23 @@
 import streamlit as st
 import asyncio
 import logging
+import time
+import uuid
 
-from agent.agent import ConversationalAgent 
+from agent import metrics
+from agent.agent import CANCELLED_MARKER, ConversationalAgent
+from agent.config import get_int_setting
+from agent.logging_setup import LogPayload, configure_logging
+from agent.instrumentation import STAGE_UI_RENDER
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Configure logging (background queue listener, redacted clinical payloads)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Set the title of the Streamlit app
 st.title("🏥 Assistente Clinico per PDTA Polmonari")
 
-# Function to initialize the agent, ensuring it's done only once
-@st.cache_resource
+# Function to initialize the agent of a browser session (prompt and local classifiers are built once per process)
 def initialize_agent():
     logger.info("Initializing agent...")
     try:
@@ -20,16 +25,34 @@ def initialize_agent():
         logger.info("Agent initialized successfully.")
         return agent
     except ValueError as e:
-        logger.error(f"Agent initialization failed: {e}")
+        logger.error("Agent initialization failed: %s", e)
         st.error(f"Agent initialization failed: {e}. Make sure OPENAI_API_KEY is set in your .env file.")
         st.stop()
     except Exception as e:
-        logger.error(f"An unexpected error occurred during agent initialization: {e}")
+        logger.error("An unexpected error occurred during agent initialization: %s", e)
         st.error(f"An unexpected error occurred during agent initialization: {e}")
         st.stop()
 
-# Initialize the agent
-agent = initialize_agent()
+# Function to start the Prometheus metrics endpoint once per process
+@st.cache_resource
+def start_metrics_endpoint():
+    port = get_int_setting("PDTA_METRICS_PORT", 9108)
+    if not port:
+        logger.info("Metrics endpoint disabled (PDTA_METRICS_PORT=0).")
+        return None
+    return metrics.start_metrics_server(port)
+
+start_metrics_endpoint()
+
+# Initialize the agent: one per session, so that histories and running generations are not shared
+if "agent" not in st.session_state:
+    st.session_state.agent = initialize_agent()
+agent = st.session_state.agent
+
+# Track the browser session for the active sessions gauge
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+metrics.SESSIONS.touch(st.session_state.session_id)
 
 # Initialize chat history in session state if it doesn't exist
 if "messages" not in st.session_state:
@@ -78,7 +101,7 @@ if prompt := st.chat_input("Write a message..."):
 
     # Add user message to chat history
     st.session_state.messages.append({"role": "user", "content": prompt})
-    logger.info(f"User message added to history: '{prompt}'")
+    logger.info("User message added to history (%s)", LogPayload(prompt))
     
     # Display user message
     with st.chat_message("user"):
@@ -92,10 +115,31 @@ if prompt := st.chat_input("Write a message..."):
             # Stream the response
             async def stream_response():
                 response_content = ""
-                async for chunk in agent.get_streamed_response(prompt):
-                    response_content += chunk
-                    message_placeholder.markdown(response_content + "▌")
+                render_started_at = time.time()
+                render_time = 0.0
+                renders = 0
+                stream = agent.get_streamed_response(prompt)
+                try:
+                    async for chunk in stream:
+                        response_content += chunk
+                        render_start = time.perf_counter()
+                        message_placeholder.markdown(response_content + "▌")
+                        render_time += time.perf_counter() - render_start
+                        renders += 1
+                except BaseException:
+                    # A new message or a closed tab interrupts the script run: keep the partial
+                    # answer and stop the generation right away instead of when the event loop is torn down
+                    if CANCELLED_MARKER not in response_content:
+                        response_content = f"{response_content}\n\n{CANCELLED_MARKER}".strip()
+                    st.session_state.messages.append({"role": "assistant", "content": response_content})
+                    raise
+                finally:
+                    await stream.aclose()
+                render_start = time.perf_counter()
                 message_placeholder.markdown(response_content)
+                render_time += time.perf_counter() - render_start
+                if agent.last_turn_spans is not None:
+                    agent.last_turn_spans.record(STAGE_UI_RENDER, render_started_at, render_time, renders=renders + 1)
                 # Add assistant response to chat history after streaming is complete
                 st.session_state.messages.append({"role": "assistant", "content": response_content})
 
@@ -108,7 +152,10 @@ if prompt := st.chat_input("Write a message..."):
             # Get non-streamed response
             async def get_full_response():
                 response = await agent.get_response(prompt)
+                render_started_at, render_start = time.time(), time.perf_counter()
                 message_placeholder.markdown(response)
+                if agent.last_turn_spans is not None:
+                    agent.last_turn_spans.record(STAGE_UI_RENDER, render_started_at, time.perf_counter() - render_start, renders=1)
                 # Add assistant response to chat history
                 st.session_state.messages.append({"role": "assistant", "content": response})
             
@@ -0,0 +1,5 @@
+import os
+
+# The tests run offline on the bundled corpus: no source watcher, no trace export
+os.environ.setdefault("PDTA_CORPUS_RELOAD", "off")
+os.environ.setdefault("PDTA_TRACE_EXPORT", "off")
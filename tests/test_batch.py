@@ -0,0 +1,62 @@
+import asyncio
+import json
+
+from agent.batch import (MOCK_TRIAGE_ANSWER, STATUS_CLARIFICATION, STATUS_ERROR, STATUS_OK, parse_triage,
+                         run_batch)
+
+CASE = "Paziente di 72 anni con adenocarcinoma stadio IB, non operabile per comorbidità. Come procedo?"
+
+
+def _make_agent():
+    from agent.agent import ConversationalAgent
+    from agent.mock_model import MockModel
+
+    return ConversationalAgent(model=MockModel(response=MOCK_TRIAGE_ANSWER, ttft=0, tokens_per_second=0))
+
+
+def _records(path):
+    records = []
+    with open(path, encoding="utf-8") as source:
+        for line in source:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def test_parse_triage_reads_the_json_object():
+    triage = parse_triage('Ecco la valutazione:\n{"esami_pre_iov": "Visita pneumologica", '
+                          '"percorso_invio": " Discussione GOM ", "note": null}')
+    assert triage == {"esami_pre_iov": ["Visita pneumologica"], "percorso_invio": "Discussione GOM", "note": ""}
+
+
+def test_parse_triage_rejects_answers_without_the_triage():
+    assert parse_triage("Il paziente va discusso in GOM.") is None
+    assert parse_triage('{"esami_pre_iov": [}') is None
+    assert parse_triage('{"percorso_invio": "GOM"}') is None
+
+
+def test_triage_request_goes_to_the_model(tmp_path):
+    output = str(tmp_path / "triage.jsonl")
+    asyncio.run(run_batch([{"id": "1", "text": CASE}], output, _make_agent))
+    [record] = _records(output)
+    assert record["status"] == STATUS_OK
+    assert record["model"] == "mock"
+    assert record["esami_pre_iov"]
+
+
+def test_run_batch_resumes_and_retries_failed_cases(tmp_path):
+    output = tmp_path / "triage.jsonl"
+    output.write_text(json.dumps({"id": "1", "status": STATUS_OK}) + "\n" +
+                      json.dumps({"id": "2", "status": STATUS_ERROR, "error": "RateLimitError"}) + "\n" +
+                      '{"id": "3", "sta', encoding="utf-8")
+    cases = [{"id": "1", "text": CASE}, {"id": "2", "text": CASE},
+             {"id": "3", "text": "Paziente di 60 anni con tosse persistente, cosa devo fare?"}]
+    summary = asyncio.run(run_batch(cases, str(output), _make_agent))
+    assert summary["skipped"] == 1
+    assert summary["processed"] == 2
+    records = _records(output)
+    assert len(records) == 4
+    statuses = {record["id"]: record["status"] for record in records[2:]}
+    assert statuses == {"2": STATUS_OK, "3": STATUS_CLARIFICATION}
@@ -0,0 +1,23 @@
+import subprocess
+import sys
+
+from agent.citations import citation_prompts
+from agent.corpus_store import DEFAULT_SOURCE, read_source
+from agent.prompts.agent_instructions import CITATION_RULE, LOCAL_CITATION_RULE
+
+
+def test_citation_prompts_replace_rule_5_and_the_inline_requests():
+    source = read_source(DEFAULT_SOURCE)
+    assert CITATION_RULE in source["AGENT_INSTRUCTIONS"]
+    instructions, text = citation_prompts(source["AGENT_INSTRUCTIONS"], source["pdta_text"])
+    assert LOCAL_CITATION_RULE in instructions and CITATION_RULE not in instructions
+    assert "cita sempre la fonte come" not in text
+    assert "Cita questa fonte come" not in text
+    # Only the two request lines go
+    assert len(source["pdta_text"].splitlines()) - len(text.splitlines()) == 2
+
+
+def test_citations_do_not_load_the_prompts_module():
+    code = "import sys, agent.citations; print('agent.prompts.agent_instructions' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,33 @@
+import pytest
+
+from agent.clarification import (MAX_QUESTIONS, QUESTION_TEMPLATES, SLOT_SMOKING, SLOT_SYMPTOMS, clarification_questions,
+                                 detect_slots, format_clarification)
+
+
+def test_under_specified_case_gets_questions():
+    questions = clarification_questions("Ho un paziente di 60 anni con tosse, cosa faccio?")
+    assert 2 <= len(questions) <= MAX_QUESTIONS
+    assert QUESTION_TEMPLATES[SLOT_SMOKING] in questions
+    # The symptom is given, its duration is asked instead
+    assert QUESTION_TEMPLATES[SLOT_SYMPTOMS] not in questions
+
+
+@pytest.mark.parametrize("message", [
+    "Paziente di 65 anni, fumatore da 40 anni, tosse persistente da 2 mesi, TC con nodulo di 2 cm",
+    "Paziente con adenocarcinoma stadio IIA, cosa faccio?",
+    "Come prenoto la prima visita?",
+    "Paziente di 70 anni: come si richiede l'impegnativa per la visita?",
+])
+def test_described_diagnosed_or_procedural_messages_go_to_the_model(message):
+    assert clarification_questions(message) is None
+
+
+def test_slots_are_detected_without_accents():
+    slots = detect_slots("Paziente ex fumatore, RX torace con opacità, esposizione ad amianto")
+    assert slots.is_case and not slots.has_diagnosis
+    assert {"smoking", "imaging", "imaging_result", "exposure"} <= set(slots.present)
+
+
+def test_questions_are_numbered():
+    reply = format_clarification(["Prima?", "Seconda?"])
+    assert "1. Prima?\n2. Seconda?" in reply
@@ -0,0 +1,29 @@
+import pytest
+
+from agent.config import get_bool_setting, get_int_setting
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("off", False), ("0", False), ("False", False), ("no", False),
+    ("on", True), ("1", True), ("TRUE", True), (" yes ", True),
+])
+def test_bool_setting_values(monkeypatch, value, expected):
+    monkeypatch.setenv("PDTA_TEST_FLAG", value)
+    assert get_bool_setting("PDTA_TEST_FLAG", not expected) is expected
+
+
+@pytest.mark.parametrize("value", [None, "", "maybe"])
+def test_bool_setting_falls_back_to_the_default(monkeypatch, value):
+    if value is None:
+        monkeypatch.delenv("PDTA_TEST_FLAG", raising=False)
+    else:
+        monkeypatch.setenv("PDTA_TEST_FLAG", value)
+    assert get_bool_setting("PDTA_TEST_FLAG", True) is True
+    assert get_bool_setting("PDTA_TEST_FLAG", False) is False
+
+
+def test_int_setting_falls_back_on_invalid_values(monkeypatch):
+    monkeypatch.setenv("PDTA_TEST_INT", "abc")
+    assert get_int_setting("PDTA_TEST_INT", 4) == 4
+    monkeypatch.setenv("PDTA_TEST_INT", "7")
+    assert get_int_setting("PDTA_TEST_INT", 4) == 7
@@ -0,0 +1,67 @@
+import asyncio
+import re
+import shutil
+
+import pytest
+
+from agent import metrics
+from agent.corpus_store import DEFAULT_SOURCE, CorpusStore
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    path = tmp_path_factory.mktemp("corpus") / "pdta.py"
+    shutil.copy(DEFAULT_SOURCE, path)
+    return CorpusStore(str(path))
+
+
+def _reload_with(store, content):
+    with open(store.path, "w", encoding="utf-8") as source:
+        source.write(content)
+    failed = metrics.CORPUS_RELOADS.value(outcome="failed")
+    swapped = store.reload()
+    return swapped, metrics.CORPUS_RELOADS.value(outcome="failed") - failed
+
+
+def _source():
+    with open(DEFAULT_SOURCE, encoding="utf-8") as source:
+        return source.read()
+
+
+def test_reload_swaps_a_changed_source(store):
+    previous = store.current
+    content = _source().replace("Accesso per Stadio I non operabile.", "Accesso per Stadio I non operabile o rifiutato.")
+    swapped, failed = _reload_with(store, content)
+    assert swapped and not failed
+    assert store.current.version == previous.version + 1
+    assert store.current.changed_chunks
+
+
+@pytest.mark.parametrize("edit", [
+    # No PDTA text at all
+    lambda content: 'pdta_text = ""\n',
+    # The ROV 2017 transcription is gone
+    lambda content: re.sub(r"pdta2017_prompts_text.*", "", content, flags=re.DOTALL) + '"""\n',
+    # The full-context instructions lose the slot of the PDTA text
+    lambda content: content.replace("{pdta_text}", "PDTA"),
+])
+def test_reload_rejects_an_invalid_source(store, edit):
+    current = store.current
+    swapped, failed = _reload_with(store, edit(_source()))
+    assert not swapped and failed == 1
+    assert store.current is current
+
+
+def test_agent_follows_the_reloaded_version(store):
+    from agent.agent import ConversationalAgent
+    from agent.mock_model import MockModel
+
+    agent = ConversationalAgent(model=MockModel())
+    agent.corpus_store = store
+    content = _source().replace("Accesso per Stadio I non operabile.", "Accesso per Stadio I non operabile o inoperabile.")
+    swapped, _ = _reload_with(store, content)
+    assert swapped
+    asyncio.run(agent.get_response("Qual è la ricetta della carbonara?"))
+    assert agent.last_turn_spans.attributes["corpus_version"] == store.current.version
+    assert agent.scope_classifier is store.current.scope
+    assert agent.scope_classifier.corpus is store.current.corpus
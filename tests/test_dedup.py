@@ -0,0 +1,25 @@
+from agent.corpus import NO_TEXT_MARKER, load_corpus
+from agent.corpus_store import default_corpus_store
+from agent.dedup import Deduplicator
+
+
+def test_only_the_page_template_is_replaced():
+    version = default_corpus_store().current
+    dedup = version.dedup
+    assert dedup is not None
+    report = dedup.report()
+    assert report["replaced"] > 0 and report["tokens_after"] < report["tokens_before"]
+    for cluster in dedup.clusters:
+        assert NO_TEXT_MARKER not in cluster.canonical.text
+
+
+def test_empty_pages_keep_their_note():
+    version = default_corpus_store().current
+    for chunk in load_corpus().chunks:
+        if not chunk.has_text:
+            assert NO_TEXT_MARKER in version.passage_text(chunk)
+
+
+def test_short_repeats_are_kept():
+    text = "Testo della pagina 1:\nbreve\n\nTesto della pagina 2:\nbreve\n"
+    assert Deduplicator(text).text == text
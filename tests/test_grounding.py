@@ -0,0 +1,60 @@
+import pytest
+
+from agent.corpus_store import default_corpus_store
+from agent.grounding import (FINDING_CODE, FINDING_NUMBER, FINDING_UNSUPPORTED, GROUNDING_FLAG, GROUNDING_OFF,
+                             GroundingValidator, grounding_mode)
+
+GROUNDED = "La prima visita oncologica si prenota tramite CUP con impegnativa del medico di medicina generale."
+UNSUPPORTED = "La ricetta della carbonara prevede guanciale, pecorino romano e uova fresche di gallina."
+
+
+@pytest.fixture(scope="module")
+def version():
+    return default_corpus_store().current
+
+
+def _kinds(findings):
+    return {(finding.kind, finding.detail if finding.kind != FINDING_UNSUPPORTED else None) for finding in findings}
+
+
+def test_sentences_found_in_the_pdta_are_grounded(version):
+    assert GroundingValidator(version).check(GROUNDED) == []
+
+
+def test_sentences_outside_the_pdta_are_unsupported(version):
+    [finding] = GroundingValidator(version).check(UNSUPPORTED)
+    assert finding.kind == FINDING_UNSUPPORTED
+    assert finding.sentence == UNSUPPORTED
+
+
+def test_unknown_codes_and_numbers_are_reported(version):
+    findings = GroundingValidator(version).check("La prestazione I_DON_P99 va prenotata dal Case Manager entro 937 giorni.")
+    assert {(FINDING_CODE, "I_DON_P99"), (FINDING_NUMBER, "937")} <= _kinds(findings)
+
+
+def test_codes_and_numbers_of_the_user_messages_are_grounded(version):
+    validator = GroundingValidator(version, "Paziente di 937 anni, impegnativa I_DON_P99")
+    kinds = {finding.kind for finding in validator.check("La prestazione I_DON_P99 del paziente di 937 anni.")}
+    assert FINDING_CODE not in kinds and FINDING_NUMBER not in kinds
+
+
+def test_questions_are_not_checked(version):
+    assert GroundingValidator(version).check("Preferisci la ricetta della carbonara con guanciale o pancetta?") == []
+
+
+def test_streamed_chunks_are_checked_when_a_sentence_completes(version):
+    validator = GroundingValidator(version)
+    answer = f"{GROUNDED} {UNSUPPORTED}"
+    middle = len(GROUNDED) + 20
+    assert validator.feed(answer[:middle]) == []
+    assert validator.feed(answer[middle:]) == []
+    [finding] = validator.finish()
+    assert finding.sentence == UNSUPPORTED
+    assert validator.findings == [finding]
+
+
+def test_grounding_mode_values():
+    assert grounding_mode("FLAG") == GROUNDING_FLAG
+    assert grounding_mode("no") == GROUNDING_OFF
+    with pytest.raises(ValueError):
+        grounding_mode("strict")
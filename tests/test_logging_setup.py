@@ -0,0 +1,24 @@
+import pytest
+
+from agent.logging_setup import redact_text
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("il paziente Mario Rossi ha una TC", "il paziente [NOME] ha una TC"),
+    ("Paziente Mario Rossi, TC positiva", "Paziente [NOME], TC positiva"),
+    ("Sig. Rossi in attesa di visita", "Sig. [NOME] in attesa di visita"),
+    ("la Signora Anna Bianchi chiede", "la Signora [NOME] chiede"),
+    ("inviato dalla Dott.ssa Verdi", "inviato dalla Dott.ssa [NOME]"),
+])
+def test_redaction_masks_names_after_titles(text, expected):
+    assert redact_text(text) == expected
+
+
+def test_redaction_masks_identifiers():
+    text = "CF RSSMRA80A01H501U, nato il 01/01/1980, mario.rossi@example.com, tel. 347 1234567, pratica 123456"
+    assert redact_text(text) == "CF [CF], nato il [DATA], [EMAIL], tel. [TELEFONO], pratica [NUMERO]"
+
+
+def test_redaction_keeps_clinical_text():
+    text = "Paziente ex fumatore con adenocarcinoma stadio IIIA, discusso in GOM."
+    assert redact_text(text) == text
@@ -0,0 +1,59 @@
+from agent.normalize import (NO_TEXT_NOTE, RULE_CASE_BOUNDARY, RULE_GLUED_WORDS, RULE_HYPHENATION, RULE_PAGE_NUMBER,
+                             RULE_SPACING, RULE_SYMBOLS, normalize_text)
+
+
+def _page(number, body):
+    return f"Testo della pagina {number}:\n{body}\nOutput atteso dal modello per la pagina {number}:\n"
+
+
+def test_line_break_hyphens_are_removed_between_lowercase_words():
+    result = normalize_text("Il campione è parti-\ncolarmente utile.")
+    assert result.text == "Il campione è particolarmente utile."
+    assert result.edits[RULE_HYPHENATION] == 1
+
+
+def test_hyphenated_forms_of_the_corpus_keep_their_hyphen():
+    result = normalize_text("Il follow-\nup clinico. Dopo il follow-up radiologico.")
+    assert result.text == "Il follow-up clinico. Dopo il follow-up radiologico."
+
+
+def test_numbers_split_by_a_hyphen_keep_it():
+    assert normalize_text("pagine 1672-\n1682.").text == "pagine 1672-1682."
+
+
+def test_symbol_glyphs_are_replaced_or_dropped():
+    result = normalize_text("\uf0e0 Prima visita\uf0b7 oncologica")
+    assert result.text == "→ Prima visita oncologica"
+    assert result.edits[RULE_SYMBOLS] == 2
+
+
+def test_page_numbers_are_dropped_and_empty_pages_noted():
+    result = normalize_text(_page(69, "691.2 – Esame macroscopico\nTesto\n69") + _page(70, "70"))
+    assert _page(69, "1.2 – Esame macroscopico\nTesto") in result.text
+    assert _page(70, NO_TEXT_NOTE) in result.text
+    assert result.edits[RULE_PAGE_NUMBER] == 2
+
+
+def test_words_glued_across_a_case_change_are_split():
+    result = normalize_text("Dopo 4 cicliCisplatino. Il Cisplatino e i cicli.")
+    assert result.text.startswith("Dopo 4 cicli Cisplatino.")
+    assert result.edits[RULE_CASE_BOUNDARY] == 1
+    assert normalize_text("Secondo MacLennan.").text == "Secondo MacLennan."
+
+
+def test_glued_words_are_split_into_corpus_words():
+    result = normalize_text("Il trattamentoradioterapico. Il trattamento radioterapico e il trattamento radioterapico.")
+    assert result.text.startswith("Il trattamento radioterapico.")
+    assert result.edits[RULE_GLUED_WORDS] == 1
+
+
+def test_compound_words_are_not_split():
+    text = "La controindicazione. Una indicazione e una indicazione, contro e contro."
+    assert normalize_text(text).text == text
+
+
+def test_spaces_are_collapsed():
+    result = normalize_text("Doppio   spazio  \nfine")
+    assert result.text == "Doppio spazio\nfine"
+    assert result.edits[RULE_SPACING] == 1
+    assert result.report()["tokens_after"] <= result.report()["tokens_before"]
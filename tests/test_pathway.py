@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from agent.pathway import (PHASE_ENTRY, PHASE_FOLLOW_UP, PHASE_GOM, PHASE_TREATMENT, extract_facts,
+                           is_next_step_question, locate)
+
+
+def test_inoperable_stage_i_goes_to_radiotherapy():
+    state = locate("Paziente di 72 anni con adenocarcinoma stadio IB, non operabile per comorbidità.")
+    assert state.phase == PHASE_ENTRY
+    assert "Prima visita radioterapica" in state.next_steps[0]
+    assert not state.facts.qualified
+
+
+@pytest.mark.parametrize("text, fact", [
+    ("Paziente di 72 anni con adenocarcinoma stadio IB, non operato perché non operabile per comorbidità.", "surgery"),
+    ("Paziente di 60 anni, adenocarcinoma stadio IIIA, in attesa di chemioterapia neoadiuvante.", "therapy"),
+    ("Paziente di 58 anni, NSCLC stadio IIIA, intervento chirurgico programmato.", "surgery"),
+    ("Paziente di 64 anni, adenocarcinoma stadio IIB, non è ancora stato discusso in GOM.", "gom_discussed"),
+])
+def test_negated_or_pending_events_do_not_advance_the_case(text, fact):
+    facts = extract_facts(text)
+    assert fact not in facts.facts
+    assert fact in facts.qualified
+
+
+def test_negated_surgery_keeps_the_entry_phase():
+    state = locate("Paziente di 72 anni con adenocarcinoma stadio IB, non operato perché non operabile per comorbidità.")
+    assert state.phase == PHASE_ENTRY
+    assert "intervento chirurgico" in state.hint()
+
+
+def test_pending_neoadjuvant_therapy_keeps_the_gom_phase():
+    state = locate("Paziente di 60 anni, adenocarcinoma stadio IIIA, in attesa di chemioterapia neoadiuvante.")
+    assert state.phase == PHASE_GOM
+
+
+@pytest.mark.parametrize("text", [
+    "Paziente di 60 anni con sospetto carcinoma polmonare alla TC.",
+    "Paziente di 60 anni, esclusa diagnosi di carcinoma.",
+])
+def test_suspected_or_excluded_diagnosis_is_not_a_diagnosis(text):
+    facts = extract_facts(text)
+    assert "diagnosis" not in facts.facts
+    assert "diagnosis" in facts.qualified
+
+
+@pytest.mark.parametrize("text", [
+    "Paziente con sospetta metastasi epatica, come procedo?",
+    "Paziente di 68 anni con adenocarcinoma stadio IV da confermare.",
+])
+def test_suspected_stage_stays_unknown(text):
+    facts = extract_facts(text)
+    assert facts.stage is None
+    assert "stage" in facts.qualified
+
+
+def test_negation_only_governs_the_following_words():
+    facts = extract_facts("Paziente di 66 anni non fumatore operato di lobectomia per adenocarcinoma stadio IIA.")
+    assert {"surgery", "diagnosis"} <= facts.facts
+    assert "smoker" not in facts.facts
+    assert locate("Paziente di 66 anni operato di lobectomia senza complicanze, stadio IIA.").phase == PHASE_TREATMENT
+
+
+def test_completed_treatment_goes_to_follow_up():
+    state = locate("Paziente di 70 anni, stadio IA, operato di lobectomia, trattamento concluso.")
+    assert state.phase == PHASE_FOLLOW_UP
+    assert "follow-up chirurgico" in state.next_steps[0]
+
+
+def test_no_case_no_state():
+    assert locate("Qual è il ruolo del Case Manager?") is None
+
+
+def test_next_step_questions():
+    assert is_next_step_question("Come procedo?")
+    assert is_next_step_question("A chi lo invio?")
+    assert not is_next_step_question("Quali esami servono per la stadiazione?")
+
+
+def _turn(message):
+    from agent.agent import ConversationalAgent
+    from agent.mock_model import MockModel
+
+    agent = ConversationalAgent(model=MockModel())
+    reply = asyncio.run(agent.get_response(message))
+    return agent, reply
+
+
+def test_next_step_answered_locally_for_an_asserted_case():
+    agent, reply = _turn("Paziente di 72 anni con adenocarcinoma stadio IB, non operabile per comorbidità. Come procedo?")
+    assert agent.last_turn_spans.attributes.get("model") is None
+    assert "Prima visita radioterapica" in reply
+
+
+def test_next_step_with_a_negated_event_goes_to_the_model():
+    agent, reply = _turn("Paziente di 72 anni con adenocarcinoma stadio IB, non operato perché non operabile per "
+                         "comorbidità. Come procedo?")
+    assert agent.last_turn_spans.attributes.get("model") == "mock"
+    assert "Trattamento e valutazioni parallele" not in reply
+
+
+def test_next_step_with_a_suspected_stage_goes_to_the_model():
+    agent, reply = _turn("Paziente con sospetta metastasi epatica, come procedo?")
+    assert agent.last_turn_spans.attributes.get("model") == "mock"
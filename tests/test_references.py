@@ -0,0 +1,47 @@
+import pytest
+
+from agent.corpus_store import default_corpus_store
+from agent.references import KIND_ACRONYM, KIND_CODE, KIND_PAGE, KIND_SECTION
+
+
+@pytest.fixture(scope="module")
+def references():
+    return default_corpus_store().current.references
+
+
+def _keys(found):
+    return [(reference.kind, reference.key) for reference in found]
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("Cosa prevede la I_DON_P04?", [(KIND_CODE, "I_DON_P04")]),
+    ("cosa prevede la i_don_p04?", [(KIND_CODE, "I_DON_P04")]),
+    ("Cosa dice la sezione 5.4?", [(KIND_SECTION, "5.4")]),
+    ("Cosa c'è a pag. 30?", [(KIND_PAGE, "30")]),
+    ("Chi partecipa al GOM?", [(KIND_ACRONYM, "GOM")]),
+    ("Come si prenota la CVP 89.7B.6_2?", [(KIND_ACRONYM, "CVP"), (KIND_CODE, "89.7B.6_2")]),
+])
+def test_questions_resolve_to_their_references(references, question, expected):
+    assert _keys(references.resolve(question)) == expected
+
+
+@pytest.mark.parametrize("question", ["Che cos'è la I_ZZZ_P99?", "Cosa dice la sezione 99?", "Quali esami servono?"])
+def test_unknown_references_are_not_resolved(references, question):
+    assert references.resolve(question) == []
+
+
+def test_references_point_to_their_defining_passages(references):
+    assert references.get(KIND_SECTION, "5.4").chunk_ids == ("iov:5.4",)
+    assert references.get(KIND_PAGE, "30").chunk_ids == ("rov2017:p30",)
+    # Named in parentheses after the service it denotes: section 5.8 defines it, not the code list
+    assert references.get(KIND_CODE, "I_DN_P01").chunk_ids[0] == "iov:5.8"
+    occurrence = references.get(KIND_CODE, "I_DON_P04").occurrences[0]
+    assert "I_DON_P04" in occurrence.line
+
+
+def test_pinned_passages_put_acronyms_last(references):
+    found = references.resolve("La CVP 89.7B.6_2 e la sezione 5.4")
+    chunks = [chunk.chunk_id for chunk in references.passages(found)]
+    assert chunks[:2] == ["iov:5.3", "iov:5.4"]
+    assert len(chunks) == len(set(chunks))
+    assert len(references.passages(found, limit=1)) == 1
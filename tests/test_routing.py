@@ -0,0 +1,58 @@
+import pytest
+
+from agent.routing import (KIND_CLARIFICATION, KIND_FOLLOWUP, KIND_OTHER, KIND_QUESTION, KIND_REFERRAL,
+                           KIND_REFORMULATION, ROUTE_FAST, ROUTE_STRONG, ModelRouter, parse_policy)
+
+HISTORY = [
+    {"role": "user", "content": "Paziente di 60 anni con tosse persistente"},
+    {"role": "assistant", "content": "Il paziente è fumatore? Ha già eseguito una TC torace?"},
+]
+
+
+@pytest.fixture
+def router():
+    return ModelRouter({ROUTE_FAST: "fast-model", ROUTE_STRONG: "strong-model"})
+
+
+@pytest.mark.parametrize("message", [
+    "Quali esami servono prima della prima visita oncologica?",
+    "Qual è il percorso diagnostico per un nodulo polmonare?",
+    "Cosa prevede la sezione 5.4 sugli accertamenti?",
+])
+def test_ordinary_questions_go_to_the_fast_model(router, message):
+    assert router.route(message, []) == (KIND_QUESTION, ROUTE_FAST)
+
+
+@pytest.mark.parametrize("message", [
+    "Come invio un paziente allo IOV?",
+    "Serve l'impegnativa per la prima visita oncologica?",
+    "Paziente di 70 anni con adenocarcinoma stadio IIIA, come procedo?",
+])
+def test_referral_intent_goes_to_the_strong_model(router, message):
+    assert router.route(message, []) == (KIND_REFERRAL, ROUTE_STRONG)
+
+
+@pytest.mark.parametrize("message, history, kind", [
+    ("Paziente di 60 anni con tosse persistente", [], KIND_CLARIFICATION),
+    ("Puoi riassumere?", HISTORY, KIND_REFORMULATION),
+    ("E per l'esame istologico?", HISTORY, KIND_FOLLOWUP),
+])
+def test_cheap_turns_go_to_the_fast_model(router, message, history, kind):
+    assert router.route(message, history) == (kind, ROUTE_FAST)
+
+
+def test_answers_to_the_agent_questions_lead_to_the_referral(router):
+    assert router.route("Sì, fuma 20 sigarette al giorno da 30 anni, TC eseguita", HISTORY) == (KIND_REFERRAL, ROUTE_STRONG)
+
+
+def test_case_descriptions_go_to_the_strong_model(router):
+    message = "Paziente di 70 anni con adenocarcinoma stadio IIIA in trattamento."
+    assert router.route(message, []) == (KIND_OTHER, ROUTE_STRONG)
+
+
+def test_policy_overrides():
+    router = ModelRouter({ROUTE_FAST: "fast-model", ROUTE_STRONG: "strong-model"},
+                         parse_policy("question=strong, other=fast"))
+    assert router.route("Quali esami servono per la stadiazione?", [])[1] == ROUTE_STRONG
+    with pytest.raises(ValueError):
+        parse_policy("question=medium")
@@ -0,0 +1,39 @@
+import pytest
+
+from agent.corpus_store import default_corpus_store
+from agent.scope import IN_SCOPE, OUT_OF_SCOPE, UNCERTAIN
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return default_corpus_store().current.scope
+
+
+@pytest.mark.parametrize("message", [
+    "Qual è la ricetta della carbonara?",
+    "Chi ha vinto la Champions League?",
+])
+def test_clearly_unrelated_questions_are_out_of_scope(classifier, message):
+    assert classifier.classify(message).label == OUT_OF_SCOPE
+
+
+def test_pdta_question_is_in_scope(classifier):
+    decision = classifier.classify("Quali esami servono prima della prima visita oncologica?")
+    assert decision.label == IN_SCOPE
+    assert decision.anchors
+
+
+@pytest.mark.parametrize("message", [
+    # Clinical but not about the PDTA: the model decides
+    "Come si gestisce il diabete di tipo 2?",
+    # Too short to judge
+    "ciao",
+])
+def test_doubtful_messages_are_left_to_the_model(classifier, message):
+    assert classifier.classify(message).label == UNCERTAIN
+
+
+def test_no_false_refusals_on_the_labeled_questions(classifier):
+    report = classifier.evaluate()
+    assert report["false_refusals"] == 0
+    assert report["precision"] == 1.0
@@ -0,0 +1,140 @@
+import asyncio
+import concurrent.futures
+import time
+
+from agent.singleflight import SingleFlight
+
+
+def _source(items, started=None, release=None, error=None, cancelled=None):
+    """An upstream call yielding `items`, optionally waiting for `release` and then failing."""
+    async def events():
+        if started is not None:
+            started["calls"] += 1
+        try:
+            for item in items:
+                yield item
+                await asyncio.sleep(0)
+            if release is not None:
+                await asyncio.wrap_future(release)
+            if error is not None:
+                raise error
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.set_result(True)
+            raise
+    return events
+
+
+async def _collect(subscription):
+    return [item async for item in subscription]
+
+
+def _idle(flights):
+    # Finished calls are forgotten on the background loop, just after their last event
+    deadline = time.monotonic() + 2
+    while flights.in_flight() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return flights.in_flight() == 0
+
+
+def test_identical_calls_share_one_upstream_call():
+    flights, started = SingleFlight(), {"calls": 0}
+
+    async def run():
+        release = concurrent.futures.Future()
+        start = _source(["a", "b"], started, release)
+        leader = flights.subscribe("key", start)
+        follower = flights.subscribe("key", start)
+        assert leader.leader and not follower.leader
+        tasks = [asyncio.ensure_future(_collect(leader)), asyncio.ensure_future(_collect(follower))]
+        await asyncio.sleep(0.05)
+        release.set_result(None)
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(run()) == [["a", "b"], ["a", "b"]]
+    assert started["calls"] == 1
+    assert _idle(flights)
+
+
+def test_different_keys_do_not_share():
+    flights, started = SingleFlight(), {"calls": 0}
+
+    async def run():
+        first = flights.subscribe("one", _source(["a"], started))
+        second = flights.subscribe("two", _source(["b"], started))
+        assert first.leader and second.leader
+        return await asyncio.gather(_collect(first), _collect(second))
+
+    assert asyncio.run(run()) == [["a"], ["b"]]
+    assert started["calls"] == 2
+
+
+def test_leader_error_reaches_every_subscriber():
+    flights = SingleFlight()
+
+    async def run():
+        release = concurrent.futures.Future()
+        start = _source(["a"], release=release, error=RuntimeError("upstream down"))
+        subscriptions = [flights.subscribe("key", start), flights.subscribe("key", start)]
+        tasks = [asyncio.ensure_future(_collect(subscription)) for subscription in subscriptions]
+        await asyncio.sleep(0.05)
+        release.set_result(None)
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    for outcome in asyncio.run(run()):
+        assert isinstance(outcome, RuntimeError)
+        assert str(outcome) == "upstream down"
+
+
+def test_upstream_call_is_cancelled_when_the_last_subscriber_leaves():
+    flights = SingleFlight()
+
+    async def run():
+        release, cancelled = concurrent.futures.Future(), concurrent.futures.Future()
+        start = _source(["a"], release=release, cancelled=cancelled)
+        leader, follower = flights.subscribe("key", start), flights.subscribe("key", start)
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        # The follower still reads the shared call
+        assert not cancelled.done()
+        follower.cancel()
+        await asyncio.wait_for(asyncio.wrap_future(cancelled), 2)
+        return await asyncio.gather(_collect(leader), _collect(follower))
+
+    assert asyncio.run(run()) == [["a"], ["a"]]
+    assert _idle(flights)
+
+
+def test_late_subscriber_gets_the_events_so_far():
+    flights = SingleFlight()
+
+    async def run():
+        release = concurrent.futures.Future()
+        start = _source(["a", "b"], release=release)
+        leader = flights.subscribe("key", start)
+        task = asyncio.ensure_future(_collect(leader))
+        await asyncio.sleep(0.05)
+        late = flights.subscribe("key", start)
+        assert not late.leader
+        late_task = asyncio.ensure_future(_collect(late))
+        await asyncio.sleep(0.05)
+        release.set_result(None)
+        return await asyncio.gather(task, late_task)
+
+    assert asyncio.run(run()) == [["a", "b"], ["a", "b"]]
+
+
+def test_cancelled_upstream_call_ends_every_subscriber():
+    flights = SingleFlight()
+
+    async def run():
+        release = concurrent.futures.Future()
+        start = _source(["a"], release=release)
+        leader, follower = flights.subscribe("key", start), flights.subscribe("key", start)
+        tasks = [asyncio.ensure_future(_collect(leader)), asyncio.ensure_future(_collect(follower))]
+        await asyncio.sleep(0.05)
+        leader.flight.future.cancel()
+        return await asyncio.wait_for(asyncio.gather(*tasks), 2)
+
+    assert asyncio.run(run()) == [["a"], ["a"]]
+    assert _idle(flights)
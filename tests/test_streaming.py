@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from agent.agent import CANCEL_DISCONNECTED, CANCELLED_MARKER, ConversationalAgent
+from agent.mock_model import MockModel
+
+QUESTION = "Quali esami servono prima della prima visita oncologica?"
+
+
+class _TrackedModel(MockModel):
+    """A mock model recording whether its stream was stopped before the end."""
+    stopped = False
+
+    async def stream_response(self, *args, **kwargs):
+        try:
+            async for event in super().stream_response(*args, **kwargs):
+                yield event
+        except BaseException:
+            self.stopped = True
+            raise
+
+
+@pytest.mark.parametrize("single_flight", ["on", "off"])
+def test_closing_the_stream_stops_the_model_run(monkeypatch, single_flight):
+    monkeypatch.setenv("PDTA_SINGLE_FLIGHT", single_flight)
+    model = _TrackedModel(response="Risposta molto lunga del modello. " * 100, ttft=0, tokens_per_second=100)
+    agent = ConversationalAgent(model=model)
+
+    async def run():
+        stream = agent.get_streamed_response(QUESTION)
+        first = await stream.__anext__()
+        await stream.aclose()
+        # The upstream run is stopped on its own loop, shortly after the close
+        for _ in range(100):
+            if model.stopped:
+                break
+            await asyncio.sleep(0.01)
+        return first
+
+    assert asyncio.run(run())
+    assert model.stopped
+    assert agent.conversation_history[-1]["content"].endswith(CANCELLED_MARKER)
+    assert agent.last_turn_spans.attributes["cancelled"] == CANCEL_DISCONNECTED
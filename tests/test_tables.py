@@ -0,0 +1,40 @@
+import pytest
+
+from agent.corpus_store import default_corpus_store
+
+
+@pytest.fixture(scope="module")
+def version():
+    return default_corpus_store().current
+
+
+def test_raci_matrix_is_parsed(version):
+    table = version.tables.by_id["raci"]
+    assert table.columns == ("fase", "R", "A", "C", "I")
+    phases = [record["fase"] for record in table.records]
+    assert "Sospetto diagnostico" in phases and "Presa in carico Radioterapica" in phases
+
+
+def test_raci_passage_is_rendered_densely(version):
+    table = version.tables.by_id["raci"]
+    dense = version.tables.dense_text(version.corpus.by_id[table.chunk_id])
+    assert "fase|R|A|C|I" in dense
+    assert "Sospetto diagnostico|Radiologia/Pneumologia||MMG/Specialisti|CUP" in dense
+    assert dense in version.instructions
+
+
+def test_raci_lookup_is_answered_locally(version):
+    answer = version.tables.answer("Chi è responsabile della presa in carico radioterapica?")
+    assert "«Presa in carico Radioterapica»" in answer
+    assert "Responsabile (R): Radioterapia" in answer
+    assert "Sezione 7" in answer
+
+
+@pytest.mark.parametrize("question", [
+    "Quali esami servono prima della prima visita oncologica?",
+    "Chi è il case manager?",
+    # More than one phase matches as well as the best one
+    "Chi è responsabile della presa in carico?",
+])
+def test_other_questions_go_to_the_model(version, question):
+    assert version.tables.answer(question) is None